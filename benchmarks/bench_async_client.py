@@ -0,0 +1,90 @@
+"""
+Benchmark of the asyncio lab5 client against the blocking one.
+
+First checks that make_http_request_async writes the same bytes as make_http_request
+for Content-Length bodies (from a local lab6 server) and chunked bodies (from a small
+chunked test server). Then downloads a batch of files from the lab6 server with the
+thread-pool get_http_resources and with get_http_resources_async, and reports throughput.
+
+Usage: python benchmarks/bench_async_client.py [--files N] [--file-size BYTES] [--concurrency N]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lab5  # noqa: E402
+from local_server import lab6_server, start_chunked_server  # noqa: E402
+
+
+def read_file(path):
+    with open(path, 'rb') as input_file:
+        return input_file.read()
+
+
+def check_same_bytes(port, file_names, directory, output_directory):
+    """
+    Fetch every file with both clients and compare them with each other and with the source
+    """
+    for file_name in file_names:
+        sync_path = os.path.join(output_directory, file_name + '.sync')
+        async_path = os.path.join(output_directory, file_name + '.async')
+        resource = ('/' + file_name).encode('ASCII')
+        lab5.make_http_request(b'127.0.0.1', port, resource, sync_path)
+        asyncio.run(lab5.make_http_request_async(b'127.0.0.1', port, resource, async_path))
+        expected = read_file(os.path.join(directory, file_name))
+        if not read_file(sync_path) == read_file(async_path) == expected:
+            raise RuntimeError('{0}: sync and async downloads differ'.format(file_name))
+
+
+def run(files, file_size, concurrency):
+    """
+    Check both clients agree, then time a batch download with each
+    """
+    directory = tempfile.mkdtemp()
+    output_directory = tempfile.mkdtemp()
+    file_names = ['file{0}.bin'.format(n) for n in range(files)]
+    for file_name in file_names:
+        with open(os.path.join(directory, file_name), 'wb') as output_file:
+            output_file.write(os.urandom(file_size))
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        sample = file_names[:10]
+        check_same_bytes(start_chunked_server(directory), sample, directory, output_directory)
+        with lab6_server(directory) as port:
+            check_same_bytes(port, sample, directory, output_directory)
+            urls = [('http://127.0.0.1:{0}/{1}'.format(port, file_name), os.path.join(output_directory, file_name))
+                    for file_name in file_names]
+            results = []
+            for name, fetch in (('threads', lab5.get_http_resources), ('asyncio', lab5.get_http_resources_async)):
+                start = time.perf_counter()
+                statuses = fetch(urls, concurrency, concurrency)
+                elapsed = time.perf_counter() - start
+                failed = sum(1 for url, status_code, seconds in statuses if status_code != '200')
+                results.append((name, elapsed, failed))
+
+    print('sync and async downloads match for Content-Length and chunked bodies')
+    print('{0} files of {1} bytes, {2} at a time'.format(files, file_size, concurrency))
+    print('{0:<10}{1:>14}{2:>12}{3:>10}'.format('client', 'requests/s', 'MB/s', 'failed'))
+    for name, elapsed, failed in results:
+        print('{0:<10}{1:>14.1f}{2:>12.1f}{3:>10}'.format(
+            name, files / elapsed, files * file_size / elapsed / 1e6, failed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--files', type=int, default=1000)
+    parser.add_argument('--file-size', type=int, default=16 * 1024)
+    parser.add_argument('--concurrency', type=int, default=32)
+    args = parser.parse_args()
+    run(args.files, args.file_size, args.concurrency)
+
+
+if __name__ == '__main__':
+    main()
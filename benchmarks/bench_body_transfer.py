@@ -0,0 +1,108 @@
+"""
+Loopback benchmark for HTTP body assembly in the lab5 client.
+
+Times how long interpret_content_length and interpret_chunked take to receive
+1 KB, 1 MB and 100 MB bodies over a loopback TCP connection, and the largest
+block each one hands out.
+
+Usage: python benchmarks/bench_body_transfer.py [--sizes BYTES ...] [--chunk-size BYTES]
+"""
+
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from buffered_reader import BufferedReader  # noqa: E402
+import lab5  # noqa: E402
+
+DEFAULT_SIZES = [1000, 1000 * 1000, 100 * 1000 * 1000]
+
+
+def send_content_length(data_socket, body, chunk_size):
+    """
+    Send body as a Content-Length framed response body
+    """
+    data_socket.sendall(body)
+
+
+def send_chunked(data_socket, body, chunk_size):
+    """
+    Send body with chunked transfer coding, chunk_size bytes per chunk
+    """
+    view = memoryview(body)
+    for offset in range(0, len(body), chunk_size):
+        chunk = view[offset:offset + chunk_size]
+        data_socket.sendall('{0:x}\r\n'.format(len(chunk)).encode('ASCII'))
+        data_socket.sendall(chunk)
+        data_socket.sendall(b'\r\n')
+    data_socket.sendall(b'0\r\n\r\n')
+
+
+def serve(listen_socket, send_body, body, chunk_size):
+    """
+    Accept one connection, send the body with send_body, and close
+    """
+    data_socket, address = listen_socket.accept()
+    listen_socket.close()
+    send_body(data_socket, body, chunk_size)
+    data_socket.close()
+
+
+def time_transfer(send_body, receive_body, body, chunk_size):
+    """
+    :return: seconds taken to receive the whole body from receive_body, and the largest block
+    :rtype: tuple
+    """
+    listen_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listen_socket.bind(('127.0.0.1', 0))
+    listen_socket.listen(1)
+    server = threading.Thread(target=serve, args=(listen_socket, send_body, body, chunk_size), daemon=True)
+    server.start()
+    data_socket = socket.create_connection(listen_socket.getsockname())
+    reader = BufferedReader(data_socket)
+    received = 0
+    largest_block = 0
+    start = time.perf_counter()
+    for block in receive_body(reader, len(body)):
+        received += len(block)
+        largest_block = max(largest_block, len(block))
+    elapsed = time.perf_counter() - start
+    data_socket.close()
+    server.join()
+    if received != len(body):
+        raise RuntimeError('received {0} bytes, expected {1}'.format(received, len(body)))
+    return elapsed, largest_block
+
+
+def run(sizes, chunk_size):
+    """
+    Time both framings for every size and print a table
+    """
+    framings = (
+        ('content-length', send_content_length, lab5.interpret_content_length),
+        ('chunked', send_chunked, lambda reader, length: lab5.interpret_chunked(reader)),
+    )
+    print('{0:<16}{1:>14}{2:>12}{3:>12}{4:>16}'.format('framing', 'bytes', 'seconds', 'MB/s', 'largest block'))
+    for size in sizes:
+        body = os.urandom(size)
+        for name, send_body, receive_body in framings:
+            elapsed, largest_block = time_transfer(send_body, receive_body, body, chunk_size)
+            print('{0:<16}{1:>14}{2:>12.4f}{3:>12.1f}{4:>16}'.format(
+                name, size, elapsed, size / elapsed / 1e6, largest_block))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--chunk-size', type=int, default=32 * 1024)
+    args = parser.parse_args()
+    run(args.sizes, args.chunk_size)
+
+
+if __name__ == '__main__':
+    main()
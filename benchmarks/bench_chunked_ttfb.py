@@ -0,0 +1,127 @@
+"""
+Loopback benchmark of time to first byte for lab6's chunked response writer.
+
+Serves a gzip encoded text file two ways through lab6.send_response: buffered, where
+the whole file is compressed before the response is sent with a Content-Length, and
+streamed, where compress_blocks feeds chunked transfer coding as it goes. The client
+(lab5's decoders) records when the first body byte and the last byte arrive.
+
+Usage: python benchmarks/bench_chunked_ttfb.py [--sizes BYTES ...] [--repeat N]
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from buffered_reader import BufferedReader  # noqa: E402
+import lab5  # noqa: E402
+import lab6  # noqa: E402
+
+DEFAULT_SIZES = [1000 * 1000, 16 * 1000 * 1000, 64 * 1000 * 1000]
+
+
+def build_buffered(file_path):
+    """
+    :return: the headers and body of a response compressed completely before it is sent
+    """
+    body = b''.join(lab6.compress_blocks(file_path))
+    headers = {b'Content-Encoding: ': b'gzip\r\n',
+               b'Content-Length: ': str(len(body)).encode('ASCII') + b'\r\n'}
+    return headers, body
+
+
+def build_streamed(file_path):
+    """
+    :return: the headers and body of a response compressed as it is sent
+    """
+    headers = {b'Content-Encoding: ': b'gzip\r\n', b'Transfer-Encoding: ': b'chunked\r\n'}
+    return headers, lab6.compress_blocks(file_path)
+
+
+def serve(listen_socket, build, file_path):
+    """
+    Accept one connection, wait for the request, then build and send the response
+    """
+    data_socket, address = listen_socket.accept()
+    listen_socket.close()
+    data_socket.recv(1)
+    headers, body = build(file_path)
+    lab6.send_response(lab6.generate_status_line(b'200'), headers, body, data_socket)
+    data_socket.close()
+
+
+def time_response(build, file_path):
+    """
+    :return: seconds from sending the request to the first body byte and to the end of the body,
+             and the number of encoded bytes received
+    :rtype: tuple
+    """
+    listen_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listen_socket.bind(('127.0.0.1', 0))
+    listen_socket.listen(1)
+    server = threading.Thread(target=serve, args=(listen_socket, build, file_path), daemon=True)
+    server.start()
+    data_socket = socket.create_connection(listen_socket.getsockname())
+    reader = BufferedReader(data_socket)
+    start = time.perf_counter()
+    data_socket.sendall(b'G')
+    status_line, headers = lab5.read_response_headers(reader)
+    first_byte = None
+    received = 0
+    for block in lab5.interpret_body(reader, headers):
+        if first_byte is None:
+            first_byte = time.perf_counter() - start
+        received += len(block)
+    total = time.perf_counter() - start
+    data_socket.close()
+    server.join()
+    return first_byte, total, received
+
+
+def make_text_file(directory, size):
+    """
+    :return: the path of a text file of about size bytes that compresses like typical markup
+    """
+    file_path = os.path.join(directory, 'body-{0}.txt'.format(size))
+    line_number = 0
+    with open(file_path, 'w') as file:
+        while file.tell() < size:
+            file.write('<tr><td class="row">{0}</td><td>{1:x}</td></tr>\n'.format(line_number, line_number * 7919))
+            line_number += 1
+    return file_path
+
+
+def run(sizes, repeat):
+    """
+    Time both ways of sending for every size and print a table of medians
+    """
+    ways = (('buffered', build_buffered), ('chunked', build_streamed))
+    print('{0:<10}{1:>14}{2:>14}{3:>14}{4:>14}'.format('writer', 'file bytes', 'gzip bytes', 'TTFB ms', 'total ms'))
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            file_path = make_text_file(directory, size)
+            for name, build in ways:
+                results = [time_response(build, file_path) for i in range(repeat)]
+                print('{0:<10}{1:>14}{2:>14}{3:>14.2f}{4:>14.2f}'.format(
+                    name, os.path.getsize(file_path), results[0][2],
+                    statistics.median(r[0] for r in results) * 1000,
+                    statistics.median(r[1] for r in results) * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark of the lab5 connection pool against a local lab6 server.
+
+Fetches the same small file many times with make_http_request, once opening a new
+connection per request and once through a ConnectionPool, and reports requests/sec.
+Connections are only reused when the server keeps them open after a response.
+
+Usage: python benchmarks/bench_connection_pool.py [--requests N] [--file-size BYTES]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lab5  # noqa: E402
+from local_server import lab6_server  # noqa: E402
+
+
+def fetch_all(port, requests, pool, file_name):
+    """
+    :return: seconds taken to fetch the benchmark file requests times
+    :rtype: float
+    """
+    start = time.perf_counter()
+    for x in range(requests):
+        status_code = lab5.make_http_request(b'127.0.0.1', port, b'/bench.bin', file_name, pool)
+        if status_code != '200':
+            raise RuntimeError('unexpected status {0}'.format(status_code))
+    return time.perf_counter() - start
+
+
+def run(requests, file_size):
+    """
+    Time both modes and print requests/sec
+    """
+    directory = tempfile.mkdtemp()
+    with open(os.path.join(directory, 'bench.bin'), 'wb') as output_file:
+        output_file.write(os.urandom(file_size))
+    pool = lab5.ConnectionPool()
+    with lab6_server(directory) as port:
+        output_path = os.path.join(directory, 'bench.out')
+        unpooled = fetch_all(port, requests, None, output_path)
+        pooled = fetch_all(port, requests, pool, output_path)
+    pool.close()
+
+    print('{0} requests for a {1} byte file'.format(requests, file_size))
+    print('{0:<10}{1:>14}{2:>16}'.format('mode', 'requests/s', 'connections'))
+    print('{0:<10}{1:>14.1f}{2:>16}'.format('new', requests / unpooled, requests))
+    print('{0:<10}{1:>14.1f}{2:>16}'.format('pooled', requests / pooled, pool.connections_opened))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--file-size', type=int, default=1024)
+    args = parser.parse_args()
+    run(args.requests, args.file_size)
+
+
+if __name__ == '__main__':
+    main()
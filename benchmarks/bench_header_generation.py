@@ -0,0 +1,90 @@
+"""
+Microbenchmark of response header generation in lab6, in nanoseconds per request.
+
+Times each step of building a response head for a file: the per-request headers
+(Date and Connection), the per-file headers (Content-Type and the rest), assembling the
+status line and headers into bytes, and build_response end to end for a cached file.
+The 'baseline' rows redo the same work the way lab6 first did it, with
+datetime.strftime, mimetypes.guess_type and += concatenation on every request.
+
+Usage: python benchmarks/bench_header_generation.py [--number N] [--repeat N]
+"""
+
+import argparse
+import datetime
+import mimetypes
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lab6  # noqa: E402
+
+
+def baseline_connection_headers():
+    response_headers = {}
+    timestring = datetime.datetime.utcnow().strftime('%a, %d %b %Y %H:%M:%S GMT')
+    response_headers[b'Date: '] = timestring.encode('ASCII') + b'\r\n'
+    response_headers[b'Connection: '] = b'close\r\n'
+    return response_headers
+
+
+def baseline_file_headers(file_path, file_size):
+    response_headers = {}
+    response_headers[b'Content-Type: '] = str(mimetypes.guess_type(file_path)[0]).encode('ASCII') + b'\r\n'
+    response_headers[b'Content-Length: '] = str(file_size).encode('ASCII') + b'\r\n'
+    return response_headers
+
+
+def baseline_assemble(status_line, response_headers):
+    response = status_line
+    for k, v in response_headers.items():
+        response += k + v
+    response += b'\r\n'
+    return response
+
+
+def time_ns(function, number, repeat):
+    """
+    :return: the best time per call of function, in nanoseconds
+    :rtype: float
+    """
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number * 1e9
+
+
+def run(number, repeat):
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, 'index.html')
+        with open(file_path, 'wb') as output_file:
+            output_file.write(b'<html></html>\n' * 100)
+        os.chdir(directory)
+        entry = lab6.FILE_CACHE.lookup('index.html')
+        headers = {b'Date: ': b'Thu, 01 Jan 1970 00:00:00 GMT\r\n', b'Connection: ': b'keep-alive\r\n'}
+        headers.update(entry.headers)
+        status_line = lab6.generate_status_line(b'200')
+        cases = (
+            ('per-request headers', 'baseline', baseline_connection_headers),
+            ('per-request headers', 'lab6', lambda: lab6.generate_connection_headers(True)),
+            ('file headers', 'baseline', lambda: baseline_file_headers('index.html', 1400)),
+            ('file headers', 'lab6', lambda: lab6.generate_file_headers('index.html', 1400)),
+            ('assemble head', 'baseline', lambda: baseline_assemble(status_line, headers)),
+            ('assemble head', 'lab6', lambda: lab6.assemble_response(status_line, headers, b'')),
+            ('build_response (cached)', 'lab6', lambda: lab6.build_response('index.html', True, {'Host': 'x'})),
+        )
+        print('{0:<26}{1:<10}{2:>10}'.format('step', 'version', 'ns/req'))
+        for step, version, function in cases:
+            print('{0:<26}{1:<10}{2:>10.0f}'.format(step, version, time_ns(function, number, repeat)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000, help='calls per timing')
+    parser.add_argument('--repeat', type=int, default=5, help='timings; the best is reported')
+    args = parser.parse_args()
+    run(args.number, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark of HTTP/1.1 keep-alive in the lab6 server against closing after every response.
+
+For each serving engine, starts lab6 once with max_requests=1 (the old close-after-one
+behavior) and once with persistent connections, then fetches a small file from several
+client threads sharing a lab5 ConnectionPool. Reports requests/sec and connections opened.
+
+Then measures the cost of keep-alive to the thread engine: each worker thread stays with its
+connection while the connection is idle, so with as many idle keep-alive connections as
+workers, a new client is served only once a worker lets an idle connection go. Reports how
+long a new connection waits for its response with every worker holding an idle connection.
+
+Usage: python benchmarks/bench_keepalive.py [--requests N] [--clients N] [--file-size BYTES]
+"""
+
+import argparse
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lab5  # noqa: E402
+import lab6  # noqa: E402
+from local_server import lab6_server  # noqa: E402
+
+
+def client(port, requests, pool, failures):
+    for x in range(requests):
+        if lab5.make_http_request(b'127.0.0.1', port, b'/small.bin', os.devnull, pool) != '200':
+            failures.append(x)
+
+
+def measure(directory, requests, clients, server_options):
+    """
+    :return: requests/sec and the number of connections the client opened
+    :rtype: tuple
+    """
+    pool = lab5.ConnectionPool(max_idle=clients)
+    failures = []
+    with lab6_server(directory, **server_options) as port:
+        threads = [threading.Thread(target=client, args=(port, requests, pool, failures)) for x in range(clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+    pool.close()
+    if failures:
+        raise RuntimeError('{0} requests failed'.format(len(failures)))
+    return requests * clients / elapsed, pool.connections_opened
+
+
+def open_idle_connection(port):
+    """
+    :return: a connection that has had one response and is kept open, idle
+    """
+    connection = socket.create_connection(('127.0.0.1', port))
+    connection.sendall(b'HEAD /small.bin HTTP/1.1\r\nHost: localhost\r\n\r\n')
+    response = b''
+    while not response.endswith(b'\r\n\r\n'):
+        response += connection.recv(65536)
+    return connection
+
+
+def measure_new_client(directory, pool_size, server_options):
+    """
+    :return: seconds a new connection waits for its response while pool_size connections are idle
+    :rtype: float
+    """
+    with lab6_server(directory, pool_size=pool_size, **server_options) as port:
+        idle_connections = [open_idle_connection(port) for x in range(pool_size)]
+        start = time.perf_counter()
+        connection = socket.create_connection(('127.0.0.1', port))
+        connection.sendall(b'GET /small.bin HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n')
+        while connection.recv(65536):
+            pass
+        elapsed = time.perf_counter() - start
+        connection.close()
+        for idle_connection in idle_connections:
+            idle_connection.close()
+    return elapsed
+
+
+def run(requests, clients, file_size):
+    directory = tempfile.mkdtemp()
+    with open(os.path.join(directory, 'small.bin'), 'wb') as output_file:
+        output_file.write(os.urandom(file_size))
+    print('{0} clients x {1} requests for a {2} byte file'.format(clients, requests, file_size))
+    print('{0:<8}{1:<12}{2:>14}{3:>14}'.format('engine', 'connection', 'requests/s', 'connections'))
+    for engine in ('thread', 'event'):
+        for name, max_requests in (('close', 1), ('keep-alive', 1000)):
+            rate, connections = measure(directory, requests, clients,
+                                        {'engine': engine, 'max_requests': max_requests})
+            print('{0:<8}{1:<12}{2:>14.1f}{3:>14}'.format(engine, name, rate, connections))
+    print()
+    print('new client with {0} idle keep-alive connections (keep-alive timeout {1}s)'.format(
+        lab6.POOL_SIZE, lab6.KEEP_ALIVE_TIMEOUT))
+    for engine in ('thread', 'event'):
+        wait = measure_new_client(directory, lab6.POOL_SIZE, {'engine': engine})
+        print('{0:<8}{1:>10.1f} ms'.format(engine, wait * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500, help='requests per client')
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--file-size', type=int, default=1024)
+    args = parser.parse_args()
+    run(args.requests, args.clients, args.file_size)
+
+
+if __name__ == '__main__':
+    main()
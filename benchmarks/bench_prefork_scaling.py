@@ -0,0 +1,125 @@
+"""
+Throughput scaling benchmark for lab6's multi-process (prefork) mode.
+
+For each process count, starts lab6 with that many worker processes and drives it with
+client processes that each keep several persistent connections busy for a fixed time.
+Reports requests/sec and the speedup over the first process count. The clients need
+spare cores too, so scaling shows up to about half the machine's cores.
+
+Usage: python benchmarks/bench_prefork_scaling.py [--processes N ...] [--clients N] [--connections N]
+                                                  [--duration SECONDS] [--file-size BYTES] [--engine thread|event]
+"""
+
+import argparse
+import multiprocessing
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from buffered_reader import BufferedReader  # noqa: E402
+import lab5  # noqa: E402
+from local_server import lab6_server  # noqa: E402
+
+
+def default_process_counts():
+    """
+    :return: 1, 2, 4, ... up to the number of cores
+    :rtype: list
+    """
+    counts = [1]
+    while counts[-1] * 2 <= os.cpu_count():
+        counts.append(counts[-1] * 2)
+    return counts
+
+
+def keep_busy(port, deadline, counts):
+    """
+    Send requests back to back on one persistent connection until the deadline,
+    appending the number of complete responses to counts
+    """
+    data_socket = socket.create_connection(('127.0.0.1', port))
+    reader = BufferedReader(data_socket)
+    request = lab5.build_request(b'127.0.0.1', b'/load.bin', True)
+    completed = 0
+    try:
+        while time.perf_counter() < deadline:
+            data_socket.sendall(request)
+            status_line, headers = lab5.read_response_headers(reader)
+            for block in lab5.interpret_body(reader, headers):
+                pass
+            if not lab5.is_persistent(status_line, headers):
+                # The server reached its per-connection request limit
+                data_socket.close()
+                data_socket = socket.create_connection(('127.0.0.1', port))
+                reader = BufferedReader(data_socket)
+            completed += 1
+    finally:
+        data_socket.close()
+    counts.append(completed)
+
+
+def client_process(port, connections, duration, results):
+    """
+    Run in each client process: keep connections busy for duration seconds and report the total
+    """
+    deadline = time.perf_counter() + duration
+    counts = []
+    threads = [threading.Thread(target=keep_busy, args=(port, deadline, counts)) for x in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put(sum(counts))
+
+
+def measure(port, clients, connections, duration):
+    """
+    :return: requests/sec served across all client processes
+    :rtype: float
+    """
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=client_process, args=(port, connections, duration, results))
+                 for x in range(clients)]
+    for process in processes:
+        process.start()
+    total = sum(results.get() for process in processes)
+    for process in processes:
+        process.join()
+    return total / duration
+
+
+def run(process_counts, clients, connections, duration, file_size, engine):
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, 'load.bin'), 'wb') as output_file:
+            output_file.write(os.urandom(file_size))
+        print('{0} cores, {1} client processes x {2} connections, {3} s per run, {4} byte file, {5} engine'.format(
+            os.cpu_count(), clients, connections, duration, file_size, engine))
+        print('{0:>10}{1:>14}{2:>10}'.format('processes', 'requests/s', 'speedup'))
+        baseline = None
+        for processes in process_counts:
+            with lab6_server(directory, engine=engine, processes=processes) as port:
+                rate = measure(port, clients, connections, duration)
+            baseline = baseline or rate
+            print('{0:>10}{1:>14.1f}{2:>9.2f}x'.format(processes, rate, rate / baseline))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--processes', type=int, nargs='+', default=default_process_counts())
+    parser.add_argument('--clients', type=int, default=max(1, os.cpu_count() // 2),
+                        help='load generating processes')
+    parser.add_argument('--connections', type=int, default=8, help='persistent connections per client process')
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--file-size', type=int, default=4096)
+    parser.add_argument('--engine', choices=['thread', 'event'], default='event')
+    args = parser.parse_args()
+    run(args.processes, args.clients, args.connections, args.duration, args.file_size, args.engine)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+Loopback benchmark for the buffered socket reader.
+
+Sends a stream of HTTP responses over a loopback TCP connection and parses them twice:
+once byte at a time with recv(1), the way the labs used to read, and once with the lab5
+parsing functions running on top of buffered_reader.BufferedReader.
+Reports the number of receive syscalls per message and the parse time for each.
+
+Usage: python benchmarks/bench_reader_syscalls.py [--messages N] [--body-size BYTES]
+"""
+
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from buffered_reader import BufferedReader  # noqa: E402
+import lab5  # noqa: E402
+
+
+class CountingSocket:
+    """
+    Wraps a socket and counts the calls made to recv and recv_into
+    """
+
+    def __init__(self, data_socket):
+        self.data_socket = data_socket
+        self.recv_count = 0
+
+    def recv(self, size):
+        self.recv_count += 1
+        return self.data_socket.recv(size)
+
+    def recv_into(self, buffer):
+        self.recv_count += 1
+        return self.data_socket.recv_into(buffer)
+
+
+def build_response(body_size):
+    """
+    :param int body_size: the number of bytes in the response body
+    :return: one HTTP response with a Content-Length body
+    :rtype: bytes object
+    """
+    body = b'x' * body_size
+    return (b'HTTP/1.1 200 OK\r\n'
+            b'Date: Sun, 06 Nov 1994 08:49:37 GMT\r\n'
+            b'Server: bench\r\n'
+            b'Content-Type: text/plain\r\n'
+            b'Cache-Control: no-cache\r\n'
+            b'Content-Length: ' + str(body_size).encode('ASCII') + b'\r\n'
+            b'\r\n' + body)
+
+
+def serve(listen_socket, payload):
+    """
+    Accept one connection, send the payload, and close
+    """
+    data_socket, address = listen_socket.accept()
+    listen_socket.close()
+    data_socket.sendall(payload)
+    data_socket.close()
+
+
+def connect(payload):
+    """
+    :return: a client socket connected to a loopback server that sends payload
+    """
+    listen_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listen_socket.bind(('127.0.0.1', 0))
+    listen_socket.listen(1)
+    server = threading.Thread(target=serve, args=(listen_socket, payload), daemon=True)
+    server.start()
+    return socket.create_connection(listen_socket.getsockname())
+
+
+def read_message_byte_at_a_time(data_socket):
+    """
+    Parse one response the way the labs did before the buffered reader: one recv(1) per byte
+    """
+    headers = b''
+    while b'\r\n\r\n' not in headers:
+        headers += data_socket.recv(1)
+    body_length = lab5.interpret_body_length(headers)
+    data = b''
+    for x in range(int(body_length)):
+        data += data_socket.recv(1)
+    return data
+
+
+def read_message_buffered(reader):
+    """
+    Parse one response with the lab5 functions on top of the buffered reader
+    """
+    lab5.get_status_code(lab5.get_next_header(reader))
+    headers = b''
+    while b'\r\n\r\n' not in headers:
+        headers += lab5.get_next_header(reader)
+    body_length = lab5.interpret_body_length(headers)
+    return b''.join(lab5.interpret_content_length(reader, int(body_length)))
+
+
+def run(messages, body_size):
+    """
+    Run both readers over the same stream and print syscalls per message
+    """
+    payload = build_response(body_size) * messages
+
+    counting_socket = CountingSocket(connect(payload))
+    start = time.perf_counter()
+    for x in range(messages):
+        read_message_byte_at_a_time(counting_socket)
+    before_time = time.perf_counter() - start
+    before_calls = counting_socket.recv_count
+    counting_socket.data_socket.close()
+
+    data_socket = connect(payload)
+    reader = BufferedReader(data_socket)
+    start = time.perf_counter()
+    for x in range(messages):
+        read_message_buffered(reader)
+    after_time = time.perf_counter() - start
+    after_calls = reader.recv_count
+    data_socket.close()
+
+    print('{0} messages of {1} bytes over loopback'.format(messages, len(payload) // messages))
+    print('{0:<10}{1:>18}{2:>14}{3:>14}'.format('reader', 'syscalls/message', 'total (s)', 'us/message'))
+    for name, calls, seconds in (('recv(1)', before_calls, before_time), ('buffered', after_calls, after_time)):
+        print('{0:<10}{1:>18.2f}{2:>14.3f}{3:>14.1f}'.format(
+            name, calls / messages, seconds, seconds / messages * 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--body-size', type=int, default=512)
+    args = parser.parse_args()
+    run(args.messages, args.body_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark of request heads parsed per second by request_parser.RequestParser.
+
+Parses a typical browser GET request fed in one piece, fed in small chunks as a slow
+network would deliver it, and as a batch of pipelined requests. The baseline is lab6's
+previous parse: BufferedReader.read_until for each line and a split on ': ' for each header,
+reading from a socket pair.
+
+Usage: python benchmarks/bench_request_parser.py [--requests N] [--chunk-size BYTES]
+"""
+
+import argparse
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from buffered_reader import BufferedReader  # noqa: E402
+from request_parser import RequestParser  # noqa: E402
+
+BROWSER_REQUEST = (
+    b'GET /static/css/site.css?v=3 HTTP/1.1\r\n'
+    b'Host: localhost:8080\r\n'
+    b'User-Agent: Mozilla/5.0 (X11; Linux x86_64; rv:120.0) Gecko/20100101 Firefox/120.0\r\n'
+    b'Accept: text/css,*/*;q=0.1\r\n'
+    b'Accept-Language: en-US,en;q=0.5\r\n'
+    b'Accept-Encoding: gzip, deflate, br\r\n'
+    b'Connection: keep-alive\r\n'
+    b'Referer: http://localhost:8080/index.html\r\n'
+    b'If-None-Match: "17a2b3c4d5e6f-2f1"\r\n'
+    b'Cache-Control: max-age=0\r\n'
+    b'\r\n'
+)
+
+
+def baseline_parse(reader):
+    """
+    The previous lab6 parse of one request head
+    """
+    request_line = reader.read_until(b'\r\n').split()
+    headers = {}
+    header = reader.read_until(b'\r\n')
+    while header != b'\r\n':
+        name, value = header.decode('ASCII').split(': ')
+        headers[name] = value
+        header = reader.read_until(b'\r\n')
+    return request_line[1], request_line[2], headers
+
+
+def time_baseline(requests):
+    """
+    :return: seconds to parse the requests with the baseline, read from a socket pair in batches
+    """
+    writer, reader_socket = socket.socketpair()
+    reader = BufferedReader(reader_socket)
+    batch = 100
+    elapsed = 0
+    for x in range(requests // batch):
+        writer.sendall(BROWSER_REQUEST * batch)
+        start = time.perf_counter()
+        for y in range(batch):
+            baseline_parse(reader)
+        elapsed += time.perf_counter() - start
+    writer.close()
+    reader_socket.close()
+    return elapsed
+
+
+def time_whole(requests):
+    """
+    :return: seconds to parse the requests, each fed in one piece
+    """
+    parser = RequestParser()
+    start = time.perf_counter()
+    for x in range(requests):
+        parser.feed(BROWSER_REQUEST)
+    return time.perf_counter() - start
+
+
+def time_chunked(requests, chunk_size):
+    """
+    :return: seconds to parse the requests, each fed in chunk_size pieces
+    """
+    chunks = [BROWSER_REQUEST[i:i + chunk_size] for i in range(0, len(BROWSER_REQUEST), chunk_size)]
+    parser = RequestParser()
+    start = time.perf_counter()
+    for x in range(requests):
+        for chunk in chunks:
+            parser.feed(chunk)
+    return time.perf_counter() - start
+
+
+def time_pipelined(requests):
+    """
+    :return: seconds to parse the requests, fed 100 pipelined requests at a time
+    """
+    batch = 100
+    parser = RequestParser()
+    data = BROWSER_REQUEST * batch
+    start = time.perf_counter()
+    for x in range(requests // batch):
+        request = parser.feed(data)
+        while request is not None:
+            request = parser.feed()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=100000)
+    parser.add_argument('--chunk-size', type=int, default=16)
+    args = parser.parse_args()
+    cases = (
+        ('baseline (read_until)', time_baseline(args.requests)),
+        ('parser, whole request', time_whole(args.requests)),
+        ('parser, {0} byte chunks'.format(args.chunk_size), time_chunked(args.requests, args.chunk_size)),
+        ('parser, pipelined x100', time_pipelined(args.requests)),
+    )
+    print('{0} byte request, {1} requests'.format(len(BROWSER_REQUEST), args.requests))
+    print('{0:<28}{1:>14}{2:>12}'.format('case', 'requests/s', 'us/req'))
+    for name, elapsed in cases:
+        print('{0:<28}{1:>14.0f}{2:>12.2f}'.format(name, args.requests / elapsed, elapsed / args.requests * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark of serving a large file from lab6 with sendfile against reading it into memory.
+
+Serves one large file (1 GB by default) from two server processes: the lab6 server, which
+sends file bodies with socket.sendfile, and a copy of the earlier lab6 response path, which
+reads the whole file with parse_file and joins it to the headers before sendall. Each server
+is asked for the file a few times, and the server process's CPU time and peak resident
+memory are read from /proc (Linux only).
+
+Usage: python benchmarks/bench_sendfile.py [--size BYTES] [--requests N]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lab5  # noqa: E402
+from local_server import REPO_DIRECTORY, free_port, wait_for_port  # noqa: E402
+
+# The lab6 response path before sendfile: read the file, then concatenate and send
+BUFFERED_SERVER = '''
+import socket
+import lab6
+from buffered_reader import BufferedReader
+
+server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+server_socket.bind(('', {port}))
+server_socket.listen(16)
+while True:
+    request_socket, request_address = server_socket.accept()
+    try:
+        method, url, version, headers = lab6.parse_request(BufferedReader(request_socket), lab6.RequestParser())
+        try:
+            response_headers = lab6.generate_response_headers(url)
+            response_body = lab6.parse_file(url)
+            status_line = lab6.generate_status_line(b'200')
+        except OSError:
+            response_headers = {{}}
+            response_body = b''
+            status_line = lab6.generate_status_line(b'404')
+        response = lab6.assemble_response(status_line, response_headers, response_body)
+        request_socket.sendall(response)
+    except EOFError:
+        pass
+    request_socket.close()
+'''
+
+SENDFILE_SERVER = 'import lab6; lab6.http_server_setup({port}, pool_size=4)'
+
+
+def process_usage(pid):
+    """
+    :return: the CPU seconds used so far and the peak resident memory in MB of a process
+    :rtype: tuple
+    """
+    with open('/proc/{0}/stat'.format(pid)) as stat_file:
+        fields = stat_file.read().rsplit(')', 1)[1].split()
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    with open('/proc/{0}/status'.format(pid)) as status_file:
+        for line in status_file:
+            if line.startswith('VmHWM:'):
+                peak_mb = int(line.split()[1]) / 1024
+    return cpu_seconds, peak_mb
+
+
+def measure(code, directory, requests):
+    """
+    Start a server from code, fetch the big file requests times, and measure the server
+    :return: seconds per request, server CPU seconds per request, and server peak memory in MB
+    :rtype: tuple
+    """
+    port = free_port()
+    environment = dict(os.environ, PYTHONPATH=REPO_DIRECTORY)
+    server = subprocess.Popen([sys.executable, '-c', code.format(port=port)], cwd=directory, env=environment,
+                              stdout=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        cpu_before, peak_before = process_usage(server.pid)
+        start = time.perf_counter()
+        for x in range(requests):
+            status_code = lab5.make_http_request(b'127.0.0.1', port, b'/big.bin', os.devnull)
+            if status_code != '200':
+                raise RuntimeError('unexpected status {0}'.format(status_code))
+        elapsed = time.perf_counter() - start
+        cpu_after, peak_after = process_usage(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+    return elapsed / requests, (cpu_after - cpu_before) / requests, peak_after
+
+
+def run(size, requests):
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'big.bin')
+    with open(path, 'wb') as output_file:
+        block = os.urandom(1024 * 1024)
+        for offset in range(0, size, len(block)):
+            output_file.write(block[:size - offset])
+    try:
+        print('{0} requests for a {1} byte file'.format(requests, size))
+        print('{0:<10}{1:>16}{2:>20}{3:>20}'.format('server', 's/request', 'server CPU s/req', 'server peak MB'))
+        for name, code in (('buffered', BUFFERED_SERVER), ('sendfile', SENDFILE_SERVER)):
+            seconds, cpu_seconds, peak_mb = measure(code, directory, requests)
+            print('{0:<10}{1:>16.3f}{2:>20.3f}{3:>20.1f}'.format(name, seconds, cpu_seconds, peak_mb))
+    finally:
+        os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=1024 * 1024 * 1024)
+    parser.add_argument('--requests', type=int, default=3)
+    args = parser.parse_args()
+    run(args.size, args.requests)
+
+
+if __name__ == '__main__':
+    main()
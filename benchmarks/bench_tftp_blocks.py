@@ -0,0 +1,89 @@
+"""
+Benchmark how fast lab7 produces and sends TFTP data blocks.
+
+Compares the old data path, which opened, seeked, read and closed the file for every
+512 byte block and joined the header to a copy of the block, with the current one, which
+slices each block out of a shared memory map and sends it with the header in one sendmsg
+call. Each is measured reading blocks only, and reading and sending each block to a local
+UDP socket that discards what it receives.
+
+Usage: python benchmarks/bench_tftp_blocks.py [--file-size BYTES] [--repeat N]
+"""
+
+import argparse
+import os
+import socket
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lab7  # noqa: E402
+
+
+def get_file_block_reopening(filename, block_number):
+    """
+    The old get_file_block: open the file for every block
+    """
+    file = open(filename, 'rb')
+    file.seek((block_number - 1) * lab7.TFTP_BLOCK_SIZE)
+    block_data = file.read(lab7.TFTP_BLOCK_SIZE)
+    file.close()
+    return block_data
+
+
+def send_data_block_reopening(data_socket, filename, address, block_count):
+    """
+    The old send_data_block: read the block by reopening the file, then send a joined copy
+    """
+    block_data = get_file_block_reopening(filename, block_count)
+    data_socket.sendto(lab7.OP_DATA + (block_count % 65536).to_bytes(2, 'big') + block_data, address)
+
+
+def best_rate(function, block_count, repeat):
+    """
+    :return: the best blocks per second over repeat passes through every block
+    :rtype: float
+    """
+    best = float('inf')
+    for x in range(repeat):
+        start = time.perf_counter()
+        for block_number in range(1, block_count + 1):
+            function(block_number)
+        best = min(best, time.perf_counter() - start)
+    return block_count / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--file-size', type=int, default=8 * 1024 * 1024)
+    parser.add_argument('--repeat', type=int, default=3)
+    options = parser.parse_args()
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(('127.0.0.1', 0))
+    address = sink.getsockname()
+    data_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'boot.img')
+        with open(filename, 'wb') as output_file:
+            output_file.write(os.urandom(options.file_size))
+        block_count = lab7.get_file_block_count(options.file_size)
+        file_data = lab7.FILE_MAPS.lookup(filename)
+        cases = [
+            ('read, open per block', lambda n: get_file_block_reopening(filename, n)),
+            ('read, shared mmap', lambda n: lab7.get_file_block(file_data, n)),
+            ('read+send, open per block', lambda n: send_data_block_reopening(data_socket, filename, address, n)),
+            ('read+send, shared mmap', lambda n: lab7.send_data_block(data_socket, file_data, address, n)),
+        ]
+        print('{0} blocks of {1} bytes'.format(block_count, lab7.TFTP_BLOCK_SIZE))
+        print('{0:<28}{1:>16}'.format('data path', 'blocks/s'))
+        for name, function in cases:
+            print('{0:<28}{1:>16,.0f}'.format(name, best_rate(function, block_count, options.repeat)))
+        file_data = None
+    data_socket.close()
+    sink.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Benchmark lab7 serving many TFTP clients at once.
+
+Starts lab7 in a separate process and has each number of clients download the same file at
+the same time, each from its own thread. A server that handles one transfer at a time takes
+about N times as long for N clients as for one; a server that multiplexes the transfers
+keeps the wall time close to that of one client while the link and CPU allow.
+
+Usage: python benchmarks/bench_tftp_clients.py [--clients N ...] [--file-size BYTES]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from local_server import lab7_server  # noqa: E402
+from tftp_client import download  # noqa: E402
+
+
+def run_clients(port, clients, expected):
+    """
+    :return: the wall time in seconds for every client to download the file, and the number that failed
+    :rtype: tuple
+    """
+    failures = []
+
+    def client():
+        try:
+            if download(port, b'boot.img')[0] != expected:
+                failures.append('corrupt')
+        except OSError as error:
+            failures.append(error)
+
+    threads = [threading.Thread(target=client) for x in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, len(failures)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--file-size', type=int, default=256 * 1024)
+    options = parser.parse_args()
+    contents = os.urandom(options.file_size)
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, 'boot.img'), 'wb') as output_file:
+            output_file.write(contents)
+        with lab7_server(directory) as port:
+            print('{0:>8}{1:>12}{2:>16}{3:>12}{4:>10}'.format('clients', 'wall s', 'transfers/s', 'MB/s', 'failed'))
+            for clients in options.clients:
+                elapsed, failed = run_clients(port, clients, contents)
+                print('{0:>8}{1:>12.3f}{2:>16.1f}{3:>12.2f}{4:>10}'.format(
+                    clients, elapsed, clients / elapsed, clients * options.file_size / elapsed / 1e6, failed))
+
+
+if __name__ == '__main__':
+    main()
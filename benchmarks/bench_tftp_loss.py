@@ -0,0 +1,58 @@
+"""
+Benchmark lab7 downloads over a lossy network.
+
+Starts lab7 in a separate process and downloads one file with the client dropping a
+fraction of the packets it sends and receives, so the server has to notice the losses and
+send blocks again. Also downloads it with the client sending every acknowledgement twice,
+which a server that answers duplicate acknowledgements turns into every block being sent
+twice (the Sorcerer's Apprentice problem). Reports the time taken, the packets the client
+received, and how many of those were blocks it already had.
+
+Usage: python benchmarks/bench_tftp_loss.py [--file-size BYTES] [--loss-rates FRACTION ...]
+                                            [--window-sizes N ...] [--seed N]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from local_server import lab7_server  # noqa: E402
+from tftp_client import download  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--file-size', type=int, default=2 * 1024 * 1024)
+    parser.add_argument('--loss-rates', type=float, nargs='+', default=[0, 0.01, 0.05, 0.1])
+    parser.add_argument('--window-sizes', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--seed', type=int, default=0)
+    options = parser.parse_args()
+    contents = os.urandom(options.file_size)
+    cases = [(loss_rate, window_size, False) for window_size in options.window_sizes
+             for loss_rate in options.loss_rates]
+    cases += [(0, window_size, True) for window_size in options.window_sizes]
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, 'boot.img'), 'wb') as output_file:
+            output_file.write(contents)
+        with lab7_server(directory) as port:
+            print('{0:>8}{1:>12}{2:>16}{3:>10}{4:>10}{5:>12}'.format(
+                'loss', 'windowsize', 'duplicate acks', 'seconds', 'packets', 'duplicates'))
+            for loss_rate, window_size, duplicate_acks in cases:
+                stats = {}
+                start = time.perf_counter()
+                data, accepted = download(port, b'boot.img', window_size=window_size, loss_rate=loss_rate,
+                                          duplicate_acks=duplicate_acks, seed=options.seed, stats=stats)
+                elapsed = time.perf_counter() - start
+                if data != contents:
+                    raise RuntimeError('downloaded file differs from the original')
+                print('{0:>8.0%}{1:>12}{2:>16}{3:>10.3f}{4:>10}{5:>12}'.format(
+                    loss_rate, window_size, 'yes' if duplicate_acks else 'no', elapsed,
+                    stats['packets'], stats['duplicates']))
+
+
+if __name__ == '__main__':
+    main()
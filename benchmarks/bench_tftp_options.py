@@ -0,0 +1,57 @@
+"""
+Benchmark lab7 downloads with different blksize and windowsize options.
+
+Starts lab7 in a separate process and downloads one file with each combination of block
+size and window size, reporting the best time of a few downloads and the throughput.
+The first row, with no options, is the plain RFC 1350 transfer of 512 byte blocks sent
+in lock-step with the acknowledgements.
+
+Usage: python benchmarks/bench_tftp_options.py [--file-size BYTES] [--block-sizes N ...]
+                                               [--window-sizes N ...] [--repeat N]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from local_server import lab7_server  # noqa: E402
+from tftp_client import download  # noqa: E402
+
+# Receive buffer for the client, big enough to hold a whole window of the largest blocks
+RECEIVE_BUFFER_SIZE = 4 * 1024 * 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--file-size', type=int, default=32 * 1024 * 1024)
+    parser.add_argument('--block-sizes', type=int, nargs='+', default=[512, 1428, 8192, 65464])
+    parser.add_argument('--window-sizes', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--repeat', type=int, default=3)
+    options = parser.parse_args()
+    contents = os.urandom(options.file_size)
+    cases = [(None, None)] + [(block_size, window_size) for block_size in options.block_sizes
+                              for window_size in options.window_sizes]
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, 'boot.img'), 'wb') as output_file:
+            output_file.write(contents)
+        with lab7_server(directory) as port:
+            print('{0:>10}{1:>12}{2:>12}{3:>12}'.format('blksize', 'windowsize', 'seconds', 'MB/s'))
+            for block_size, window_size in cases:
+                best = float('inf')
+                for x in range(options.repeat):
+                    start = time.perf_counter()
+                    data, accepted = download(port, b'boot.img', block_size=block_size, window_size=window_size,
+                                              receive_buffer_size=RECEIVE_BUFFER_SIZE)
+                    best = min(best, time.perf_counter() - start)
+                    if data != contents:
+                        raise RuntimeError('downloaded file differs from the original')
+                print('{0:>10}{1:>12}{2:>12.3f}{3:>12.1f}'.format(
+                    accepted.get('blksize', 512), accepted.get('windowsize', 1), best, options.file_size / best / 1e6))
+
+
+if __name__ == '__main__':
+    main()
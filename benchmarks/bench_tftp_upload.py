@@ -0,0 +1,119 @@
+"""
+Benchmark lab7 receiving uploads.
+
+First compares ways of writing the blocks of an upload to disk, in this process: opening
+the file for every block (what the old put_file_block did), syncing after every block,
+and the current data path, which appends each block to one buffered file handle and syncs
+once at the end. Then starts lab7 in a separate process and has each number of clients
+upload a file at the same time, as devices sending their config backups would.
+
+Usage: python benchmarks/bench_tftp_upload.py [--file-size BYTES] [--clients N ...]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lab7  # noqa: E402
+from local_server import lab7_server  # noqa: E402
+from tftp_client import upload  # noqa: E402
+
+
+def write_reopening(filename, blocks):
+    """
+    Open, seek, write and close the file for every block
+    """
+    open(filename, 'wb').close()
+    for block_number, block in enumerate(blocks, 1):
+        with open(filename, 'r+b') as output_file:
+            output_file.seek((block_number - 1) * lab7.TFTP_BLOCK_SIZE)
+            output_file.write(block)
+
+
+def write_syncing(filename, blocks):
+    """
+    Keep the file open, but write and sync every block as it arrives
+    """
+    with open(filename, 'wb', buffering=0) as output_file:
+        for block in blocks:
+            output_file.write(block)
+            os.fsync(output_file.fileno())
+
+
+def write_buffered(filename, blocks):
+    """
+    The current data path: buffered writes through put_file_block, synced once at the end
+    """
+    output_file, temporary_filename = lab7.open_upload_file(filename, sum(len(block) for block in blocks))
+    for block_number, block in enumerate(blocks, 1):
+        lab7.put_file_block(output_file, block, block_number)
+    output_file.flush()
+    output_file.truncate()
+    os.fsync(output_file.fileno())
+    output_file.close()
+    os.replace(temporary_filename, filename)
+
+
+def run_clients(port, clients, contents):
+    """
+    :return: the wall time in seconds for every client to upload its file, and the number that failed
+    :rtype: tuple
+    """
+    failures = []
+
+    def client(index):
+        try:
+            upload(port, 'device-{0}.conf'.format(index).encode('ASCII'), contents)
+        except OSError as error:
+            failures.append(error)
+
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, len(failures)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--file-size', type=int, default=1024 * 1024)
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 8, 32])
+    options = parser.parse_args()
+    contents = os.urandom(options.file_size)
+    blocks = [contents[offset:offset + lab7.TFTP_BLOCK_SIZE]
+              for offset in range(0, options.file_size + 1, lab7.TFTP_BLOCK_SIZE)]
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'upload.bin')
+        print('{0:<32}{1:>16}'.format('write path', 'blocks/s'))
+        for name, write in [('open per block', write_reopening), ('fsync per block', write_syncing),
+                            ('buffered, one fsync', write_buffered)]:
+            start = time.perf_counter()
+            write(filename, blocks)
+            elapsed = time.perf_counter() - start
+            with open(filename, 'rb') as input_file:
+                if input_file.read() != contents:
+                    raise RuntimeError(name + ' wrote the wrong contents')
+            print('{0:<32}{1:>16,.0f}'.format(name, len(blocks) / elapsed))
+        os.remove(filename)
+        print()
+        with lab7_server(directory) as port:
+            print('{0:>8}{1:>12}{2:>12}{3:>10}'.format('clients', 'wall s', 'MB/s', 'failed'))
+            for clients in options.clients:
+                elapsed, failed = run_clients(port, clients, contents)
+                for index in range(clients):
+                    with open(os.path.join(directory, 'device-{0}.conf'.format(index)), 'rb') as input_file:
+                        if input_file.read() != contents:
+                            raise RuntimeError('upload {0} differs from the original'.format(index))
+                print('{0:>8}{1:>12.3f}{2:>12.2f}{3:>10}'.format(
+                    clients, elapsed, clients * options.file_size / elapsed / 1e6, failed))
+
+
+if __name__ == '__main__':
+    main()
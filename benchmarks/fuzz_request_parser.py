@@ -0,0 +1,168 @@
+"""
+Fuzz harness for request_parser.RequestParser.
+
+Builds random valid request heads (repeated and colon-containing headers, CRLF or bare LF
+line endings, pipelined batches) and random mutations of them: flipped, inserted, deleted
+and repeated bytes, and truncations. Each input is fed in one piece and in random chunks,
+and the harness checks that:
+
+- the parser only ever raises RequestParseError
+- valid requests parse to exactly what was generated
+- the result does not depend on how the bytes were split into chunks
+- between requests the parser never holds more than one partial line within the limits
+
+Usage: python benchmarks/fuzz_request_parser.py [--iterations N] [--seed N]
+"""
+
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from request_parser import Request, RequestParser, RequestParseError  # noqa: E402
+
+# Small limits, so the fuzzer reaches them often
+LIMITS = {'max_request_line_size': 200, 'max_header_line_size': 120, 'max_headers': 12, 'max_headers_size': 600}
+
+TOKEN_CHARACTERS = "!#$%&'*+-.^_`|~0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+VALUE_CHARACTERS = ''.join(chr(c) for c in range(0x21, 0x7f)) + ' :\t'
+SEGMENT_CHARACTERS = ''.join(chr(c) for c in range(0x21, 0x7f) if chr(c) not in '/\\')
+
+
+def random_text(rng, characters, low, high):
+    return ''.join(rng.choice(characters) for x in range(rng.randint(low, high)))
+
+
+def random_target(rng):
+    """
+    :return: a random target the parser accepts: no .. segments, no backslashes, and no // at the start
+    """
+    segments = [random_text(rng, SEGMENT_CHARACTERS, 0, 10) for x in range(rng.randint(1, 4))]
+    segments = ['...' if segment == '..' else segment for segment in segments]
+    if not segments[0] and len(segments) > 1:
+        segments[0] = 'a'
+    return '/' + '/'.join(segments)
+
+
+def random_request(rng):
+    """
+    :return: a valid request head as bytes, and the Request it should parse to
+    """
+    method = rng.choice(['GET', 'HEAD', 'POST', random_text(rng, TOKEN_CHARACTERS, 1, 8)])
+    target = random_target(rng)
+    version = rng.choice(['HTTP/1.1', 'HTTP/1.0'])
+    ending = rng.choice(['\r\n', '\n'])
+    lines = [' '.join((method, target, version))]
+    headers = {}
+    first_names = {}
+    for x in range(rng.randint(0, 8)):
+        name = rng.choice(['Host', 'host', 'Accept', 'X-Colons', random_text(rng, TOKEN_CHARACTERS, 1, 10)])
+        value = random_text(rng, VALUE_CHARACTERS, 0, 30).strip(' \t')
+        lines.append(name + ':' + rng.choice(['', ' ', '\t ']) + value + rng.choice(['', ' ']))
+        first_name = first_names.setdefault(name.lower(), name)
+        headers[first_name] = headers[first_name] + ', ' + value if first_name in headers else value
+    head = (ending.join(lines) + ending + ending).encode('latin-1')
+    return head, Request(method.encode('ASCII'), target, version.encode('ASCII'), headers)
+
+
+def mutate(rng, data):
+    """
+    :return: data with a few random bytes flipped, inserted, deleted or repeated, or cut short
+    """
+    data = bytearray(data)
+    for x in range(rng.randint(1, 4)):
+        position = rng.randrange(len(data) + 1)
+        operation = rng.randrange(5)
+        if operation == 0 and position < len(data):
+            data[position] = rng.randrange(256)
+        elif operation == 1:
+            data[position:position] = bytes([rng.choice([0, 9, 10, 13, 32, 58, 127, 255, rng.randrange(256)])])
+        elif operation == 2:
+            del data[position:position + rng.randint(1, 8)]
+        elif operation == 3:
+            data[position:position] = data[position:position + 20] * rng.randint(1, 40)
+        else:
+            del data[position:]
+    return bytes(data)
+
+
+def split(rng, data):
+    """
+    :return: data cut into random chunks, some of them empty
+    """
+    chunks = []
+    position = 0
+    while position < len(data):
+        size = rng.choice([0, 1, 2, 3, 7, 16, 64, len(data)])
+        chunks.append(data[position:position + size])
+        position += size
+    return chunks
+
+
+def parse_all(chunks):
+    """
+    Feed the chunks in order, collecting every request and the status code of any error
+
+    :return: the results, and the most bytes the parser held between requests
+    :rtype: tuple
+    """
+    parser = RequestParser(**LIMITS)
+    results = []
+    held = 0
+    try:
+        for chunk in chunks:
+            request = parser.feed(chunk)
+            while request is not None:
+                results.append(request)
+                request = parser.feed()
+            held = max(held, parser.buffered())
+    except RequestParseError as error:
+        results.append(('error', error.status_code))
+    return results, held
+
+
+def check(rng, data, expected=None):
+    """
+    Check one input against the invariants, raising AssertionError if one fails
+    """
+    whole, whole_held = parse_all([data])
+    chunked, chunked_held = parse_all(split(rng, data))
+    assert whole == chunked, 'split changed the result: {0!r} vs {1!r}'.format(whole, chunked)
+    line_limit = max(LIMITS['max_request_line_size'], LIMITS['max_header_line_size']) + 1
+    assert chunked_held <= line_limit, 'held {0} bytes'.format(chunked_held)
+    if expected is not None:
+        assert whole == expected, 'parsed {0!r}, expected {1!r}'.format(whole, expected)
+    return whole
+
+
+def run(iterations, seed):
+    rng = random.Random(seed)
+    outcomes = {}
+    for iteration in range(iterations):
+        heads = [random_request(rng) for x in range(rng.choice([1, 1, 1, 3]))]
+        data = b''.join(head for head, request in heads)
+        try:
+            if sum(len(head) for head, request in heads) <= LIMITS['max_headers_size']:
+                check(rng, data, [request for head, request in heads])
+            result = check(rng, mutate(rng, data))
+        except AssertionError:
+            print('failed at iteration {0} with seed {1}'.format(iteration, seed))
+            raise
+        outcome = 'ok' if not result or isinstance(result[-1], Request) else result[-1][1].decode('ASCII')
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    print('{0} iterations, seed {1}: all invariants held'.format(iterations, seed))
+    print('mutated inputs by outcome: {0}'.format(dict(sorted(outcomes.items()))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=random.randrange(1 << 32))
+    args = parser.parse_args()
+    run(args.iterations, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+"""
+Load generator and latency benchmark for the lab6 HTTP server.
+
+Starts lab6 in a separate process, serving one file for each size in the mix, and drives it
+for a fixed time at each concurrency level with an asyncio client built on lab5's request
+and body helpers. Each of the concurrent clients sends requests back to back, picking a file
+by the mix weights for every request, over one persistent connection (or a new connection
+per request with --no-keep-alive). Only requests started after the warmup are measured.
+
+The results (throughput, p50/p90/p99/p999 latency and a latency histogram for each level)
+are written as JSON, and a short table is printed to stderr. With --compare, the results are
+checked against an earlier JSON file, and the exit status is 1 if throughput fell or p99
+latency rose by more than --tolerance at any level, so a regression in a server engine shows
+up before it is deployed.
+
+Usage: python benchmarks/load_test_lab6.py [--concurrency N ...] [--duration SECONDS] [--warmup SECONDS]
+                                           [--sizes BYTES[:WEIGHT] ...] [--keep-alive | --no-keep-alive]
+                                           [--client-processes N] [--seed N] [--output FILE]
+                                           [--compare FILE] [--tolerance FRACTION]
+                                           [--engine thread|event] [--pool-size N] [--backlog N]
+                                           [--queue-size N] [--processes N]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from buffered_reader import DEFAULT_BUFFER_SIZE  # noqa: E402
+import lab5  # noqa: E402
+from local_server import lab6_server  # noqa: E402
+
+# Default file sizes and how often each is requested: mostly small cached files,
+# and some files big enough to be sent with sendfile
+DEFAULT_SIZES = ['4096:70', '65536:25', '2097152:5']
+
+# Upper bounds, in milliseconds, of the latency histogram buckets
+HISTOGRAM_BOUNDS_MS = [0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+# The errors that end one request; the client counts them and carries on with a new connection
+REQUEST_ERRORS = (OSError, EOFError, ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError)
+
+
+def parse_size_mix(sizes):
+    """
+    :param sizes: strings of the form BYTES or BYTES:WEIGHT
+    :return: a list of (size, weight) pairs
+    :rtype: list
+    """
+    mix = []
+    for size in sizes:
+        size, colon, weight = size.partition(':')
+        mix.append((int(size), float(weight) if weight else 1.0))
+    return mix
+
+
+def percentile(sorted_values, fraction):
+    """
+    :param sorted_values: a non-empty list of numbers in ascending order
+    :param float fraction: the percentile as a fraction, such as 0.99
+    :return: the nearest-rank percentile of the values
+    """
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def histogram(sorted_latencies_ms):
+    """
+    :param sorted_latencies_ms: latencies in milliseconds, in ascending order
+    :return: the number of latencies in each bucket, as a list of {'le': bound, 'count': n},
+             where the last bound is '+Inf'
+    :rtype: list
+    """
+    buckets = []
+    index = 0
+    for bound in HISTOGRAM_BOUNDS_MS + [float('inf')]:
+        count = 0
+        while index < len(sorted_latencies_ms) and sorted_latencies_ms[index] <= bound:
+            count += 1
+            index += 1
+        buckets.append({'le': bound if bound != float('inf') else '+Inf', 'count': count})
+    return buckets
+
+
+async def drive_connection(port, paths, weights, keep_alive, measure_from, deadline, rng, stats):
+    """
+    Send requests back to back until the deadline, recording the latency of each successful
+    request started after measure_from. Opens a new connection whenever the server closes one.
+    """
+    stream_reader = stream_writer = None
+    while time.perf_counter() < deadline:
+        path = rng.choices(paths, weights)[0]
+        start = time.perf_counter()
+        try:
+            if stream_writer is None:
+                stream_reader, stream_writer = await asyncio.open_connection('127.0.0.1', port,
+                                                                             limit=DEFAULT_BUFFER_SIZE)
+            stream_writer.write(lab5.build_request(b'127.0.0.1', path, keep_alive))
+            head = await stream_reader.readuntil(b'\r\n\r\n')
+            status_line, crlf, headers = head.partition(b'\r\n')
+            received = 0
+            async for block in lab5.interpret_body_async(stream_reader, headers):
+                received += len(block)
+            succeeded = lab5.get_status_code(status_line) == '200'
+            persistent = keep_alive and lab5.is_persistent(status_line, headers)
+        except REQUEST_ERRORS:
+            succeeded = persistent = False
+            received = 0
+        elapsed = time.perf_counter() - start
+        if start >= measure_from:
+            if succeeded:
+                stats['latencies'].append(elapsed)
+                stats['bytes'] += received
+            else:
+                stats['errors'] += 1
+        if not persistent and stream_writer is not None:
+            stream_writer.close()
+            stream_reader = stream_writer = None
+    if stream_writer is not None:
+        stream_writer.close()
+
+
+async def drive_clients(port, paths, weights, concurrency, keep_alive, warmup, duration, seed):
+    """
+    :return: the latencies in seconds, failed request count and body bytes of every measured request
+    :rtype: dictionary
+    """
+    stats = {'latencies': [], 'errors': 0, 'bytes': 0}
+    measure_from = time.perf_counter() + warmup
+    deadline = measure_from + duration
+    await asyncio.gather(*(drive_connection(port, paths, weights, keep_alive, measure_from, deadline,
+                                            random.Random(seed + client), stats)
+                           for client in range(concurrency)))
+    return stats
+
+
+def client_process(arguments):
+    """
+    Run in each client process: drive its share of the concurrent clients on its own event loop
+    """
+    return asyncio.run(drive_clients(*arguments))
+
+
+def run_level(port, paths, weights, concurrency, options):
+    """
+    Drive the server at one concurrency level, spreading the clients over the client processes
+
+    :return: the result for the level, ready to be written as JSON
+    :rtype: dictionary
+    """
+    processes = max(1, min(options.client_processes, concurrency))
+    shares = [concurrency // processes + (1 if index < concurrency % processes else 0) for index in range(processes)]
+    arguments = [(port, paths, weights, share, options.keep_alive, options.warmup, options.duration,
+                  options.seed + index * concurrency) for index, share in enumerate(shares)]
+    if processes == 1:
+        results = [client_process(arguments[0])]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(client_process, arguments)
+    latencies_ms = sorted(latency * 1000 for result in results for latency in result['latencies'])
+    requests = len(latencies_ms)
+    level = {
+        'concurrency': concurrency,
+        'requests': requests,
+        'errors': sum(result['errors'] for result in results),
+        'throughput_rps': requests / options.duration,
+        'bytes_per_second': sum(result['bytes'] for result in results) / options.duration,
+    }
+    if latencies_ms:
+        level['latency_ms'] = {
+            'min': latencies_ms[0],
+            'mean': sum(latencies_ms) / requests,
+            'p50': percentile(latencies_ms, 0.50),
+            'p90': percentile(latencies_ms, 0.90),
+            'p99': percentile(latencies_ms, 0.99),
+            'p999': percentile(latencies_ms, 0.999),
+            'max': latencies_ms[-1],
+        }
+        level['histogram_ms'] = histogram(latencies_ms)
+    return level
+
+
+def compare(results, baseline, tolerance):
+    """
+    Check the results against a baseline run at the same concurrency levels
+
+    :return: a description of each regression found
+    :rtype: list
+    """
+    baseline_levels = {level['concurrency']: level for level in baseline['results']}
+    regressions = []
+    for level in results:
+        before = baseline_levels.get(level['concurrency'])
+        if before is None:
+            continue
+        if level['throughput_rps'] < before['throughput_rps'] * (1 - tolerance):
+            regressions.append('concurrency {0}: throughput {1:.1f} req/s, was {2:.1f}'.format(
+                level['concurrency'], level['throughput_rps'], before['throughput_rps']))
+        if 'latency_ms' in level and 'latency_ms' in before:
+            if level['latency_ms']['p99'] > before['latency_ms']['p99'] * (1 + tolerance):
+                regressions.append('concurrency {0}: p99 {1:.2f} ms, was {2:.2f} ms'.format(
+                    level['concurrency'], level['latency_ms']['p99'], before['latency_ms']['p99']))
+    return regressions
+
+
+def run(options):
+    mix = parse_size_mix(options.sizes)
+    server_options = {name: getattr(options, name)
+                      for name in ('engine', 'pool_size', 'backlog', 'queue_size', 'processes')
+                      if getattr(options, name) is not None}
+    paths = ['/file-{0}.bin'.format(size).encode('ASCII') for size, weight in mix]
+    weights = [weight for size, weight in mix]
+    results = []
+    print('{0:>12}{1:>12}{2:>10}{3:>10}{4:>10}{5:>10}{6:>10}{7:>8}'.format(
+        'concurrency', 'requests/s', 'MB/s', 'p50 ms', 'p90 ms', 'p99 ms', 'p999 ms', 'errors'), file=sys.stderr)
+    with tempfile.TemporaryDirectory() as directory:
+        for size, weight in mix:
+            with open(os.path.join(directory, 'file-{0}.bin'.format(size)), 'wb') as output_file:
+                output_file.write(os.urandom(size))
+        with lab6_server(directory, **server_options) as port:
+            for concurrency in options.concurrency:
+                level = run_level(port, paths, weights, concurrency, options)
+                results.append(level)
+                latency = level.get('latency_ms', dict.fromkeys(('p50', 'p90', 'p99', 'p999'), float('nan')))
+                print('{0:>12}{1:>12.1f}{2:>10.1f}{3:>10.2f}{4:>10.2f}{5:>10.2f}{6:>10.2f}{7:>8}'.format(
+                    concurrency, level['throughput_rps'], level['bytes_per_second'] / 1e6, latency['p50'],
+                    latency['p90'], latency['p99'], latency['p999'], level['errors']), file=sys.stderr)
+    return {
+        'config': {
+            'duration_s': options.duration,
+            'warmup_s': options.warmup,
+            'keep_alive': options.keep_alive,
+            'size_mix': [{'bytes': size, 'weight': weight} for size, weight in mix],
+            'client_processes': options.client_processes,
+            'seed': options.seed,
+            'server': server_options,
+            'cpu_count': os.cpu_count(),
+        },
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16, 64],
+                        help='concurrent clients; each level is run in turn')
+    parser.add_argument('--duration', type=float, default=5, help='measured seconds per level')
+    parser.add_argument('--warmup', type=float, default=1, help='unmeasured seconds before each level')
+    parser.add_argument('--sizes', nargs='+', default=DEFAULT_SIZES, help='file sizes as BYTES or BYTES:WEIGHT')
+    parser.add_argument('--keep-alive', action=argparse.BooleanOptionalAction, default=True,
+                        help='reuse one connection per client, or open one per request')
+    parser.add_argument('--client-processes', type=int, default=1,
+                        help='processes the clients are spread over, so the load generator is not the bottleneck')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the choice of files')
+    parser.add_argument('--output', help='file to write the JSON results to, instead of stdout')
+    parser.add_argument('--compare', help='JSON results of an earlier run to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='fraction throughput may fall or p99 may rise before it counts as a regression')
+    parser.add_argument('--engine', choices=['thread', 'event'])
+    parser.add_argument('--pool-size', type=int)
+    parser.add_argument('--backlog', type=int)
+    parser.add_argument('--queue-size', type=int)
+    parser.add_argument('--processes', type=int, help='lab6 server processes')
+    options = parser.parse_args()
+    report = run(options)
+    if options.output:
+        with open(options.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if options.compare:
+        with open(options.compare) as baseline_file:
+            regressions = compare(report['results'], json.load(baseline_file), options.tolerance)
+        for regression in regressions:
+            print('regression: ' + regression, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
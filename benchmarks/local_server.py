@@ -0,0 +1,148 @@
+"""
+Helpers for benchmarks that need an HTTP or TFTP server running on this machine.
+"""
+
+import contextlib
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+REPO_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port(kind=socket.SOCK_STREAM):
+    """
+    :param kind: socket.SOCK_STREAM for a TCP port or socket.SOCK_DGRAM for a UDP port
+    :return: a port number that is not in use right now
+    :rtype: int
+    """
+    probe = socket.socket(socket.AF_INET, kind)
+    probe.bind(('127.0.0.1', 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    return port
+
+
+def wait_for_port(port, timeout=10):
+    """
+    Block until an HTTP server answers on the local port
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            probe = socket.create_connection(('127.0.0.1', port))
+            probe.sendall(b'GET / HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n')
+            while probe.recv(65536):
+                pass
+            probe.close()
+            return
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+@contextlib.contextmanager
+def lab6_server(directory, **kwargs):
+    """
+    Serve the files in directory with lab6.http_server_setup in a separate process,
+    so the server does not compete with the benchmark for the GIL.
+
+    :param str directory: the directory to serve
+    :param kwargs: extra keyword arguments for http_server_setup
+    :return: a context manager giving the port the server is listening on
+    """
+    port = free_port()
+    code = 'import lab6; lab6.http_server_setup({0}, **{1!r})'.format(port, kwargs)
+    environment = dict(os.environ, PYTHONPATH=REPO_DIRECTORY)
+    server = subprocess.Popen([sys.executable, '-c', code], cwd=directory, env=environment,
+                              stdout=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        yield port
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def wait_for_tftp_port(port, timeout=10):
+    """
+    Block until a TFTP server answers on the local port
+    """
+    deadline = time.monotonic() + timeout
+    probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    probe.settimeout(0.05)
+    try:
+        while True:
+            # A request for a file that does not exist is answered with an error packet
+            probe.sendto(b'\x00\x01no such file\x00octet\x00', ('127.0.0.1', port))
+            try:
+                probe.recvfrom(65536)
+                return
+            except (socket.timeout, ConnectionRefusedError):
+                if time.monotonic() > deadline:
+                    raise
+    finally:
+        probe.close()
+
+
+@contextlib.contextmanager
+def lab7_server(directory, **kwargs):
+    """
+    Serve the files in directory with lab7.tftp_server_setup in a separate process
+
+    :param str directory: the directory to serve
+    :param kwargs: extra keyword arguments for tftp_server_setup
+    :return: a context manager giving the port the server is receiving requests on
+    """
+    port = free_port(socket.SOCK_DGRAM)
+    code = 'import lab7; lab7.tftp_server_setup({0}, **{1!r})'.format(port, kwargs)
+    environment = dict(os.environ, PYTHONPATH=REPO_DIRECTORY)
+    server = subprocess.Popen([sys.executable, '-c', code], cwd=directory, env=environment,
+                              stdout=subprocess.DEVNULL)
+    try:
+        wait_for_tftp_port(port)
+        yield port
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def serve_chunked(listen_socket, directory, chunk_size):
+    """
+    Answer each connection with the requested file in chunked transfer coding, then close it
+    """
+    while True:
+        data_socket, address = listen_socket.accept()
+        request = b''
+        while b'\r\n\r\n' not in request:
+            request += data_socket.recv(65536)
+        path = os.path.join(directory, request.split()[1].decode('ASCII').lstrip('/'))
+        with open(path, 'rb') as input_file:
+            body = input_file.read()
+        data_socket.sendall(b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\nConnection: close\r\n\r\n')
+        for offset in range(0, len(body), chunk_size):
+            chunk = body[offset:offset + chunk_size]
+            data_socket.sendall('{0:x}\r\n'.format(len(chunk)).encode('ASCII') + chunk + b'\r\n')
+        data_socket.sendall(b'0\r\n\r\n')
+        data_socket.close()
+
+
+def start_chunked_server(directory, chunk_size=4096):
+    """
+    Serve the files in directory with chunked transfer coding on a background thread
+
+    :param str directory: the directory to serve
+    :param int chunk_size: the number of bytes in each chunk
+    :return: the port the server is listening on
+    :rtype: int
+    """
+    listen_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listen_socket.bind(('127.0.0.1', 0))
+    listen_socket.listen(128)
+    server = threading.Thread(target=serve_chunked, args=(listen_socket, directory, chunk_size), daemon=True)
+    server.start()
+    return listen_socket.getsockname()[1]
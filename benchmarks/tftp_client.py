@@ -0,0 +1,276 @@
+"""
+A minimal TFTP client for benchmarks that download files from and upload files to lab7.
+"""
+
+import random
+import socket
+
+# Size of the data in every DATA packet but the last, unless the server accepts a blksize option
+BLOCK_SIZE = 512
+
+# Times the last acknowledgement is sent again while waiting for the server before giving up
+RETRIES = 5
+
+
+class TransferError(Exception):
+    """
+    The server answered with an error packet
+    """
+
+
+def build_request(op_code, filename, block_size=None, window_size=None, tsize=None):
+    """
+    :param bytes op_code: b'\x00\x01' for a read request or b'\x00\x02' for a write request
+    :param bytes filename: the file to read or write
+    :param int block_size: the blksize option to ask for, if any
+    :param int window_size: the windowsize option to ask for, if any
+    :param int tsize: the tsize option to send, if any
+    :return: the request packet
+    :rtype: bytes object
+    """
+    options = {}
+    if block_size is not None:
+        options[b'blksize'] = str(block_size).encode('ASCII')
+    if window_size is not None:
+        options[b'windowsize'] = str(window_size).encode('ASCII')
+    if tsize is not None:
+        options[b'tsize'] = str(tsize).encode('ASCII')
+    request = op_code + filename + b'\x00octet\x00'
+    return request + b''.join(name + b'\x00' + value + b'\x00' for name, value in options.items())
+
+
+def parse_options_ack(packet):
+    """
+    :param bytes packet: an OACK packet
+    :return: the accepted option values by option name, as str objects
+    :rtype: dictionary
+    """
+    fields = packet[2:].split(b'\x00')[:-1]
+    return {fields[i].decode('ASCII'): fields[i + 1].decode('ASCII') for i in range(0, len(fields) - 1, 2)}
+
+
+def download(port, filename, host='127.0.0.1', timeout=1, block_size=None, window_size=None, tsize=False,
+             receive_buffer_size=None, loss_rate=0.0, duplicate_acks=False, seed=None, stats=None):
+    """
+    Download a file by sending a read request and acknowledging the blocks. With a window
+    size, the last block of each window, or the last block received in order once one is
+    missing, is acknowledged. When nothing arrives within the timeout, the last
+    block received in order is acknowledged again.
+
+    To test how the server copes with a bad network, the client can pretend that packets
+    are lost on the way in or out, and can send every acknowledgement twice.
+
+    :param int port: the port the server receives requests on
+    :param bytes filename: the file to download
+    :param str host: the address of the server
+    :param float timeout: seconds to wait for each packet
+    :param int block_size: the blksize option to ask for, if any
+    :param int window_size: the windowsize option to ask for, if any
+    :param bool tsize: whether to ask for the transfer size
+    :param int receive_buffer_size: SO_RCVBUF for the client socket, if not the system default
+    :param float loss_rate: the fraction of packets sent and received to drop
+    :param bool duplicate_acks: whether to send every acknowledgement twice
+    :param seed: seed for choosing the packets to drop
+    :param stats: a dictionary to count the 'packets' and 'duplicates' (blocks received again) in, if any
+    :return: the contents of the file, and the options the server accepted
+    :rtype: tuple
+    :raises TransferError: if the server sends an error packet
+    :raises socket.timeout: if the server stops sending
+    """
+    request = build_request(b'\x00\x01', filename, block_size, window_size, 0 if tsize else None)
+    if stats is None:
+        stats = {}
+    stats.update(packets=0, duplicates=0)
+    rng = random.Random(seed)
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    if receive_buffer_size is not None:
+        client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer_size)
+    client_socket.settimeout(timeout)
+
+    def send(packet, address):
+        if loss_rate and rng.random() < loss_rate:
+            return
+        client_socket.sendto(packet, address)
+        if duplicate_acks and packet[:2] == b'\x00\x04':
+            client_socket.sendto(packet, address)
+
+    try:
+        send(request, (host, port))
+        accepted = {}
+        blocks = []
+        expected = 1
+        negotiated_block_size = BLOCK_SIZE
+        negotiated_window_size = 1
+        # The address of the transfer, once the server has answered from it
+        server_address = None
+        # The last packet sent and where to, to send again on a timeout
+        last_packet, last_address = request, (host, port)
+        in_window = 0
+        # The block number that last set off an acknowledgement out of order, if any since the last block in order
+        missed_number = None
+        retries = 0
+        while True:
+            try:
+                packet, address = client_socket.recvfrom(65536)
+            except socket.timeout:
+                retries += 1
+                if retries > RETRIES:
+                    raise
+                if expected > 1:
+                    last_packet = b'\x00\x04' + ((expected - 1) % 65536).to_bytes(2, 'big')
+                send(last_packet, last_address)
+                in_window = 0
+                continue
+            if loss_rate and rng.random() < loss_rate:
+                continue
+            retries = 0
+            stats['packets'] += 1
+            if server_address is None:
+                server_address = address
+            elif address != server_address:
+                # A second transfer, started by a request that was sent again
+                client_socket.sendto(b'\x00\x05\x00\x05Unknown transfer ID\x00', address)
+                continue
+            op_code = packet[:2]
+            if op_code == b'\x00\x05':
+                raise TransferError(packet[4:-1].decode('ASCII'))
+            if op_code == b'\x00\x06' and expected == 1:
+                accepted = parse_options_ack(packet)
+                negotiated_block_size = int(accepted.get('blksize', BLOCK_SIZE))
+                negotiated_window_size = int(accepted.get('windowsize', 1))
+                # The OACK is acknowledged as block 0
+                last_packet, last_address = b'\x00\x04\x00\x00', address
+                send(last_packet, last_address)
+                continue
+            if op_code != b'\x00\x03':
+                continue
+            number = int.from_bytes(packet[2:4], 'big')
+            if number != expected % 65536:
+                if (expected - number) % 65536 < 32768:
+                    stats['duplicates'] += 1
+                # A block is missing, or was sent again: acknowledge the last one received in order,
+                # once for each time the server starts sending from the same block, so the server
+                # knows where to carry on from
+                if missed_number is None or missed_number == number:
+                    missed_number = number
+                    last_packet, last_address = b'\x00\x04' + ((expected - 1) % 65536).to_bytes(2, 'big'), address
+                    send(last_packet, last_address)
+                    in_window = 0
+                continue
+            missed_number = None
+            blocks.append(packet[4:])
+            expected += 1
+            in_window += 1
+            last = len(packet) - 4 < negotiated_block_size
+            if last or in_window == negotiated_window_size:
+                # The server sends from the port of the transfer, so acknowledgements go there
+                last_packet, last_address = b'\x00\x04' + packet[2:4], address
+                send(last_packet, last_address)
+                in_window = 0
+            if last:
+                return b''.join(blocks), accepted
+    finally:
+        client_socket.close()
+
+
+def upload(port, filename, contents, host='127.0.0.1', timeout=0.2, block_size=None, window_size=None, tsize=False,
+           loss_rate=0.0, seed=None):
+    """
+    Upload a file by sending a write request and then windows of blocks, sending the next
+    window when the last block of the current one is acknowledged. When an earlier block is
+    acknowledged, sending starts again after it, and when nothing arrives within the timeout,
+    the current window is sent again.
+
+    :param int port: the port the server receives requests on
+    :param bytes filename: the file to write
+    :param bytes contents: the contents to upload
+    :param str host: the address of the server
+    :param float timeout: seconds to wait for each acknowledgement
+    :param int block_size: the blksize option to ask for, if any
+    :param int window_size: the windowsize option to ask for, if any
+    :param bool tsize: whether to send the transfer size
+    :param float loss_rate: the fraction of packets sent and received to drop
+    :param seed: seed for choosing the packets to drop
+    :return: the options the server accepted
+    :rtype: dictionary
+    :raises TransferError: if the server sends an error packet
+    :raises socket.timeout: if the server stops answering
+    """
+    request = build_request(b'\x00\x02', filename, block_size, window_size, len(contents) if tsize else None)
+    rng = random.Random(seed)
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    client_socket.settimeout(timeout)
+
+    def send(packet, address):
+        if not (loss_rate and rng.random() < loss_rate):
+            client_socket.sendto(packet, address)
+
+    try:
+        accepted = {}
+        server_address = None
+        negotiated_block_size = BLOCK_SIZE
+        negotiated_window_size = 1
+        block_count = len(contents) // BLOCK_SIZE + 1
+        # The last block acknowledged, or None until the request is accepted, and the last block sent
+        acked = None
+        sent = 0
+        retries = 0
+        while acked != block_count:
+            if acked is None:
+                send(request, (host, port))
+            else:
+                sent = min(acked + negotiated_window_size, block_count)
+                for number in range(acked + 1, sent + 1):
+                    block = contents[(number - 1) * negotiated_block_size:number * negotiated_block_size]
+                    send(b'\x00\x03' + (number % 65536).to_bytes(2, 'big') + block, server_address)
+            try:
+                acked = wait_for_progress(client_socket, acked, sent, rng, loss_rate, accepted)
+            except socket.timeout:
+                retries += 1
+                if retries > RETRIES:
+                    raise
+                continue
+            retries = 0
+            if server_address is None:
+                server_address = accepted.pop('address')
+                negotiated_block_size = int(accepted.get('blksize', BLOCK_SIZE))
+                negotiated_window_size = int(accepted.get('windowsize', 1))
+                block_count = len(contents) // negotiated_block_size + 1
+        return accepted
+    finally:
+        client_socket.close()
+
+
+def wait_for_progress(client_socket, acked, sent, rng, loss_rate, accepted):
+    """
+    Wait for the server to accept a write request, or to acknowledge a block after the last
+    one acknowledged. When the request is accepted, the address of the transfer and any
+    options accepted are added to accepted, the address under 'address'.
+
+    :return: the last block acknowledged
+    :rtype: int
+    :raises TransferError: if the server sends an error packet
+    :raises socket.timeout: if nothing moves the transfer forward within the timeout
+    """
+    while True:
+        packet, address = client_socket.recvfrom(65536)
+        if loss_rate and rng.random() < loss_rate:
+            continue
+        op_code = packet[:2]
+        if acked is None:
+            if op_code == b'\x00\x05':
+                raise TransferError(packet[4:-1].decode('ASCII'))
+            if op_code == b'\x00\x06':
+                accepted.update(parse_options_ack(packet))
+            elif packet != b'\x00\x04\x00\x00':
+                continue
+            accepted['address'] = address
+            return 0
+        if op_code == b'\x00\x05':
+            raise TransferError(packet[4:-1].decode('ASCII'))
+        if op_code != b'\x00\x04':
+            continue
+        # The block acknowledged, counted through the whole file, if it is one sent since the last acknowledgement
+        block_count = sent - (sent - int.from_bytes(packet[2:4], 'big')) % 65536
+        if block_count > acked:
+            return block_count
@@ -0,0 +1,160 @@
+"""
+- CS2911 - 021
+- Fall 2019
+- Names:
+  - Stuart Harley
+  - Shanthosh Reddy
+
+A buffered reader for TCP sockets, shared by the TCP labs.
+
+Instead of calling recv(1) for every byte, the reader receives large blocks into a reusable
+bytearray with recv_into and hands out the requested pieces from that buffer.
+"""
+
+# Number of bytes requested from the socket by each recv_into call
+DEFAULT_BUFFER_SIZE = 64 * 1024
+
+
+class BufferedReader:
+    """
+    Reads bytes from a TCP data socket through a reusable receive buffer
+    """
+
+    def __init__(self, data_socket, buffer_size=DEFAULT_BUFFER_SIZE):
+        """
+        :param data_socket: The socket to read from. The data_socket argument should be an open tcp
+                            data connection (either a client socket or a server data socket), not a tcp
+                            server's listening socket.
+        :param int buffer_size: the size of the receive buffer in bytes
+        """
+        self.data_socket = data_socket
+        self.recv_count = 0
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = 0
+
+    def buffered(self):
+        """
+        :return: the number of bytes received from the socket but not yet read
+        :rtype: int
+        """
+        return self._end - self._start
+
+    def read_exact(self, n):
+        """
+        Read exactly n bytes, blocking until they have all arrived
+
+        :param int n: the number of bytes to read
+        :return: the bytes read
+        :rtype: bytes object
+        :raises EOFError: if the connection closes before n bytes arrive
+        """
+        if n > len(self._buffer):
+            # Too big for the receive buffer, so receive straight into the result instead
+            data = bytearray(n)
+            self.readinto(data)
+            return bytes(data)
+        while self.buffered() < n:
+            self._fill()
+        data = bytes(self._view[self._start:self._start + n])
+        self._start += n
+        return data
+
+    def read_some(self, size):
+        """
+        Read at most size bytes, receiving from the socket only if nothing is buffered
+
+        :param int size: the largest number of bytes to return
+        :return: between 1 and size bytes
+        :rtype: bytes object
+        :raises EOFError: if nothing is buffered and the connection has been closed
+        """
+        if self._start == self._end:
+            self._fill()
+        n = min(size, self._end - self._start)
+        data = bytes(self._view[self._start:self._start + n])
+        self._start += n
+        return data
+
+    def readinto(self, buffer):
+        """
+        Fill a preallocated buffer completely. Bytes already in the receive buffer are copied
+        first, and the rest is received directly into the given buffer with recv_into.
+
+        :param buffer: a writable bytes-like object, such as a bytearray or memoryview
+        :return: the number of bytes read, which is always len(buffer)
+        :rtype: int
+        :raises EOFError: if the connection closes before the buffer is full
+        """
+        view = memoryview(buffer).cast('B')
+        size = len(view)
+        filled = min(self.buffered(), size)
+        view[:filled] = self._view[self._start:self._start + filled]
+        self._start += filled
+        while filled < size:
+            received = self.data_socket.recv_into(view[filled:])
+            self.recv_count += 1
+            if received == 0:
+                raise EOFError('connection closed by peer')
+            filled += received
+        return size
+
+    def read_until(self, delimiter):
+        """
+        Read up to and including the next occurrence of delimiter
+
+        :param bytes delimiter: the bytes that end the read
+        :return: the bytes read, including the delimiter
+        :rtype: bytes object
+        :raises EOFError: if the connection closes before the delimiter arrives
+        """
+        search_start = self._start
+        index = self._buffer.find(delimiter, search_start, self._end)
+        while index < 0:
+            # Only the tail of what has been searched could still begin a match
+            search_start = max(self._start, self._end - len(delimiter) + 1)
+            offset = search_start - self._start
+            self._fill()
+            search_start = self._start + offset
+            index = self._buffer.find(delimiter, search_start, self._end)
+        end = index + len(delimiter)
+        data = bytes(self._view[self._start:end])
+        self._start = end
+        return data
+
+    def read_line(self):
+        """
+        Read one line terminated by an ASCII LF byte
+
+        :return: the line, including the terminating LF
+        :rtype: bytes object
+        :raises EOFError: if the connection closes before the end of the line
+        """
+        return self.read_until(b'\n')
+
+    def _fill(self):
+        """
+        Receive the next block from the socket into the free end of the buffer.
+        Unread bytes are moved to the front of the buffer first, and the buffer grows
+        if it is already full of unread bytes.
+
+        :raises EOFError: if the connection has been closed by the peer
+        """
+        if self._start == self._end:
+            self._start = self._end = 0
+        elif self._end == len(self._buffer):
+            unread = self._end - self._start
+            if self._start == 0:
+                self._view.release()
+                self._buffer.extend(bytes(len(self._buffer)))
+                self._view = memoryview(self._buffer)
+            else:
+                self._buffer[:unread] = self._buffer[self._start:self._end]
+                self._start = 0
+                self._end = unread
+        received = self.data_socket.recv_into(self._view[self._end:])
+        self.recv_count += 1
+        if received == 0:
+            raise EOFError('connection closed by peer')
+        self._end += received
@@ -17,10 +17,10 @@ def read_message():
     :author: Stuart Harley
     """
     num_lines = read_header()
-    message = b''
+    lines = []
     for x in range(num_lines):
-        message += read_line()
-    write_message(message)
+        lines.append(read_line())
+    write_message(b''.join(lines))
 
 
 def write_message(message):
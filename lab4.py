@@ -23,6 +23,8 @@ import struct
 import time
 import sys
 
+from buffered_reader import BufferedReader
+
 # Port number definitions
 # (May have to be adjusted if they collide with ports in use by other programs/services.)
 TCP_PORT = 12100
@@ -132,31 +134,33 @@ def tcp_receive(listen_port):
     data_socket, sender_address = listen_socket.accept()
     print("Sender Address: " + OTHER_HOST)
     print("Port Number: " + str(TCP_PORT))
+    reader = BufferedReader(data_socket)
     count = 0
-    header = read_header(data_socket)
+    header = read_header(reader)
     while not header == 0:
-        message = read_message(data_socket, header)
+        message = read_message(reader, header)
         data_socket.send(b'A')
         count += 1
         write_message(message, str(count))
-        header = read_header(data_socket)
+        header = read_header(reader)
     data_socket.send(b'Q')
     data_socket.close()
     listen_socket.close()
 
 
-def read_message(data_socket, num_lines):
+def read_message(reader, num_lines):
     """
     Reads a message from the network
 
-    :param data_socket: the socket to read from
+    :param reader: the buffered reader for the socket
+    :param num_lines: the number of lines in the message
     :return: message as a literal bytes object
     :author: Stuart Harley
     """
-    message = b''
+    lines = []
     for x in range(num_lines):
-        message += read_line(data_socket)
-    return message
+        lines.append(read_line(reader))
+    return b''.join(lines)
 
 
 def write_message(message, filename):
@@ -174,50 +178,28 @@ def write_message(message, filename):
         output_file.write(message)
 
 
-def read_header(data_socket):
+def read_header(reader):
     """
     Read the 4-byte header of the message
 
-    :param data_socket: the socket to read from
+    :param reader: the buffered reader for the socket
     :return: the number of lines in the message as a int
     author: Stuart Harley, Shantosh Reddy
     """
-    b = next_byte(data_socket) + next_byte(data_socket) + next_byte(data_socket) + next_byte(data_socket)
-    return int.from_bytes(b, 'big')
+    return int.from_bytes(reader.read_exact(4), 'big')
 
 
-def read_line(data_socket):
+def read_line(reader):
     """
     Reads 1 line of the message
 
-    :param data_socket: the socket to read from
+    :param reader: the buffered reader for the socket
     :return: the value of the line as a bytes object
     author: Stuart Harley, Shantosh Reddy
     """
-    character = next_byte(data_socket)
-    line = character
-    while not (character.decode('ASCII') == '\n'):
-        character = next_byte(data_socket)
-        line += character
-    return line
-
-
-def next_byte(data_socket):
-    """
-    Read the next byte from the socket data_socket.
-
-    Read the next byte from the sender, received over the network.
-    If the byte has not yet arrived, this method blocks (waits)
-      until the byte arrives.
-    If the sender is done sending and is waiting for your response, this method blocks indefinitely.
-
-    :param data_socket: The socket to read from. The data_socket argument should be an open tcp
-                        data connection (either a client socket or a server data socket), not a tcp
-                        server's listening socket.
-    :return: the next byte, as a bytes object with a single byte in it
-    """
-    return data_socket.recv(1)
+    return reader.read_line()
 
 
 # Invoke the main method to run the program.
-main()
\ No newline at end of file
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -15,17 +15,51 @@ import socket
 # import the "regular expressions" module
 import re
 
+import asyncio
+import collections
+import os
+import select
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from buffered_reader import BufferedReader, DEFAULT_BUFFER_SIZE
+
+# Most idle keep-alive connections a ConnectionPool keeps open for one (host, port)
+POOL_MAX_IDLE = 4
+
+# Most idle keep-alive connections a ConnectionPool keeps open in all, over every (host, port)
+POOL_MAX_IDLE_TOTAL = 64
+
+# Seconds an idle pooled connection may sit unused before it is closed instead of reused
+POOL_IDLE_TIMEOUT = 15
+
+# Default number of requests make_pipelined_http_requests keeps in flight on one connection
+PIPELINE_DEPTH = 8
+
+# Default number of downloads get_http_resources runs at once
+MAX_WORKERS = 16
+
+# Default number of connections get_http_resources opens to any one (host, port) at once
+MAX_CONNECTIONS_PER_HOST = 4
+
+# Suffix of the file, next to a download made with resume=True, that holds the validator
+# (ETag or Last-Modified) of the version of the resource being downloaded
+VALIDATOR_SUFFIX = '.validator'
+
 
 def main():
     """
     Tests the client on a variety of resources
     """
 
-    # These resource request should result in "Content-Length" data transfer
-    get_http_resource('http://msoe.us/CS/cs1.1chart.png', 'cs1.1chart.png')
+    get_http_resources([
+        # These resource request should result in "Content-Length" data transfer
+        ('http://msoe.us/CS/cs1.1chart.png', 'cs1.1chart.png'),
 
-    # this resource request should result in "chunked" data transfer
-    get_http_resource('http://msoe.us/CS/', 'index.html')
+        # this resource request should result in "chunked" data transfer
+        ('http://msoe.us/CS/', 'index.html'),
+    ])
 
     # If you find fun examples of chunked or Content-Length pages, please share them with us!
 
@@ -56,7 +90,95 @@ def get_http_resource(url, file_name):
         print('get_http_resource: URL parse failed, request not sent')
 
 
-def make_http_request(host, port, resource, file_name):
+def get_http_resources(urls, max_workers=MAX_WORKERS, max_per_host=MAX_CONNECTIONS_PER_HOST, pool=None):
+    """
+    Get many HTTP resources at once on a pool of worker threads
+
+    Each worker reuses keep-alive connections from a shared ConnectionPool, and no more than
+    max_per_host requests go to the same (host, port) at the same time. The URLs are queued by
+    (host, port), and each host gets at most max_per_host workers, each of which gets that host's
+    URLs one after another, so no worker sits idle waiting for another host's downloads to finish.
+
+    :param urls: an iterable of (url, file_name) pairs, one for each resource to get
+    :param int max_workers: the number of downloads to run at once
+    :param int max_per_host: the most downloads from one (host, port) to run at once
+    :param pool: the ConnectionPool to use, or None to use a new one for this batch
+    :return: a (url, status code, seconds) tuple for each resource, in the order given.
+             The status code is None if the request failed.
+    :rtype: list
+    """
+    own_pool = pool is None
+    if own_pool:
+        pool = ConnectionPool(max_idle=max_per_host)
+    urls = list(urls)
+    results = [None] * len(urls)
+    # The URLs still to get from each (host, port), with their places in the results.
+    # URLs that cannot be parsed are queued under None.
+    host_queues = collections.OrderedDict()
+    for index, (url, file_name) in enumerate(urls):
+        url_parts = parse_url(url)
+        host_queues.setdefault(url_parts and url_parts[:2], collections.deque()).append(
+            (index, url, file_name, url_parts))
+
+    def fetch(url, file_name, url_parts):
+        start = time.perf_counter()
+        status_code = None
+        if url_parts is None:
+            print('get_http_resources: URL="{0}" parse failed, request not sent'.format(url))
+        else:
+            host, port, resource = url_parts
+            try:
+                status_code = make_http_request(host, port, resource, file_name, pool)
+            except (OSError, EOFError, ValueError) as error:
+                print('get_http_resources: URL="{0}" failed: {1!r}'.format(url, error))
+        seconds = time.perf_counter() - start
+        print('get_http_resources: URL="{0}", status="{1}", {2:.3f}s'.format(url, status_code, seconds))
+        return url, status_code, seconds
+
+    def fetch_from_host(host_queue):
+        # deque.popleft is atomic, so the workers of one host can share its queue without a lock
+        while True:
+            try:
+                index, url, file_name, url_parts = host_queue.popleft()
+            except IndexError:
+                return
+            results[index] = fetch(url, file_name, url_parts)
+
+    # Workers for each host, counted before any start taking URLs from the queues
+    host_workers = [(host_queue, min(max_per_host, len(host_queue))) for host_queue in host_queues.values()]
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Hand out the workers a round at a time across the hosts, so one host's URLs
+            # do not take every worker while the other hosts wait
+            futures = [executor.submit(fetch_from_host, host_queue)
+                       for round_number in range(max_per_host)
+                       for host_queue, worker_count in host_workers if round_number < worker_count]
+            for future in futures:
+                future.result()
+        return results
+    finally:
+        if own_pool:
+            pool.close()
+
+
+def parse_url(url):
+    """
+    Parse an http:// URL into the parts make_http_request needs, the same way get_http_resource does
+
+    :param str url: full URL of the resource
+    :return: the host name as bytes, the port as an int, and the resource as bytes,
+             or None if the URL could not be parsed
+    :rtype: tuple or None
+    """
+    url_match = re.search('http://([^/:]*)(:\\d*)?(/.*)', url)
+    if not url_match:
+        return None
+    host_name, host_port, host_resource = url_match.groups()
+    host_port = int(host_port[1:]) if host_port else 80
+    return host_name.encode(), host_port, host_resource.encode()
+
+
+def make_http_request(host, port, resource, file_name, pool=None, resume=False):
     """
     Get an HTTP resource from a server
 
@@ -65,74 +187,435 @@ def make_http_request(host, port, resource, file_name):
     :param bytes resource: the ASCII path/name of resource to get. This is everything in the URL after the domain name,
            including the first /.
     :param file_name: string (str) containing name of file in which to store the retrieved resource
+    :param pool: a ConnectionPool to take a keep-alive connection from and return it to afterwards,
+           or None to use a new connection that is closed after the response
+    :param bool resume: if file_name already holds the start of the resource, ask only for the rest
+           of it with a Range header and append that to the file. The validator of the resource is
+           kept next to the file and sent in an If-Range header, so the server sends the whole
+           resource instead if it has changed. A file with no saved validator is fetched again whole.
     :return: the status code
     :rtype: int
     :author: Stuart Harley, Shanthosh Reddy
     """
-    data_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    data_socket.connect((host, port))
-    send_request(host, resource, data_socket)
-
-    status_line = get_next_header(data_socket)
+    range_start = if_range = None
+    if resume:
+        if_range = load_validator(file_name)
+        range_start = get_partial_size(file_name) if if_range else None
+    # False once a 416 response shows the saved file is not the start of the resource
+    matches_resource = True
+    if pool is None:
+        reader = open_connection(host, port)
+        reused = False
+    else:
+        reader, reused = pool.acquire(host, port)
+    try:
+        status_line, headers = send_and_read_headers(host, resource, reader, pool is not None, range_start, if_range)
+    except (EOFError, ConnectionError):
+        reader.data_socket.close()
+        if not reused:
+            raise
+        # The server closed the idle connection before answering, so retry once on a fresh one
+        reader = open_connection(host, port)
+        status_line, headers = send_and_read_headers(host, resource, reader, True, range_start, if_range)
     status_code = get_status_code(status_line)
 
-    headers = b''
-    while b'\r\n\r\n' not in headers:
-        headers += get_next_header(data_socket)
-    body_length = interpret_body_length(headers)
-    data = b''
-    if body_length == 'chunked':
-        data = interpret_chunked(data_socket)
-    elif body_length.isnumeric():
-        data = interpret_content_length(data_socket, int(body_length))
+    try:
+        blocks = interpret_body(reader, headers)
+        if status_code == '206':
+            check_content_range(headers, range_start)
+            write_message(blocks, file_name, append=True)
+        elif status_code == '416' and range_start:
+            # The file is already complete if it is as long as the resource, so keep it and
+            # just read past the empty body
+            for block in blocks:
+                pass
+            matches_resource = get_complete_length(headers) == range_start
+        else:
+            if resume:
+                save_validator(file_name, headers)
+            write_message(blocks, file_name)
+    except BaseException:
+        reader.data_socket.close()
+        raise
+    if pool is not None and is_persistent(status_line, headers):
+        pool.release(host, port, reader)
     else:
-        print('Neither chuncked or content-length')
-    write_message(data, file_name)
+        reader.data_socket.close()
+    if not matches_resource:
+        # The saved file is longer than the resource, so get the resource again from the start
+        os.remove(file_name)
+        return make_http_request(host, port, resource, file_name, pool, resume)
     return status_code
 
 
-def next_byte(data_socket):
+def make_pipelined_http_requests(host, port, resources, pool=None, depth=PIPELINE_DEPTH):
+    """
+    Get several HTTP resources from one server, pipelining the requests on a persistent connection.
+    Up to depth requests are sent before their responses are read, and the responses are read
+    in order using their Content-Length or chunked framing to find where each one ends.
+    If the server closes the connection part way through, the requests it did not answer
+    are sent again on a new connection.
+
+    :param bytes host: the ASCII domain name or IP address of the server machine (i.e., host) to connect to
+    :param int port: port number to connect to on server host
+    :param resources: a list of (resource, file_name) pairs, where resource is the ASCII path as bytes
+           and file_name is the name of the file in which to store it
+    :param pool: a ConnectionPool to take a keep-alive connection from and return it to afterwards,
+           or None to use new connections that are closed afterwards
+    :param int depth: the most requests to have sent but not yet answered
+    :return: the status codes, in the same order as resources
+    :rtype: list
+    """
+    status_codes = []
+    while len(status_codes) < len(resources):
+        if pool is None:
+            reader = open_connection(host, port)
+            reused = False
+        else:
+            reader, reused = pool.acquire(host, port)
+        answered_before = len(status_codes)
+        try:
+            persistent = pipeline_requests(host, reader, resources[answered_before:], depth, status_codes)
+        except (EOFError, ConnectionError):
+            reader.data_socket.close()
+            if len(status_codes) == answered_before and not reused:
+                raise
+            continue
+        except BaseException:
+            reader.data_socket.close()
+            raise
+        if pool is not None and persistent:
+            pool.release(host, port, reader)
+        else:
+            reader.data_socket.close()
+    return status_codes
+
+
+def pipeline_requests(host, reader, resources, depth, status_codes):
+    """
+    Send pipelined requests on one connection and save the responses as they arrive
+
+    :param bytes host: hostname
+    :param reader: the buffered reader for the socket
+    :param resources: a list of (resource, file_name) pairs still to be answered
+    :param int depth: the most requests to have sent but not yet answered
+    :param list status_codes: the status code of each answered request is appended here
+    :return: True if the connection can be used again afterwards
+    :rtype: bool
+    """
+    sent = min(depth, len(resources))
+    reader.data_socket.sendall(b''.join(build_request(host, resource, True) for resource, file_name in resources[:sent]))
+    for resource, file_name in resources:
+        status_line, headers = read_response_headers(reader)
+        write_message(interpret_body(reader, headers), file_name)
+        status_codes.append(get_status_code(status_line))
+        if not is_persistent(status_line, headers):
+            # The server will not answer the requests sent after this one
+            return False
+        if sent < len(resources):
+            reader.data_socket.sendall(build_request(host, resources[sent][0], True))
+            sent += 1
+    return True
+
+
+def open_connection(host, port):
+    """
+    Open a new TCP connection to the server
+
+    :param bytes host: the ASCII domain name or IP address of the server
+    :param int port: port number to connect to on server host
+    :return: a buffered reader for the new data socket
+    :rtype: BufferedReader
+    """
+    data_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    data_socket.connect((host, port))
+    return BufferedReader(data_socket)
+
+
+def send_and_read_headers(host, resource, reader, keep_alive, range_start=None, if_range=None):
+    """
+    Send the request and read the status line and headers of the response
+
+    :param bytes host: hostname
+    :param bytes resource: resource
+    :param reader: the buffered reader for the socket
+    :param bool keep_alive: whether to ask the server to keep the connection open
+    :param range_start: the offset to request the resource from, or None for all of it
+    :param if_range: the validator of the version the range must come from, or None for any version
+    :return: the status line and the headers, both as bytes objects
+    :rtype: tuple
+    """
+    send_request(host, resource, reader.data_socket, keep_alive, range_start, if_range)
+    return read_response_headers(reader)
+
+
+def read_response_headers(reader):
+    """
+    Read the status line and headers of the next response on the connection
+
+    :param reader: the buffered reader for the socket
+    :return: the status line and the headers, both as bytes objects
+    :rtype: tuple
     """
-    Read the next byte from the socket data_socket.
+    status_line = get_next_header(reader)
+    header = get_next_header(reader)
+    headers = [header]
+    while header != b'\r\n':
+        header = get_next_header(reader)
+        headers.append(header)
+    return status_line, b''.join(headers)
 
-    Read the next byte from the sender, received over the network.
-    If the byte has not yet arrived, this method blocks (waits)
-      until the byte arrives.
-    If the sender is done sending and is waiting for your response, this method blocks indefinitely.
 
-    :param data_socket: The socket to read from. The data_socket argument should be an open tcp
-                        data connection (either a client socket or a server data socket), not a tcp
-                        server's listening socket.
-    :return: the next byte, as a bytes object with a single byte in it
+class ConnectionPool:
+    """
+    Idle keep-alive connections, keyed by (host, port), that make_http_request can reuse.
+    Whenever a connection is taken or returned, connections idle for too long are closed for
+    every (host, port), and the pool never holds more than max_idle_total connections in all,
+    so a job that talks to many hosts does not pile up open sockets.
     """
-    return data_socket.recv(1)
 
+    def __init__(self, max_idle=POOL_MAX_IDLE, idle_timeout=POOL_IDLE_TIMEOUT, max_idle_total=POOL_MAX_IDLE_TOTAL):
+        """
+        :param int max_idle: most idle connections kept for one (host, port)
+        :param float idle_timeout: seconds an idle connection is kept before it is evicted
+        :param int max_idle_total: most idle connections kept in all; at least 1
+        """
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.max_idle_total = max_idle_total
+        self.connections_opened = 0
+        self.connections_reused = 0
+        # Lists of (reader, time it became idle), oldest first, by (host, port); no list is empty
+        self._idle = {}
+        self._idle_count = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, host, port):
+        """
+        Take an idle connection to the server, or open a new one if none is usable
+
+        :param bytes host: the ASCII domain name or IP address of the server
+        :param int port: port number to connect to on server host
+        :return: a buffered reader for the connection, and whether it is a reused connection
+        :rtype: tuple
+        """
+        with self._lock:
+            self._evict_expired(time.monotonic())
+            idle = self._idle.get((host, port), [])
+            while idle:
+                reader, idle_since = idle.pop()
+                self._idle_count -= 1
+                if not idle:
+                    del self._idle[(host, port)]
+                if not is_stale(reader):
+                    self.connections_reused += 1
+                    return reader, True
+                reader.data_socket.close()
+            self.connections_opened += 1
+        return open_connection(host, port), False
+
+    def release(self, host, port, reader):
+        """
+        Return a connection whose response has been read completely, so it can be reused
+
+        :param bytes host: the ASCII domain name or IP address of the server
+        :param int port: port number of the server
+        :param reader: the buffered reader for the connection
+        """
+        with self._lock:
+            now = time.monotonic()
+            # Evict connections that have been idle too long before adding this one
+            self._evict_expired(now)
+            if len(self._idle.get((host, port), [])) < self.max_idle:
+                if self._idle_count >= self.max_idle_total:
+                    self._evict_oldest()
+                self._idle.setdefault((host, port), []).append((reader, now))
+                self._idle_count += 1
+                return
+        reader.data_socket.close()
+
+    def _evict_expired(self, now):
+        """
+        Close the connections that have been idle for longer than idle_timeout, for every (host, port).
+        The caller holds the lock.
+
+        :param float now: the time.monotonic() time
+        """
+        for key in list(self._idle):
+            idle = self._idle[key]
+            while idle and now - idle[0][1] > self.idle_timeout:
+                idle.pop(0)[0].data_socket.close()
+                self._idle_count -= 1
+            if not idle:
+                del self._idle[key]
+
+    def _evict_oldest(self):
+        """
+        Close the connection that has been idle the longest, over every (host, port).
+        The caller holds the lock.
+        """
+        key = min(self._idle, key=lambda key: self._idle[key][0][1])
+        idle = self._idle[key]
+        idle.pop(0)[0].data_socket.close()
+        self._idle_count -= 1
+        if not idle:
+            del self._idle[key]
+
+    def close(self):
+        """
+        Close every idle connection in the pool
+        """
+        with self._lock:
+            for idle in self._idle.values():
+                for reader, idle_since in idle:
+                    reader.data_socket.close()
+            self._idle.clear()
+            self._idle_count = 0
+
+
+def is_stale(reader):
+    """
+    Checks whether an idle connection can no longer be used. An idle connection should have
+    nothing to read, so if it is readable the server has closed it (or sent something unexpected).
 
-def send_request(host, resource, socket):
+    :param reader: the buffered reader for the idle connection
+    :return: True if the connection should be discarded
+    :rtype: bool
+    """
+    if reader.buffered():
+        return True
+    if hasattr(select, 'poll'):
+        # poll, unlike select, works for file descriptors of 1024 and up
+        poller = select.poll()
+        poller.register(reader.data_socket, select.POLLIN)
+        return bool(poller.poll(0))
+    # Windows has no poll, and its select has no limit on socket numbers
+    readable, writable, errors = select.select([reader.data_socket], [], [], 0)
+    return bool(readable)
+
+
+def send_request(host, resource, socket, keep_alive=False, range_start=None, if_range=None):
     """
     Create and send a HTTP request for the resource
     :param host: hostname
     :param resource: resource
     :param socket: the socket
+    :param keep_alive: whether to ask the server to keep the connection open after the response
+    :param range_start: the offset to request the resource from, or None for all of it
+    :param if_range: the validator of the version the range must come from, or None for any version
     :author: Stuart Harley
     """
-    request = b'GET ' + resource + b' HTTP/1.1\r\nHost: ' + host + b'\r\n\r\n'
-    socket.sendall(request)
+    socket.sendall(build_request(host, resource, keep_alive, range_start, if_range))
+
+
+def build_request(host, resource, keep_alive, range_start=None, if_range=None):
+    """
+    Create the HTTP GET request for the resource
+
+    :param bytes host: hostname
+    :param bytes resource: resource
+    :param bool keep_alive: whether to ask the server to keep the connection open after the response
+    :param range_start: the offset to request the resource from with a Range header,
+           or None for all of it
+    :param if_range: the ETag or Last-Modified date, as a str, of the version of the resource the
+           range must come from, sent in an If-Range header; or None to accept a range of any version
+    :return: the request as a bytes object
+    :rtype: bytes object
+    """
+    connection = b'keep-alive' if keep_alive else b'close'
+    byte_range = b'Range: bytes=' + str(range_start).encode('ASCII') + b'-\r\n' if range_start else b''
+    if range_start and if_range:
+        byte_range += b'If-Range: ' + if_range.encode('ASCII') + b'\r\n'
+    return (b'GET ' + resource + b' HTTP/1.1\r\nHost: ' + host + b'\r\nConnection: ' + connection + b'\r\n'
+            + byte_range + b'\r\n')
+
+
+def get_partial_size(file_name):
+    """
+    Finds how much of a resource an earlier, interrupted download already saved
+
+    :param str file_name: the file the resource is saved in
+    :return: the size of the file, or None if it does not exist or is empty
+    :rtype: int or None
+    """
+    try:
+        return os.stat(file_name).st_size or None
+    except OSError:
+        return None
+
+
+def load_validator(file_name):
+    """
+    Reads the validator saved for a download made with resume=True
+
+    :param str file_name: the file the resource is saved in
+    :return: the ETag or Last-Modified date, or None if none was saved
+    :rtype: str or None
+    """
+    try:
+        with open(file_name + VALIDATOR_SUFFIX) as validator_file:
+            return validator_file.read().strip() or None
+    except OSError:
+        return None
+
+
+def save_validator(file_name, headers):
+    """
+    Saves the validator of a response whose body is about to be written to the file, so a
+    later resume can ask for the rest of this same version. A strong ETag is preferred, as
+    If-Range cannot use a weak one. When the response has no validator, any saved one is removed.
+
+    :param str file_name: the file the resource is saved in
+    :param headers: the headers as a byte object
+    """
+    etag = get_header_value(headers, 'ETag')
+    validator = etag if etag and not etag.startswith('W/') else get_header_value(headers, 'Last-Modified')
+    if validator:
+        with open(file_name + VALIDATOR_SUFFIX, 'w') as validator_file:
+            validator_file.write(validator)
+    elif os.path.exists(file_name + VALIDATOR_SUFFIX):
+        os.remove(file_name + VALIDATOR_SUFFIX)
+
+
+def get_complete_length(headers):
+    """
+    Gets the complete length of the resource from a Content-Range header, such as
+    'bytes */1234' in a 416 response or 'bytes 0-99/1234' in a 206 response
+
+    :param headers: the headers as a byte object
+    :return: the complete length, or None if it is not given
+    :rtype: int or None
+    """
+    content_range = get_header_value(headers, 'Content-Range') or ''
+    complete_length = content_range.rpartition('/')[2]
+    return int(complete_length) if content_range.startswith('bytes ') and complete_length.isdigit() else None
+
+
+def check_content_range(headers, range_start):
+    """
+    Checks that a 206 Partial Content response starts where the saved part of the file ends
+
+    :param headers: the headers as a byte object
+    :param int range_start: the offset that was requested
+    :raises ValueError: if the response holds a different part of the resource
+    """
+    content_range = get_header_value(headers, 'Content-Range') or ''
+    unit, space, byte_range = content_range.partition(' ')
+    first = byte_range.partition('-')[0]
+    if unit != 'bytes' or not first.isdigit() or int(first) != range_start:
+        raise ValueError('unexpected Content-Range: {0!r}'.format(content_range))
 
 
-def get_next_header(data_socket):
+def get_next_header(reader):
     """
     Read the next header from the HTTP response
 
-    :param data_socket: the socket to read from
+    :param reader: the buffered reader for the socket
     :return: the next header as a byte object
     :rtype: byte object
     :author: Stuart Harley
     """
-    header = b''
-    while b'\r\n' not in header:
-        header += next_byte(data_socket)
-    return header
+    return reader.read_until(b'\r\n')
 
 
 def get_status_code(header):
@@ -159,13 +642,15 @@ def interpret_body_length(headers):
     Otherwise is will be 'Transfer-Encoding: chunked'
 
     :param headers: the headers as a byte object
-    :return: the status code as a str. Either 'chunked' or the actual number of octets
+    :return: the status code as a str. Either 'chunked', the actual number of octets, or '' if neither is given
     :rtype: str
     :author: Stuart Harley, Shanthosh Reddy
     """
     headers = headers.decode('ASCII')
     if 'Transfer-Encoding: chunked' in headers:
         return 'chunked'
+    elif 'Content-Length:' not in headers:
+        return ''
     else:
         index = headers.index('Content-Length:')
         length_and_rest_of_headers = headers[index + 16:]
@@ -174,70 +659,268 @@ def interpret_body_length(headers):
         return length
 
 
-def interpret_content_length(data_socket, body_length):
+def get_header_value(headers, name):
+    """
+    Finds the value of a header, ignoring the case of its name
+
+    :param headers: the headers as a byte object
+    :param str name: the name of the header, such as 'Connection'
+    :return: the value of the header with surrounding whitespace removed, or None if it is not present
+    :rtype: str or None
     """
-    Decodes the body of the message
+    for header in headers.decode('ASCII').split('\r\n'):
+        field_name, colon, value = header.partition(':')
+        if colon and field_name.strip().lower() == name.lower():
+            return value.strip()
+    return None
+
+
+def is_persistent(status_line, headers):
+    """
+    Decides whether the connection can carry another request after this response.
+    HTTP/1.1 connections persist unless either side sends 'Connection: close', HTTP/1.0
+    connections only with 'Connection: keep-alive', and either way the end of the body
+    must be marked by Content-Length or chunked framing rather than by closing the connection.
+
+    :param status_line: the status line as a bytes object
+    :param headers: the headers as a byte object
+    :return: True if the connection can be reused
+    :rtype: bool
+    """
+    connection = (get_header_value(headers, 'Connection') or '').lower()
+    if status_line.startswith(b'HTTP/1.0'):
+        persistent = connection == 'keep-alive'
+    else:
+        persistent = connection != 'close'
+    body_length = interpret_body_length(headers)
+    return persistent and (body_length == 'chunked' or body_length.isnumeric())
+
 
-    :param data_socket: the socket to read from
+def interpret_body(reader, headers):
+    """
+    Picks the body decoder that matches the framing given in the headers
+
+    :param reader: the buffered reader for the socket
+    :param headers: the headers as a byte object
+    :return: an iterator over the blocks of the body as bytes objects
+    """
+    body_length = interpret_body_length(headers)
+    if body_length == 'chunked':
+        return interpret_chunked(reader)
+    elif body_length.isnumeric():
+        return interpret_content_length(reader, int(body_length))
+    else:
+        print('Neither chuncked or content-length')
+        return iter(())
+
+
+def interpret_content_length(reader, body_length):
+    """
+    Decodes the body of the message, yielding each block as it arrives
+
+    :param reader: the buffered reader for the socket
     :param body_length: the length of the body as an int
-    :return: the body of the message as a bytes object
-    :rtype: bytes object
+    :return: a generator of the blocks of the body as bytes objects, each at most one buffer long
     :author: Stuart Harley, Shanthosh Reddy
     """
-    data = b''
-    for x in range(body_length):
-        data += next_byte(data_socket)
-    return data
+    remaining = body_length
+    while remaining > 0:
+        block = reader.read_some(min(remaining, DEFAULT_BUFFER_SIZE))
+        remaining -= len(block)
+        yield block
 
 
-def interpret_chunked(data_socket):
+def interpret_chunked(reader):
     """
-    Interprets the chunked message and returns it as a byte object
+    Interprets the chunked message, yielding the data as it arrives
 
-    :param data_socket: the socket to read from
-    :return: the data as a bytes object
-    :rtype: bytes object
+    :param reader: the buffered reader for the socket
+    :return: a generator of the blocks of the data as bytes objects, each at most one buffer long
     :author: Stuart Harley, Shanthosh Reddy
     """
-    chunk_length = get_chunk_length(data_socket)
-    chunk_data = b''
+    chunk_length = get_chunk_length(reader)
     while not chunk_length == 0:
-        for x in range(chunk_length):
-            chunk_data += next_byte(data_socket)
-        next_byte(data_socket)  # Clears the next CR LF
-        next_byte(data_socket)
-        chunk_length = get_chunk_length(data_socket)
-    return chunk_data
+        yield from interpret_content_length(reader, chunk_length)
+        reader.read_exact(2)  # Clears the next CR LF
+        chunk_length = get_chunk_length(reader)
+    # Skip any trailer fields up to the blank line that ends the message
+    while reader.read_until(b'\r\n') != b'\r\n':
+        pass
 
 
-def get_chunk_length(data_socket):
+def get_chunk_length(reader):
     """
     Reads the chunk length and returns it as an int
-    :param data_socket: the socket
+    :param reader: the buffered reader for the socket
     :return: the chunk length as an int
     :rtype: int
     :author: Stuart Harley, Shanthosh Reddy
     """
-    chunk_length = next_byte(data_socket)
-    while b'\r\n' not in chunk_length:
-        chunk_length += next_byte(data_socket)
+    chunk_length = reader.read_until(b'\r\n')
     chunk_length = chunk_length[:-2]
     return int(chunk_length, 16)
 
 
-def write_message(data, filename):
+def write_message(blocks, filename, append=False):
     """
-    Writes a message to a file
+    Writes a message to a file one block at a time, so only one block is held in memory
 
-    :param bytes object data: The data to be written
+    :param blocks: an iterable of the bytes objects to be written, in order
     :param str filename: the filename
+    :param bool append: add the blocks to the end of the file instead of replacing it
     :author: Stuart Harley
     """
     # We are writing raw bytes (plain ASCII text) to the file
     # Since we opened the file in binary mode,
     # you must write a bytes object, not a str.
-    with open(filename, 'wb') as output_file:
-        output_file.write(data)
+    with open(filename, 'ab' if append else 'wb') as output_file:
+        for block in blocks:
+            output_file.write(block)
+
+
+# asyncio client
+#
+# The same request flow as make_http_request, but on asyncio streams, so one thread can
+# keep many downloads in flight at once.
+
+
+def get_http_resources_async(urls, max_in_flight=MAX_WORKERS, max_per_host=MAX_CONNECTIONS_PER_HOST):
+    """
+    Get many HTTP resources at once on an asyncio event loop
+
+    :param urls: an iterable of (url, file_name) pairs, one for each resource to get
+    :param int max_in_flight: the most downloads to run at once
+    :param int max_per_host: the most downloads from one (host, port) to run at once
+    :return: a (url, status code, seconds) tuple for each resource, in the order given.
+             The status code is None if the request failed.
+    :rtype: list
+    """
+    return asyncio.run(fetch_all_async(urls, max_in_flight, max_per_host))
+
+
+async def fetch_all_async(urls, max_in_flight, max_per_host):
+    """
+    Coroutine behind get_http_resources_async
+
+    :param urls: an iterable of (url, file_name) pairs, one for each resource to get
+    :param int max_in_flight: the most downloads to run at once
+    :param int max_per_host: the most downloads from one (host, port) to run at once
+    :return: a (url, status code, seconds) tuple for each resource, in the order given
+    :rtype: list
+    """
+    in_flight_limit = asyncio.Semaphore(max_in_flight)
+    host_limits = {}
+
+    async def fetch(url, file_name):
+        start = time.perf_counter()
+        status_code = None
+        url_parts = parse_url(url)
+        if url_parts is None:
+            print('get_http_resources_async: URL="{0}" parse failed, request not sent'.format(url))
+        else:
+            host, port, resource = url_parts
+            host_limit = host_limits.setdefault((host, port), asyncio.Semaphore(max_per_host))
+            # The host permit is taken first, so a download waiting for its host does not hold
+            # one of the in-flight slots that downloads from other hosts could use
+            async with host_limit, in_flight_limit:
+                try:
+                    status_code = await make_http_request_async(host, port, resource, file_name)
+                except (OSError, EOFError, ValueError, asyncio.LimitOverrunError) as error:
+                    print('get_http_resources_async: URL="{0}" failed: {1!r}'.format(url, error))
+        seconds = time.perf_counter() - start
+        print('get_http_resources_async: URL="{0}", status="{1}", {2:.3f}s'.format(url, status_code, seconds))
+        return url, status_code, seconds
+
+    return await asyncio.gather(*[fetch(url, file_name) for url, file_name in urls])
+
+
+async def make_http_request_async(host, port, resource, file_name):
+    """
+    Get an HTTP resource from a server using asyncio streams
+
+    :param bytes host: the ASCII domain name or IP address of the server machine (i.e., host) to connect to
+    :param int port: port number to connect to on server host
+    :param bytes resource: the ASCII path/name of resource to get, including the first /.
+    :param file_name: string (str) containing name of file in which to store the retrieved resource
+    :return: the status code
+    :rtype: str
+    """
+    stream_reader, stream_writer = await asyncio.open_connection(host.decode('ASCII'), port,
+                                                                 limit=DEFAULT_BUFFER_SIZE)
+    try:
+        stream_writer.write(build_request(host, resource, False))
+        status_line = await stream_reader.readuntil(b'\r\n')
+        header = await stream_reader.readuntil(b'\r\n')
+        headers = [header]
+        while header != b'\r\n':
+            header = await stream_reader.readuntil(b'\r\n')
+            headers.append(header)
+        with open(file_name, 'wb') as output_file:
+            async for block in interpret_body_async(stream_reader, b''.join(headers)):
+                output_file.write(block)
+    finally:
+        stream_writer.close()
+        try:
+            await stream_writer.wait_closed()
+        except OSError:
+            # The connection was already broken; any error that broke it has been raised instead
+            pass
+    return get_status_code(status_line)
+
+
+async def interpret_body_async(stream_reader, headers):
+    """
+    Picks the body decoder that matches the framing given in the headers
+
+    :param stream_reader: the asyncio.StreamReader for the connection
+    :param headers: the headers as a byte object
+    :return: an async generator of the blocks of the body as bytes objects
+    """
+    body_length = interpret_body_length(headers)
+    if body_length == 'chunked':
+        async for block in interpret_chunked_async(stream_reader):
+            yield block
+    elif body_length.isnumeric():
+        async for block in interpret_content_length_async(stream_reader, int(body_length)):
+            yield block
+    else:
+        print('Neither chuncked or content-length')
+
+
+async def interpret_content_length_async(stream_reader, body_length):
+    """
+    Decodes a body of known length, yielding each block as it arrives
+
+    :param stream_reader: the asyncio.StreamReader for the connection
+    :param body_length: the length of the body as an int
+    :return: an async generator of the blocks of the body as bytes objects, each at most one buffer long
+    """
+    remaining = body_length
+    while remaining > 0:
+        block = await stream_reader.read(min(remaining, DEFAULT_BUFFER_SIZE))
+        if not block:
+            raise EOFError('connection closed by peer')
+        remaining -= len(block)
+        yield block
+
+
+async def interpret_chunked_async(stream_reader):
+    """
+    Interprets a chunked body, yielding the data as it arrives
+
+    :param stream_reader: the asyncio.StreamReader for the connection
+    :return: an async generator of the blocks of the data as bytes objects, each at most one buffer long
+    """
+    chunk_length = int((await stream_reader.readuntil(b'\r\n'))[:-2], 16)
+    while not chunk_length == 0:
+        async for block in interpret_content_length_async(stream_reader, chunk_length):
+            yield block
+        await stream_reader.readexactly(2)  # Clears the next CR LF
+        chunk_length = int((await stream_reader.readuntil(b'\r\n'))[:-2], 16)
+    # Skip any trailer fields up to the blank line that ends the message
+    while await stream_reader.readuntil(b'\r\n') != b'\r\n':
+        pass
 
 
-main()
+if __name__ == '__main__':
+    main()
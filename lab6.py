@@ -14,130 +14,632 @@ import re
 import threading
 import os
 import mimetypes
-import datetime
+import time
+import queue
+import argparse
+import asyncio
+import collections
+import stat
+import functools
+import email.utils
+import gzip
+import zlib
+import multiprocessing
+import signal
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+from buffered_reader import BufferedReader, DEFAULT_BUFFER_SIZE
+from request_parser import RequestParser, RequestParseError
+
+# Serving engines: a pool of worker threads doing blocking I/O, or one asyncio event loop
+ENGINE_THREAD = 'thread'
+ENGINE_EVENT = 'event'
+
+# Number of worker threads handling requests
+POOL_SIZE = 16
+
+# Length of the listen queue of connections waiting for accept
+BACKLOG = 128
+
+# Number of accepted connections that may wait for a free worker before new ones are rejected with a 503
+QUEUE_SIZE = 256
+
+# Most open files the event engine raises its limit to; macOS refuses an unlimited soft limit
+MAX_OPEN_FILES = 65536
+
+# Number of server processes; more than one lets parsing use more than one core despite the GIL
+PROCESSES = 1
+
+# Set to True to print every connection and request headers (slow under load)
+VERBOSE = False
+
+# Reason phrases for the status codes the server sends
+REASON_PHRASES = {
+    b'200': b'OK',
+    b'206': b'Partial Content',
+    b'304': b'Not Modified',
+    b'400': b'Bad Request',
+    b'404': b'Not Found',
+    b'413': b'Content Too Large',
+    b'414': b'URI Too Long',
+    b'416': b'Range Not Satisfiable',
+    b'431': b'Request Header Fields Too Large',
+    b'500': b'Internal Server Error',
+    b'501': b'Not Implemented',
+    b'503': b'Service Unavailable',
+}
+
+# The full status line for each status code, built once
+STATUS_LINES = {status_code: b'HTTP/1.1 ' + status_code + b' ' + reason_phrase + b'\r\n'
+                for status_code, reason_phrase in REASON_PHRASES.items()}
+
+# Connection header values, by whether the connection persists after the response
+CONNECTION_VALUES = {True: b'keep-alive\r\n', False: b'close\r\n'}
+
+# Most distinct file extensions whose MIME type is remembered
+MIME_CACHE_SIZE = 1024
+
+# Seconds a persistent connection may wait for its next request before the server closes it
+KEEP_ALIVE_TIMEOUT = 5
+
+# Most requests served on one persistent connection before the server closes it
+MAX_KEEP_ALIVE_REQUESTS = 100
+
+# Seconds between checks, while a worker thread waits on an idle connection, for new
+# connections waiting for a worker
+IDLE_CHECK_INTERVAL = 0.05
+
+# Largest request body the server reads past to keep the connection open; a bigger one is answered with 413
+MAX_REQUEST_BODY_SIZE = 64 * 1024
+
+# Most bytes of file bodies and headers the file cache holds before evicting the least recently used
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Largest file whose body is kept in the file cache; bigger files are sent from disk with sendfile
+CACHE_MAX_FILE_SIZE = 1024 * 1024
+
+# The content coding the server can serve, and the suffix of a precompressed sibling file
+GZIP = 'gzip'
+GZIP_SUFFIX = '.gz'
+
+# zlib compression level for files compressed by the server (1 is fastest, 9 is smallest)
+GZIP_LEVEL = 6
+
+# Smallest file worth compressing; below this the gzip header outweighs the saving
+GZIP_MIN_SIZE = 256
+
+# MIME types besides text/* that are compressed when the client accepts gzip
+COMPRESSIBLE_TYPES = {'application/javascript', 'application/json', 'application/xml', 'image/svg+xml'}
+
+# Bytes read from a file at a time when its body is compressed as it is streamed
+STREAM_BLOCK_SIZE = 64 * 1024
+
+# The zero-length chunk and empty trailer section that end a chunked body
+LAST_CHUNK = b'0\r\n\r\n'
 
 
 def main():
     """ Start the server """
-    http_server_setup(8080)
+    parser = argparse.ArgumentParser(description='A simple HTTP server')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--engine', choices=[ENGINE_THREAD, ENGINE_EVENT], default=ENGINE_THREAD,
+                        help='serve with a pool of worker threads or with one asyncio event loop')
+    parser.add_argument('--pool-size', type=int, default=POOL_SIZE, help='worker threads for the thread engine')
+    parser.add_argument('--backlog', type=int, default=BACKLOG)
+    parser.add_argument('--queue-size', type=int, default=QUEUE_SIZE)
+    parser.add_argument('--keep-alive-timeout', type=float, default=KEEP_ALIVE_TIMEOUT,
+                        help='seconds an idle persistent connection is kept open')
+    parser.add_argument('--max-requests', type=int, default=MAX_KEEP_ALIVE_REQUESTS,
+                        help='requests per connection; 1 closes every connection after one response')
+    parser.add_argument('--processes', type=int, default=PROCESSES,
+                        help='server processes, each running its own engine (for example, one per core)')
+    args = parser.parse_args()
+    http_server_setup(args.port, args.pool_size, args.backlog, args.queue_size, args.engine,
+                      args.keep_alive_timeout, args.max_requests, args.processes)
 
 
-def http_server_setup(port):
+def http_server_setup(port, pool_size=POOL_SIZE, backlog=BACKLOG, queue_size=QUEUE_SIZE, engine=ENGINE_THREAD,
+                      keep_alive_timeout=KEEP_ALIVE_TIMEOUT, max_requests=MAX_KEEP_ALIVE_REQUESTS,
+                      processes=PROCESSES):
     """
     Start the HTTP server
     - Open the listening socket
-    - Accept connections and spawn processes to handle requests
+    - Serve connections with the chosen engine until Ctrl-C, in this process or in
+      several worker processes
 
     :param port: listening port number
+    :param pool_size: number of worker threads for the thread engine
+    :param backlog: length of the listen queue of connections not yet accepted
+    :param queue_size: number of accepted connections that may wait for a worker in the thread engine
+    :param engine: ENGINE_THREAD or ENGINE_EVENT
+    :param keep_alive_timeout: seconds a persistent connection may wait for its next request
+    :param max_requests: most requests served on one connection
+    :param processes: number of server processes
     """
+    handler_options = {'keep_alive_timeout': keep_alive_timeout, 'max_requests': max_requests}
+    engine_options = {'engine': engine, 'pool_size': pool_size, 'queue_size': queue_size,
+                      'handler_options': handler_options}
+    if processes > 1:
+        serve_processes(port, backlog, processes, engine_options)
+    else:
+        serve(open_server_socket(port, backlog), **engine_options)
+
 
-    num_connections = 10
+def open_server_socket(port, backlog, reuse_port=False):
+    """
+    Open a listening socket on the port
+
+    :param port: listening port number
+    :param backlog: length of the listen queue of connections not yet accepted
+    :param reuse_port: set SO_REUSEPORT, so several processes can each listen on the port
+           with their own socket and the kernel spreads new connections among them
+    :return: the listening socket
+    """
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if reuse_port:
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
     listen_address = ('', port)
     server_socket.bind(listen_address)
-    server_socket.listen(num_connections)
+    server_socket.listen(backlog)
+    return server_socket
+
+
+def serve(server_socket, engine, pool_size, queue_size, handler_options):
+    """
+    Serve connections on the listening socket with the chosen engine until Ctrl-C
+
+    :param server_socket: the listening socket
+    :param engine: ENGINE_THREAD or ENGINE_EVENT
+    :param pool_size: number of worker threads for the thread engine
+    :param queue_size: number of accepted connections that may wait for a worker in the thread engine
+    :param handler_options: keyword arguments for the connection handler
+    """
+    if engine == ENGINE_EVENT:
+        serve_event_loop(server_socket, handler_options)
+    else:
+        serve_threads(server_socket, pool_size, queue_size, handler_options)
+
+
+def serve_processes(port, backlog, processes, engine_options):
+    """
+    Serve connections with several worker processes, each running its own engine, so the
+    server is not limited to the one core the GIL allows a single process.
+    Where the platform has SO_REUSEPORT, every worker opens its own listening socket on the
+    port; otherwise this process opens one socket and the workers share it.
+
+    A Ctrl-C (or SIGTERM to this process) is passed on to each worker once, as SIGTERM, and
+    each worker shuts down the same way a single-process server does on Ctrl-C. This process
+    waits for all of them to finish.
+
+    :param port: listening port number
+    :param backlog: length of the listen queue of connections not yet accepted
+    :param processes: number of worker processes
+    :param engine_options: keyword arguments for serve
+    """
+    reuse_port = hasattr(socket, 'SO_REUSEPORT')
+    server_socket = None if reuse_port else open_server_socket(port, backlog)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    workers = []
+    try:
+        for x in range(processes):
+            worker = multiprocessing.Process(target=serve_worker,
+                                             args=(server_socket, port, backlog, engine_options))
+            worker.start()
+            workers.append(worker)
+        if server_socket is not None:
+            # The workers have their own copies
+            server_socket.close()
+        for worker in workers:
+            worker.join()
+    # Set up so a Ctrl-C should terminate the server; this may have some problems on Windows
+    except KeyboardInterrupt:
+        print("HTTP server exiting . . .")
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        for worker in workers:
+            worker.join()
+
+
+def serve_worker(server_socket, port, backlog, engine_options):
+    """
+    Run by each worker process: open its listening socket if it has none, then serve until stopped.
+    Ctrl-C in a terminal reaches every process in the group, so workers ignore SIGINT and stop
+    only when the parent sends SIGTERM; that way each one shuts down gracefully exactly once.
+
+    :param server_socket: the shared listening socket, or None to open one with SO_REUSEPORT
+    :param port: listening port number
+    :param backlog: length of the listen queue of connections not yet accepted
+    :param engine_options: keyword arguments for serve
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    if server_socket is None:
+        server_socket = open_server_socket(port, backlog, reuse_port=True)
+    serve(server_socket, **engine_options)
+
+
+def serve_threads(server_socket, pool_size, queue_size, handler_options):
+    """
+    Serve connections with a fixed pool of worker threads
+    - Start the worker threads
+    - Accept connections and queue them for the workers. When queue_size connections are
+      already waiting, new connections are answered with 503 Service Unavailable and closed.
+
+    A worker is tied to its connection while the connection is idle between requests, so a
+    worker with an idle connection closes it as soon as a new connection is waiting. With
+    pool_size idle keep-alive clients, a new client is then served within IDLE_CHECK_INTERVAL
+    rather than after keep_alive_timeout, and the idle clients reconnect for their next request.
+
+    :param server_socket: the listening socket
+    :param pool_size: number of worker threads
+    :param queue_size: number of accepted connections that may wait for a worker
+    :param handler_options: keyword arguments for handle_request
+    """
+    connection_queue = queue.Queue(queue_size)
+    workers = []
+    for x in range(pool_size):
+        worker = threading.Thread(target=serve_connections, args=(connection_queue, handler_options), daemon=True)
+        worker.start()
+        workers.append(worker)
     try:
         while True:
             request_socket, request_address = server_socket.accept()
-            print('connection from {0} {1}'.format(request_address[0], request_address[1]))
-            # Create a new thread, and set up the handle_request method and its argument (in a tuple)
-            request_handler = threading.Thread(target=handle_request, args=(request_socket,))
-            # Start the request handler thread.
-            request_handler.start()
-            # handle_request(request_socket) to be used for testing, comment out previous 2 lines
-            # Just for information, display the running threads (including this main one)
-            print('threads: ', threading.enumerate())
+            if VERBOSE:
+                print('connection from {0} {1}'.format(request_address[0], request_address[1]))
+            try:
+                connection_queue.put_nowait(request_socket)
+            except queue.Full:
+                reject_connection(request_socket)
     # Set up so a Ctrl-C should terminate the server; this may have some problems on Windows
     except KeyboardInterrupt:
         print("HTTP server exiting . . .")
-        print('threads: ', threading.enumerate())
+        print('file cache: ', FILE_CACHE.stats())
         server_socket.close()
+        # Let the workers finish the connections already queued, then stop
+        for worker in workers:
+            connection_queue.put(None)
+        for worker in workers:
+            worker.join()
+
 
+def serve_connections(connection_queue, handler_options):
+    """
+    Run by each worker thread: handle connections from the queue until it hands out None
 
-def next_byte(data_socket):
+    :param connection_queue: the queue.Queue of accepted sockets
+    :param handler_options: keyword arguments for handle_request
+    :return: None
     """
-    Read the next byte from the socket data_socket.
+    while True:
+        request_socket = connection_queue.get()
+        if request_socket is None:
+            return
+        try:
+            handle_request(request_socket, others_waiting=lambda: not connection_queue.empty(), **handler_options)
+        except (EOFError, OSError):
+            # The client went away before a full request and response were exchanged
+            request_socket.close()
+        except Exception as error:
+            # A bug must cost only this connection, not the worker
+            print('serve_connections: connection failed: {0!r}'.format(error))
+            request_socket.close()
 
-    Read the next byte from the sender, received over the network.
-    If the byte has not yet arrived, this method blocks (waits)
-      until the byte arrives.
-    If the sender is done sending and is waiting for your response, this method blocks indefinitely.
 
-    :param data_socket: The socket to read from. The data_socket argument should be an open tcp
-                        data connection (either a client socket or a server data socket), not a tcp
-                        server's listening socket.
-    :return: the next byte, as a bytes object with a single byte in it
+def reject_connection(request_socket):
+    """
+    Answer a connection with 503 Service Unavailable and close it, because every worker is busy
+
+    :param request_socket: socket representing TCP connection from the HTTP client_socket
+    :return: None
     """
-    return data_socket.recv(1)
+    try:
+        request_socket.sendall(generate_error_response(b'503'))
+    except OSError:
+        pass
+    request_socket.close()
 
 
-def get_next_header(data_socket):
+def generate_error_response(status_code):
     """
-    Read the next header from the HTTP request
+    Generates a complete response with no body, for a request that is answered and then
+    has its connection closed
 
-    :param data_socket: the socket to read from
-    :return: the next header as a bytes object
+    :param status_code: the status code as a bytes object
+    :return: the response as a bytes object
     :rtype: bytes object
-    :author: Stuart Harley
     """
-    header = b''
-    while b'\r\n' not in header:
-        header += next_byte(data_socket)
-    return header
+    response_headers = generate_connection_headers()
+    response_headers[b'Content-Length: '] = b'0\r\n'
+    return assemble_response(generate_status_line(status_code), response_headers, b'')
 
 
-def parse_headers(data_socket):
+def serve_event_loop(server_socket, handler_options):
     """
-    Reads through the headers of the request and returns the headers
-    as str objects stored in a dictionary
+    Serve connections with one asyncio event loop. Each connection is a coroutine that
+    waits for request bytes without blocking, so an idle keep-alive connection costs only
+    its buffers and a file descriptor rather than a thread.
 
-    :param: data_socket: the socket to read from
-    :return: a dictionary containing the headers
-    :rtype: dictionary
-    :author: Stuart Harley, Shanthosh Reddy
+    :param server_socket: the listening socket
+    :param handler_options: keyword arguments for handle_request_async
     """
-    headers = {}
-    header = get_next_header(data_socket)
-    while header != b'\r\n':
-        header = header.decode('ASCII')
-        split_header = header.split(': ')
-        headers[split_header[0]] = split_header[1]
-        header = get_next_header(data_socket)
-    return headers
+    raise_open_file_limit()
+    try:
+        asyncio.run(run_event_loop(server_socket, handler_options))
+    # Set up so a Ctrl-C should terminate the server; this may have some problems on Windows
+    except KeyboardInterrupt:
+        pass
+    print("HTTP server exiting . . .")
+    print('file cache: ', FILE_CACHE.stats())
+    server_socket.close()
 
 
-def parse_request_line(data_socket):
+async def run_event_loop(server_socket, handler_options):
     """
-    Reads the request line of the request and returns the url
+    Accept connections on the listening socket and handle each with handle_request_async,
+    until Ctrl-C or SIGTERM. SIGTERM stops the loop from a signal handler the loop runs
+    itself, so it is never interrupted part way through a callback.
 
-    :param: data_socket: the socket to read from
-    :return: the url as a bytes object
-    :rtype: bytes object
-    :author: Shanthosh Reddy
+    :param server_socket: the listening socket
+    :param handler_options: keyword arguments for handle_request_async
     """
-    request_line = b''
-    while b'\r\n' not in request_line:
-        request_line += next_byte(data_socket)
-    request_line = request_line.split()
-    return request_line[1]
+    handler = functools.partial(handle_request_async, **handler_options)
+    server = await asyncio.start_server(handler, sock=server_socket, limit=DEFAULT_BUFFER_SIZE)
+    stop = asyncio.Event()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+    except NotImplementedError:  # No loop signal handlers on Windows
+        pass
+    async with server:
+        await stop.wait()
 
 
-def parse_request(data_socket):
+def raise_open_file_limit():
+    """
+    Raise this process's limit on open files to the hard limit, or to MAX_OPEN_FILES if the
+    hard limit is higher or unlimited, since every connection held by the event loop uses a
+    file descriptor. Raising the limit only lets more connections be held, so if the system
+    refuses, the server starts with the limit it has.
     """
-    Parses through the request line and headers of the request. Prints out the headers
-    to verify the request is being handled correctly since we will not need the headers further.
-    Returns the url from the request line.
+    if resource is not None:
+        soft_limit, hard_limit = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if hard_limit == resource.RLIM_INFINITY or hard_limit > MAX_OPEN_FILES:
+            new_limit = MAX_OPEN_FILES
+        else:
+            new_limit = hard_limit
+        if soft_limit != resource.RLIM_INFINITY and soft_limit < new_limit:
+            try:
+                resource.setrlimit(resource.RLIMIT_NOFILE, (new_limit, hard_limit))
+            except (ValueError, OSError):
+                pass
 
-    :param: data_socket: the socket to read from
-    :return: the url from the request line as a bytes object
-    :rtype: bytes object
+
+async def handle_request_async(stream_reader, stream_writer, keep_alive_timeout=KEEP_ALIVE_TIMEOUT,
+                               max_requests=MAX_KEEP_ALIVE_REQUESTS):
+    """
+    Handle the HTTP requests on one connection on the event loop. The request line and
+    headers are fed to a RequestParser as their bytes arrive, and each response is written
+    without blocking the loop.
+
+    Keeps the connection open for further requests while the client asks for a persistent
+    connection, until it has been idle for keep_alive_timeout seconds or max_requests
+    requests have been served.
+
+    :param stream_reader: the asyncio.StreamReader for the connection
+    :param stream_writer: the asyncio.StreamWriter for the connection
+    :param keep_alive_timeout: seconds to wait for the next request
+    :param max_requests: most requests to serve on this connection
+    :return: None
+    """
+    parser = RequestParser()
+    try:
+        served = 0
+        keep_alive = True
+        while keep_alive:
+            try:
+                method, url, version, headers = await asyncio.wait_for(read_request_async(stream_reader, parser),
+                                                                       keep_alive_timeout)
+            except asyncio.TimeoutError:
+                break
+            except RequestParseError as error:
+                stream_writer.write(generate_error_response(error.status_code))
+                await stream_writer.drain()
+                break
+            served += 1
+            keep_alive = wants_keep_alive(version, headers) and served < max_requests
+            status_line, response_headers, response_body = build_response(url, keep_alive, headers, version)
+            if method == b'HEAD':
+                # The headers describe the body a GET would get, but none is sent
+                close_response_body(response_body)
+                response_body = b''
+            head = assemble_response(status_line, response_headers, b'')
+            if isinstance(response_body, FileBody):
+                with response_body.file:
+                    stream_writer.write(head)
+                    # Uses os.sendfile where the platform supports it, so the file is never copied into Python
+                    await asyncio.get_running_loop().sendfile(stream_writer.transport, response_body.file,
+                                                              response_body.offset, response_body.count)
+            elif isinstance(response_body, (bytes, memoryview)):
+                stream_writer.writelines([head, response_body])
+                await stream_writer.drain()
+            else:
+                try:
+                    stream_writer.write(head)
+                    for block in response_body:
+                        if block:
+                            stream_writer.writelines(frame_chunk(block))
+                            await stream_writer.drain()
+                    stream_writer.write(LAST_CHUNK)
+                    await stream_writer.drain()
+                finally:
+                    response_body.close()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        # The client closed the connection, possibly part way through a request
+        pass
+    except asyncio.CancelledError:
+        # The server is shutting down; end quietly instead of reporting the cancelled connection
+        pass
+    except Exception as error:
+        print('handle_request_async: connection failed: {0!r}'.format(error))
+    finally:
+        stream_writer.close()
+
+
+async def read_request_async(stream_reader, parser):
+    """
+    Read the request line and headers of the next request on the event loop, feeding the
+    bytes to the connection's parser as they arrive, then read past any request body
+
+    :param stream_reader: the asyncio.StreamReader for the connection
+    :param parser: the RequestParser for the connection, which keeps any bytes of the next request
+    :return: the method, the url as a str without its leading /, the HTTP version as a bytes object,
+             and the headers as a dictionary of str objects
+    :rtype: tuple
+    :raises RequestParseError: if the request is malformed or too big, or has a body the server cannot read past
+    """
+    request = parser.feed()
+    while request is None:
+        data = await stream_reader.read(DEFAULT_BUFFER_SIZE)
+        if not data:
+            raise asyncio.IncompleteReadError(b'', None)
+        request = parser.feed(data)
+    body_length = get_body_length(request.headers)
+    remaining = body_length - parser.discard(body_length)
+    while remaining:
+        data = await stream_reader.read(min(remaining, DEFAULT_BUFFER_SIZE))
+        if not data:
+            raise asyncio.IncompleteReadError(b'', remaining)
+        remaining -= len(data)
+    return unpack_request(request)
+
+
+def parse_request(reader, parser, timeout=None):
+    """
+    Reads the request line and headers of the next request, feeding the bytes to the
+    connection's parser as they arrive. Any request body is then read past, so it is not taken
+    for the next request. The whole head and body must arrive within timeout seconds, so a
+    client that sends them a few bytes at a time cannot hold a worker thread forever.
+    Returns the method, the url without its leading /, the HTTP version, and the headers.
+
+    :param: reader: the buffered reader for the socket
+    :param parser: the RequestParser for the connection, which keeps any bytes of the next request
+    :param timeout: seconds allowed for the whole head and body to arrive, or None for no limit
+    :return: the method as a bytes object, the url as a str, the HTTP version as a bytes object,
+             and the headers as a dictionary
+    :rtype: tuple
+    :raises RequestParseError: if the request is malformed or too big, or has a body the server cannot read past
+    :raises socket.timeout: if the head and body do not arrive in time
     :author: Stuart Harley
     """
-    request_url = parse_request_line(data_socket)
-    headers = parse_headers(data_socket)
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    request = parser.feed()
+    while request is None:
+        request = parser.feed(read_before(reader, deadline, DEFAULT_BUFFER_SIZE))
+    body_length = get_body_length(request.headers)
+    unread = body_length - parser.discard(body_length)
+    while unread:
+        unread -= len(read_before(reader, deadline, min(unread, DEFAULT_BUFFER_SIZE)))
+    if deadline is not None:
+        # Sending the response gets the full timeout for each send again
+        reader.data_socket.settimeout(timeout)
+    return unpack_request(request)
+
+
+def read_before(reader, deadline, size):
+    """
+    Reads at most size bytes, waiting for them no later than the deadline
+
+    :param reader: the buffered reader for the socket
+    :param deadline: the time.monotonic() time to stop waiting at, or None to wait as long as the socket allows
+    :param int size: the largest number of bytes to return
+    :return: between 1 and size bytes
+    :rtype: bytes object
+    :raises socket.timeout: if the deadline has passed or nothing arrives before it
+    """
+    if deadline is not None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise socket.timeout('request took too long')
+        reader.data_socket.settimeout(remaining)
+    return reader.read_some(size)
+
+
+def unpack_request(request):
+    """
+    Gets the parts of a parsed request the server uses. Prints out the headers when VERBOSE
+    is set, to verify the request is being handled correctly.
+
+    :param request: the Request from the parser
+    :return: the method as a bytes object, the url as a str without its leading /, the HTTP version
+             as a bytes object, and the headers as a dictionary of str objects
+    :rtype: tuple
+    """
+    if VERBOSE:
+        for k, v in request.headers.items():
+            print(k + ": " + v)
+    return request.method, request.target[1:], request.version, request.headers
+
+
+def get_body_length(headers):
+    """
+    Finds the length of the body of a request from its Content-Length header. The server has
+    no use for a body, but must read past it so that it is not taken for the next request.
+    A body in transfer coding is refused, since its end cannot be found without decoding it.
+
+    :param headers: the request headers as a dictionary of str objects
+    :return: the number of bytes in the body, 0 if there is none
+    :rtype: int
+    :raises RequestParseError: 501 for a Transfer-Encoding header, 400 for a malformed
+            Content-Length, or 413 for a body over MAX_REQUEST_BODY_SIZE
+    """
+    if get_header(headers, 'Transfer-Encoding') is not None:
+        raise RequestParseError(b'501', 'transfer coded request body')
+    content_length = get_header(headers, 'Content-Length')
+    if content_length is None:
+        return 0
+    if not re.fullmatch('[0-9]+', content_length):
+        raise RequestParseError(b'400', 'malformed Content-Length')
+    body_length = int(content_length)
+    if body_length > MAX_REQUEST_BODY_SIZE:
+        raise RequestParseError(b'413', 'request body too large')
+    return body_length
+
+
+def get_header(headers, name):
+    """
+    Looks up a request header, ignoring the case of its name
+
+    :param headers: the request headers as a dictionary of str objects
+    :param str name: the header name, such as 'Connection'
+    :return: the value with surrounding whitespace removed, or None if the header is not present
+    :rtype: str or None
+    """
+    name = name.lower()
     for k, v in headers.items():
-        print(k + ": " + v)
-    return request_url
+        if k.lower() == name:
+            return v.strip()
+    return None
+
+
+def wants_keep_alive(version, headers):
+    """
+    Decides whether the client asked for a persistent connection. HTTP/1.1 connections
+    persist unless the client sends 'Connection: close', and HTTP/1.0 connections only
+    if it sends 'Connection: keep-alive'.
+
+    :param version: the HTTP version of the request as a bytes object
+    :param headers: the request headers as a dictionary of str objects
+    :return: True if the connection should be kept open after the response
+    :rtype: bool
+    """
+    connection = (get_header(headers, 'Connection') or '').lower()
+    if version == b'HTTP/1.1':
+        return connection != 'close'
+    return connection == 'keep-alive'
 
 
 def generate_status_line(status_code):
@@ -149,12 +651,7 @@ def generate_status_line(status_code):
     :rtype: bytes object
     :author: Stuart Harley, Shanthosh Reddy
     """
-    status_line = b'HTTP/1.1 ' + status_code
-    if status_code == b'200':
-        status_line += b' OK\r\n'
-    elif status_code == b'404':
-        status_line += b' Not Found\r\n'
-    return status_line
+    return STATUS_LINES[status_code]
 
 
 def generate_response_headers(file_path):
@@ -170,34 +667,533 @@ def generate_response_headers(file_path):
     :rtype: dictionary
     :author: Stuart Harley, Shanthosh Reddy
     """
+    response_headers = generate_connection_headers()
+    response_headers.update(generate_file_headers(file_path, get_file_size(file_path)))
+    return response_headers
+
+
+def generate_connection_headers(keep_alive=False):
+    """
+    Generates the response headers that change with every response: a Date header
+    and a Connection header saying whether the connection stays open
+
+    :param keep_alive: True if the connection persists after this response
+    :return: the headers in a dictionary, where the key is the header name as a byte object,
+    and the value is the value as a bytes object
+    :rtype: dictionary
+    """
+    return {b'Date: ': get_date_value(), b'Connection: ': CONNECTION_VALUES[keep_alive]}
+
+
+# The second the Date value was last formatted for, and that value
+_date_value = (0, b'')
+
+
+def get_date_value():
+    """
+    Gets the value of the Date header for the current second. The value only changes once
+    a second, so it is formatted at most once a second instead of once per response.
+
+    :return: the date, such as 'Sun, 06 Nov 1994 08:49:37 GMT', followed by CRLF
+    :rtype: bytes object
+    """
+    global _date_value
+    now = int(time.time())
+    second, value = _date_value
+    if second != now:
+        value = email.utils.formatdate(now, usegmt=True).encode('ASCII') + b'\r\n'
+        # Replacing the whole tuple keeps the second and value consistent for other threads
+        _date_value = (now, value)
+    return value
+
+
+def generate_file_headers(file_path, file_size, encoding=None):
+    """
+    Generates the response headers that describe a file and stay the same until it changes:
+    a Content-Type header with the appropriate MIME type, a Content-Length header,
+    and a Content-Encoding header if the body is compressed. Vary is always sent, since
+    any file may be served compressed to clients that accept it.
+
+    :param file_path: the file path
+    :param file_size: the size of the body in bytes, after any compression
+    :param encoding: the content coding of the body, such as 'gzip', or None if it is not encoded
+    :return: the headers in a dictionary, where the key is the header name as a byte object,
+    and the value is the value as a bytes object
+    :rtype: dictionary
+    """
     response_headers = {}
-    timestamp = datetime.datetime.utcnow()
-    timestring = timestamp.strftime('%a, %d %b %Y %H:%M:%S GMT')
-    #                               Sun, 06 Nov 1994 08:49:37 GMT
-    response_headers[b'Date: '] = timestring.encode('ASCII') + b'\r\n'
-    response_headers[b'Connection: '] = b'close\r\n'
-    response_headers[b'Content-Type: '] = str(get_mime_type(file_path)).encode('ASCII') + b'\r\n'
-    response_headers[b'Content-Length: '] = str(get_file_size(file_path)).encode('ASCII') + b'\r\n'
+    response_headers[b'Content-Type: '] = str(lookup_mime_type(file_path)).encode('ASCII') + b'\r\n'
+    response_headers[b'Content-Length: '] = str(file_size).encode('ASCII') + b'\r\n'
+    if encoding is not None:
+        response_headers[b'Content-Encoding: '] = encoding.encode('ASCII') + b'\r\n'
+    response_headers[b'Vary: '] = b'Accept-Encoding\r\n'
+    response_headers[b'Accept-Ranges: '] = b'bytes\r\n'
     return response_headers
 
 
+def generate_validator_headers(etag, mtime):
+    """
+    Generates the headers a client uses to revalidate its copy of a file: an ETag header
+    and a Last-Modified header. These are sent with both 200 and 304 responses.
+
+    :param str etag: the entity tag of the file, including its quotes
+    :param mtime: the modification time of the file in seconds since the epoch
+    :return: the headers in a dictionary, where the key is the header name as a byte object,
+    and the value is the value as a bytes object
+    :rtype: dictionary
+    """
+    response_headers = {}
+    response_headers[b'ETag: '] = etag.encode('ASCII') + b'\r\n'
+    response_headers[b'Last-Modified: '] = email.utils.formatdate(mtime, usegmt=True).encode('ASCII') + b'\r\n'
+    return response_headers
+
+
+def generate_etag(mtime_ns, size, encoding=None):
+    """
+    Makes a strong entity tag from the modification time and size of a file, which change
+    whenever the file is rewritten. A compressed body gets its own tag, since its bytes differ.
+
+    :param int mtime_ns: the modification time in nanoseconds
+    :param int size: the file size in bytes
+    :param encoding: the content coding of the body, or None if it is not encoded
+    :return: the entity tag, including its quotes
+    :rtype: str
+    """
+    if encoding is not None:
+        return '"{0:x}-{1:x}-{2}"'.format(mtime_ns, size, encoding)
+    return '"{0:x}-{1:x}"'.format(mtime_ns, size)
+
+
+def accepts_gzip(request_headers):
+    """
+    Decides from the Accept-Encoding header whether the client accepts a gzip encoded body.
+    A coding with q=0 is refused, and an explicit gzip entry takes precedence over '*'.
+
+    :param request_headers: the request headers as a dictionary of str objects
+    :return: True if the body may be sent gzip encoded
+    :rtype: bool
+    """
+    accept_encoding = get_header(request_headers, 'Accept-Encoding')
+    if accept_encoding is None:
+        return False
+    qualities = {}
+    for coding in accept_encoding.split(','):
+        name, semicolon, parameters = coding.partition(';')
+        quality = 1.0
+        for parameter in parameters.split(';'):
+            key, equals, value = parameter.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip().lower()] = quality
+    quality = qualities.get('gzip', qualities.get('x-gzip', qualities.get('*', 0.0)))
+    return quality > 0
+
+
+def lookup_mime_type(file_path):
+    """
+    Gets the MIME type of a file like get_mime_type, remembering the answer for each extension
+
+    :param file_path: the file path
+    :return: the MIME type as a str, or None if it is not known
+    :rtype: str or None
+    """
+    file_name = os.path.basename(file_path)
+    dot = file_name.find('.')
+    # Everything from the first dot, so 'page.html.gz' keeps both of its extensions
+    return get_extension_mime_type(file_name[dot:] if dot >= 0 else '')
+
+
+@functools.lru_cache(maxsize=MIME_CACHE_SIZE)
+def get_extension_mime_type(extensions):
+    """
+    :param str extensions: the extensions of a file name, such as '.html' or '.tar.gz'
+    :return: the MIME type of files with those extensions, or None if it is not known
+    :rtype: str or None
+    """
+    return get_mime_type('file' + extensions)
+
+
+def is_compressible(file_path):
+    """
+    :param file_path: the file path
+    :return: True if the MIME type of the file is text that gzip shrinks well
+    :rtype: bool
+    """
+    mime_type = lookup_mime_type(file_path) or ''
+    return mime_type.startswith('text/') or mime_type in COMPRESSIBLE_TYPES
+
+
+def get_precompressed_stat(file_path, file_stat):
+    """
+    Looks for a precompressed sibling of a file, file_path + '.gz'. A sibling older than the
+    file is out of date and is ignored.
+
+    :param file_path: the file path
+    :param file_stat: the os.stat result of the file
+    :return: the os.stat result of the sibling, or None if there is no usable sibling
+    """
+    try:
+        gzip_stat = os.stat(file_path + GZIP_SUFFIX)
+    except OSError:
+        return None
+    if stat.S_ISREG(gzip_stat.st_mode) and gzip_stat.st_mtime_ns >= file_stat.st_mtime_ns:
+        return gzip_stat
+    return None
+
+
+def is_not_modified(entry, request_headers):
+    """
+    Decides whether a conditional GET can be answered with 304 Not Modified.
+    If-None-Match is checked first, and If-Modified-Since only when there is no If-None-Match.
+
+    :param entry: the CacheEntry of the requested file
+    :param request_headers: the request headers as a dictionary of str objects
+    :return: True if the client's copy is still current
+    :rtype: bool
+    """
+    if_none_match = get_header(request_headers, 'If-None-Match')
+    if if_none_match is not None:
+        for etag in if_none_match.split(','):
+            etag = etag.strip()
+            # GET uses the weak comparison, so a W/ prefix does not matter
+            if etag == '*' or etag.replace('W/', '', 1) == entry.etag:
+                return True
+        return False
+    if_modified_since = get_header(request_headers, 'If-Modified-Since')
+    if if_modified_since is not None:
+        try:
+            since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError, OverflowError):
+            # A date that cannot be parsed, or is out of range, is ignored
+            return False
+        return entry.mtime_ns // 1000000000 <= since
+    return False
+
+
+def get_requested_range(entry, request_headers):
+    """
+    Finds the byte range a request asks for with its Range header. The range is ignored
+    if an If-Range header names a different version of the file.
+
+    :param entry: the CacheEntry of the requested file
+    :param request_headers: the request headers as a dictionary of str objects
+    :return: the first and last byte positions (inclusive), or None to send the whole file
+    :rtype: tuple or None
+    :raises ValueError: if the range starts beyond the end of the file
+    """
+    range_header = get_header(request_headers, 'Range')
+    if range_header is None:
+        return None
+    if_range = get_header(request_headers, 'If-Range')
+    last_modified = entry.validators[b'Last-Modified: '].decode('ASCII').strip()
+    if if_range is not None and if_range not in (entry.etag, last_modified):
+        return None
+    return parse_byte_range(range_header, entry.size)
+
+
+def parse_byte_range(range_header, file_size):
+    """
+    Parses a Range header holding one byte range: 'bytes=first-last', 'bytes=first-',
+    or 'bytes=-suffix_length'. Anything else, such as several ranges, is ignored and the
+    whole file is sent, as HTTP allows.
+
+    :param str range_header: the value of the Range header
+    :param int file_size: the size of the file in bytes
+    :return: the first and last byte positions (inclusive), or None to send the whole file
+    :rtype: tuple or None
+    :raises ValueError: if the range starts beyond the end of the file
+    """
+    unit, equals, byte_range = range_header.partition('=')
+    first, dash, last = byte_range.strip().partition('-')
+    if unit.strip().lower() != 'bytes' or not dash or not (first or last):
+        return None
+    if (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None
+    if not first:
+        # A suffix range: the last suffix_length bytes of the file
+        suffix_length = int(last)
+        if suffix_length == 0:
+            raise ValueError('empty suffix range')
+        first = max(0, file_size - suffix_length)
+        last = file_size - 1
+    else:
+        first = int(first)
+        last = min(int(last), file_size - 1) if last else file_size - 1
+        if last < first and first < file_size:
+            return None
+    if first >= file_size:
+        raise ValueError('range starts beyond the end of the file')
+    return first, last
+
+
+# A cached file: the path its body is read from (a precompressed sibling for a gzip entry that has one),
+# that file's modification time and size when it was read, the size of the body after any compression,
+# its entity tag, its prebuilt headers for 200 responses, its prebuilt validator headers for 304 responses,
+# and its body, or None if the file is too big to keep in memory
+CacheEntry = collections.namedtuple('CacheEntry', ['path', 'mtime_ns', 'file_size', 'size', 'etag', 'headers',
+                                                   'validators', 'body'])
+
+
+class FileCache:
+    """
+    A least-recently-used cache of file bodies and their prebuilt headers, bounded by bytes.
+    Every lookup checks the file's modification time and size with one os.stat call,
+    so an entry is replaced as soon as its file changes on disk.
+    A file can have two entries, keyed by (file_path, encoding): the file as it is, and its
+    gzip encoded form, so each file is compressed once rather than on every request.
+    """
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES, max_file_size=CACHE_MAX_FILE_SIZE):
+        """
+        :param int max_bytes: most bytes of bodies and headers to hold
+        :param int max_file_size: largest file whose body is held; bigger files only get their headers cached
+        """
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, file_path, encoding=None):
+        """
+        Get the cache entry for a file, reading the file on a miss or when it has changed.
+        With encoding 'gzip', the entry holds the gzip encoded file: the precompressed sibling
+        file_path + '.gz' if there is an up to date one, or else the file compressed here if it is
+        a compressible type small enough to cache. Any other file gets its unencoded entry.
+
+        :param str file_path: the file path
+        :param encoding: 'gzip' if the client accepts a gzip encoded body, otherwise None
+        :return: the entry for the file
+        :rtype: CacheEntry
+        :raises OSError: if file_path does not name a readable regular file
+        """
+        file_stat = os.stat(file_path)
+        if not stat.S_ISREG(file_stat.st_mode):
+            raise FileNotFoundError(file_path)
+        source_path, source_stat = file_path, file_stat
+        if encoding == GZIP:
+            gzip_stat = get_precompressed_stat(file_path, file_stat)
+            if gzip_stat is not None:
+                source_path, source_stat = file_path + GZIP_SUFFIX, gzip_stat
+            elif not (is_compressible(file_path) and GZIP_MIN_SIZE <= file_stat.st_size <= self.max_file_size):
+                encoding = None
+        key = (file_path, encoding)
+        with self._lock:
+            entry = self._entries.get(key)
+            if (entry is not None and entry.path == source_path and entry.mtime_ns == source_stat.st_mtime_ns
+                    and entry.file_size == source_stat.st_size):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        entry = self._load(file_path, source_path, source_stat, encoding)
+        self._store(key, entry)
+        return entry
+
+    def stats(self):
+        """
+        :return: the hit, miss, and eviction counters, the number of entries, and the bytes held
+        :rtype: dictionary
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'entries': len(self._entries), 'bytes': self.size}
+
+    def _load(self, file_path, source_path, source_stat, encoding):
+        """
+        Build a new entry for a file, reading its body from source_path if it is small enough,
+        and compressing it if a gzip entry has no precompressed sibling
+        """
+        body = None
+        file_size = size = source_stat.st_size
+        if size <= self.max_file_size:
+            body = parse_file(source_path)
+            # The file may have changed since it was stat'ed, so describe what was actually read
+            file_size = size = len(body)
+        if encoding == GZIP and source_path == file_path:
+            # mtime=0 keeps the output the same for the same input
+            body = gzip.compress(body, GZIP_LEVEL, mtime=0)
+            size = len(body)
+        etag = generate_etag(source_stat.st_mtime_ns, size, encoding)
+        validators = generate_validator_headers(etag, source_stat.st_mtime)
+        headers = generate_file_headers(file_path, size, encoding)
+        headers.update(validators)
+        return CacheEntry(source_path, source_stat.st_mtime_ns, file_size, size, etag, headers, validators, body)
+
+    def _store(self, key, entry):
+        """
+        Add an entry, evicting the least recently used entries until the cache fits in max_bytes
+        """
+        entry_size = get_entry_size(entry)
+        if entry_size > self.max_bytes:
+            return
+        with self._lock:
+            old_entry = self._entries.pop(key, None)
+            if old_entry is not None:
+                self.size -= get_entry_size(old_entry)
+            self._entries[key] = entry
+            self.size += entry_size
+            while self.size > self.max_bytes:
+                evicted_path, evicted_entry = self._entries.popitem(last=False)
+                self.size -= get_entry_size(evicted_entry)
+                self.evictions += 1
+
+
+def get_entry_size(entry):
+    """
+    :param entry: a CacheEntry
+    :return: the bytes the entry counts against the cache size
+    :rtype: int
+    """
+    size = sum(len(k) + len(v) for k, v in entry.headers.items())
+    size += sum(len(k) + len(v) for k, v in entry.validators.items())
+    if entry.body is not None:
+        size += len(entry.body)
+    return size
+
+
+# The file cache shared by every connection
+FILE_CACHE = FileCache()
+
+# A response body sent from an open file: count bytes starting at offset
+FileBody = collections.namedtuple('FileBody', ['file', 'offset', 'count'])
+
+
+def close_response_body(response_body):
+    """
+    Closes the file or generator behind a response body, whether or not it was sent
+
+    :param response_body: the body, either as a bytes-like object, a FileBody, or an iterator of bytes objects
+    :return: None
+    """
+    if isinstance(response_body, FileBody):
+        response_body.file.close()
+    elif not isinstance(response_body, (bytes, memoryview)):
+        response_body.close()
+
+
 def send_response(status_line, response_headers, response_body, data_socket):
     """
     Sends the entire HTTP response consisting of the status_line, headers, and body
 
+    A body held in memory goes out together with the headers in one gathering send, and a
+    body in an open file is sent with socket.sendfile, so its bytes are copied from the file
+    to the socket by the kernel (os.sendfile) rather than read into Python first.
+    Only the slice of the file given by the FileBody offset and count is sent.
+    Any other body is an iterator of blocks whose total length is not known up front, and is
+    sent with chunked transfer coding as the blocks are produced; the headers must then say
+    'Transfer-Encoding: chunked' instead of giving a Content-Length.
+
     :param status_line: the status line as a bytes object
     :param response_headers: the response headers as a dictionary containing bytes objects
-    :param response_body: the body as a bytes object
+    :param response_body: the body, either as a bytes-like object, a FileBody, or an iterator of bytes objects
     :param data_socket: the socket
     :return: None
     :author: Stuart Harley
     """
-    response = status_line
+    head = assemble_response(status_line, response_headers, b'')
+    if isinstance(response_body, FileBody):
+        data_socket.sendall(head)
+        data_socket.sendfile(response_body.file, response_body.offset, response_body.count)
+    elif isinstance(response_body, (bytes, memoryview)):
+        send_buffers(data_socket, [head, response_body])
+    else:
+        data_socket.sendall(head)
+        send_chunked(data_socket, response_body)
+
+
+def send_chunked(data_socket, blocks):
+    """
+    Sends a body with chunked transfer coding, one chunk per block as each block is produced,
+    so the client starts receiving the body before all of it exists. This is the encoder for
+    the chunked bodies lab5's interpret_chunked decodes.
+
+    :param data_socket: the socket
+    :param blocks: an iterable of the bytes objects of the body, in order
+    :return: None
+    """
+    for block in blocks:
+        # A zero-length chunk would end the body early
+        if block:
+            send_buffers(data_socket, frame_chunk(block))
+    data_socket.sendall(LAST_CHUNK)
+
+
+def frame_chunk(block):
+    """
+    Frames one block of a body as a chunk: its length in hex, CRLF, the block, CRLF
+
+    :param block: a non-empty bytes-like object
+    :return: the buffers of the chunk, to be sent in order
+    :rtype: list
+    """
+    return ['{0:x}\r\n'.format(len(block)).encode('ASCII'), block, b'\r\n']
+
+
+def compress_blocks(file_path):
+    """
+    Gzip encodes a file a block at a time, for a file too big to compress into the file cache
+
+    :param file_path: the file path
+    :return: an iterator over the blocks of the gzip encoded file as bytes objects.
+             Closing the iterator closes the file.
+    """
+    # wbits 31 writes the gzip header and trailer around the deflate stream
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    with open(file_path, 'rb') as file:
+        block = file.read(STREAM_BLOCK_SIZE)
+        while block:
+            yield compressor.compress(block)
+            block = file.read(STREAM_BLOCK_SIZE)
+    yield compressor.flush()
+
+
+def send_buffers(data_socket, buffers):
+    """
+    Sends several buffers in order without first joining them into one, using a writev-style
+    sendmsg call where the platform has one
+
+    :param data_socket: the socket
+    :param buffers: a list of bytes-like objects
+    :return: None
+    """
+    if not hasattr(data_socket, 'sendmsg'):
+        for buffer in buffers:
+            data_socket.sendall(buffer)
+        return
+    buffers = [memoryview(buffer) for buffer in buffers if len(buffer)]
+    while buffers:
+        sent = data_socket.sendmsg(buffers)
+        # Drop what was sent, which may end part way through a buffer
+        while buffers and sent >= len(buffers[0]):
+            sent -= len(buffers.pop(0))
+        if sent:
+            buffers[0] = buffers[0][sent:]
+
+
+def assemble_response(status_line, response_headers, response_body):
+    """
+    Puts the status_line, headers, and body together into one HTTP response
+
+    :param status_line: the status line as a bytes object
+    :param response_headers: the response headers as a dictionary containing bytes objects
+    :param response_body: the body as a bytes object
+    :return: the response as a bytes object
+    :rtype: bytes object
+    """
+    response = [status_line]
     for k, v in response_headers.items():
-        response += k + v
-    response += b'\r\n'
-    response += response_body
-    data_socket.sendall(response)
+        response.append(k)
+        response.append(v)
+    response.append(b'\r\n')
+    response.append(response_body)
+    return b''.join(response)
 
 
 def parse_file(file_path):
@@ -214,30 +1210,152 @@ def parse_file(file_path):
     return msg
 
 
-def handle_request(request_socket):
+def handle_request(request_socket, keep_alive_timeout=KEEP_ALIVE_TIMEOUT, max_requests=MAX_KEEP_ALIVE_REQUESTS,
+                   others_waiting=None):
     """
-    Handle a single HTTP request, running on a newly started thread.
-
-    Closes request socket after sending response.
+    Handle the HTTP requests on one connection, running on one of the worker threads.
 
-    Should include a response header indicating NO persistent connection
+    Keeps the connection open for further requests while the client asks for a persistent
+    connection, until it has been idle for keep_alive_timeout seconds or max_requests
+    requests have been served, or until others_waiting says another connection needs this
+    worker while this one is idle. Then closes the request socket.
 
     :param request_socket: socket representing TCP connection from the HTTP client_socket
+    :param keep_alive_timeout: seconds to wait for the next request
+    :param max_requests: most requests to serve on this connection
+    :param others_waiting: a function returning True when other connections are waiting for a
+           worker, or None to keep an idle connection for the whole keep_alive_timeout
     :return: None
     :authors: Stuart Harley, Shanthosh Reddy
     """
-    url = (parse_request(request_socket).decode('ASCII'))[1:]
-    response_headers = {}
+    request_socket.settimeout(keep_alive_timeout)
+    reader = BufferedReader(request_socket)
+    parser = RequestParser()
+    served = 0
+    keep_alive = True
+    try:
+        while keep_alive:
+            if others_waiting is not None and not parser.buffered() and not reader.buffered():
+                if not wait_for_next_request(request_socket, keep_alive_timeout, others_waiting):
+                    break
+            try:
+                method, url, version, headers = parse_request(reader, parser, keep_alive_timeout)
+            except (EOFError, socket.timeout):
+                # The client closed the connection or left it idle
+                break
+            except RequestParseError as error:
+                request_socket.sendall(generate_error_response(error.status_code))
+                break
+            served += 1
+            keep_alive = wants_keep_alive(version, headers) and served < max_requests
+            status_line, response_headers, response_body = build_response(url, keep_alive, headers, version)
+            try:
+                # The headers describe the body a GET would get, but none is sent for HEAD
+                send_response(status_line, response_headers, b'' if method == b'HEAD' else response_body,
+                              request_socket)
+            finally:
+                close_response_body(response_body)
+    finally:
+        request_socket.close()
+
+
+def wait_for_next_request(request_socket, timeout, others_waiting):
+    """
+    Waits for the next request to start arriving on an idle connection, checking every
+    IDLE_CHECK_INTERVAL seconds whether another connection is waiting for this worker.
+    The bytes that arrive are left on the socket for parse_request.
+
+    :param request_socket: socket representing TCP connection from the HTTP client_socket
+    :param timeout: seconds to wait for the next request
+    :param others_waiting: a function returning True when other connections are waiting for a worker
+    :return: True if a request has started arriving, False if the connection should be closed
+    :rtype: bool
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        request_socket.settimeout(min(remaining, IDLE_CHECK_INTERVAL))
+        try:
+            # An empty result means the client closed the connection
+            return request_socket.recv(1, socket.MSG_PEEK) != b''
+        except socket.timeout:
+            if others_waiting():
+                return False
+
+
+def build_response(url, keep_alive=False, request_headers=None, version=b'HTTP/1.1'):
+    """
+    Builds the response for a request, shared by the thread and event loop engines.
+    Small files are served from the file cache. For a file too big to cache, the body is
+    a FileBody holding the open file, so it can be sent without reading it into memory;
+    the caller must close it.
+    A conditional request for a file the client already has gets 304 Not Modified and no body,
+    and a request with a Range header gets 206 Partial Content and only that part of the file.
+    A client that accepts gzip gets the gzip encoded file when there is one. A compressible file
+    too big to compress into the cache is instead compressed as it is sent, with chunked transfer
+    coding, if the client speaks HTTP/1.1 and did not ask for a range.
+    Any unexpected error is answered with 500 Internal Server Error rather than passed on.
+
+    :param url: the requested file path, relative to the directory the server runs in
+    :param keep_alive: True if the connection persists after this response
+    :param request_headers: the request headers as a dictionary of str objects
+    :param version: the HTTP version of the request as a bytes object
+    :return: the status line, the response headers dictionary, and the body as either
+             a bytes-like object, a FileBody, or an iterator of blocks to send chunked
+    :rtype: tuple
+    """
+    response_headers = generate_connection_headers(keep_alive)
     response_body = b''
     status_code = b'200'
     try:
-        response_headers = generate_response_headers(url)
-        response_body = parse_file(url)
-    except:
+        encoding = GZIP if request_headers and accepts_gzip(request_headers) else None
+        entry = FILE_CACHE.lookup(url, encoding)
+        if request_headers and is_not_modified(entry, request_headers):
+            status_code = b'304'
+            response_headers.update(entry.validators)
+        else:
+            try:
+                byte_range = get_requested_range(entry, request_headers) if request_headers else None
+            except ValueError:
+                # The range is unsatisfiable
+                status_code = b'416'
+                response_headers[b'Content-Range: '] = 'bytes */{0}\r\n'.format(entry.size).encode('ASCII')
+                response_headers[b'Content-Length: '] = b'0\r\n'
+                return generate_status_line(status_code), response_headers, response_body
+            first, last = byte_range if byte_range else (0, entry.size - 1)
+            response_headers.update(entry.headers)
+            if (encoding == GZIP and entry.body is None and byte_range is None and version == b'HTTP/1.1'
+                    and b'Content-Encoding: ' not in entry.headers and is_compressible(url)):
+                # The ETag describes the unencoded file, so it is left out of the compressed response
+                for name in (b'Content-Length: ', b'Accept-Ranges: ', b'ETag: '):
+                    del response_headers[name]
+                response_headers[b'Content-Encoding: '] = b'gzip\r\n'
+                response_headers[b'Transfer-Encoding: '] = b'chunked\r\n'
+                response_body = compress_blocks(entry.path)
+            else:
+                if byte_range:
+                    status_code = b'206'
+                    response_headers[b'Content-Length: '] = str(last - first + 1).encode('ASCII') + b'\r\n'
+                    response_headers[b'Content-Range: '] = 'bytes {0}-{1}/{2}\r\n'.format(
+                        first, last, entry.size).encode('ASCII')
+                if entry.body is not None:
+                    response_body = memoryview(entry.body)[first:last + 1] if byte_range else entry.body
+                else:
+                    response_body = FileBody(open(entry.path, 'rb'), first, last - first + 1)
+    except OSError:
         status_code = b'404'
+        response_headers = generate_connection_headers(keep_alive)
+        response_headers[b'Content-Length: '] = b'0\r\n'
+    except Exception as error:
+        print('build_response: "{0}" failed: {1!r}'.format(url, error))
+        status_code = b'500'
+        response_headers = generate_connection_headers(keep_alive)
+        response_headers[b'Content-Length: '] = b'0\r\n'
+        response_body = b''
     status_line = generate_status_line(status_code)
-    send_response(status_line, response_headers, response_body, request_socket)
-    request_socket.close()
+    return status_line, response_headers, response_body
 
 
 # ** Do not modify code below this line.  You should add additional helper methods above this line.
@@ -278,6 +1396,7 @@ def get_file_size(file_path):
     return file_size
 
 
-main()
+if __name__ == '__main__':
+    main()
 
 # acmesystems.it/python_http
@@ -7,108 +7,893 @@
   - Shanthosh Reddy
 
 A Trivial File Transfer Protocol Server
+
+Read requests download files and write requests upload them. Requests arrive on the TFTP
+port, and each transfer is then carried out on its own socket bound to an ephemeral port,
+as RFC 1350 intends. All the sockets are multiplexed on one selectors event loop, so many
+clients (such as machines booting over PXE together) are served at the same time instead
+of one after another.
+
+A client may negotiate a bigger block size, a window of several blocks sent per
+acknowledgement, and the transfer size with the blksize, windowsize and tsize options
+(RFC 2347, 2348, 7440 and 2349), which the server accepts with an OACK packet.
+
+Lost packets are sent again when no acknowledgement arrives within a timeout that adapts
+to the round trip times measured on each transfer, and a transfer is abandoned after a few
+tries. A duplicate acknowledgement never causes a retransmission, which avoids the
+Sorcerer's Apprentice problem of every later block being sent twice.
+
+Files are sent from read-only memory maps shared by every transfer of the same file, so
+each block is a slice of the map rather than an open, seek, read and close of the file.
+An uploaded file is written through one buffered file handle to a temporary file, synced
+to disk once, and renamed over the file name when its last block arrives, so a file being
+downloaded is never changed under its memory map.
 """
 
 # import modules -- not using "from socket import *" in order to selectively use items with "socket." prefix
 import socket
 import os
-import math
+import argparse
+import selectors
+import collections
+import mmap
+import stat
+import heapq
+import itertools
+import time
+import errno
+import tempfile
+import shutil
 
 # Helpful constants used by TFTP
 TFTP_PORT = 69
 TFTP_BLOCK_SIZE = 512
 MAX_UDP_PACKET_SIZE = 65536
 
+# TFTP op codes
+OP_RRQ = b'\x00\x01'
+OP_WRQ = b'\x00\x02'
+OP_DATA = b'\x00\x03'
+OP_ACK = b'\x00\x04'
+OP_ERROR = b'\x00\x05'
+OP_OACK = b'\x00\x06'
+
+# TFTP error codes
+ERROR_NOT_DEFINED = 0
+ERROR_FILE_NOT_FOUND = 1
+ERROR_ACCESS_VIOLATION = 2
+ERROR_DISK_FULL = 3
+ERROR_ILLEGAL_OPERATION = 4
+ERROR_UNKNOWN_TRANSFER_ID = 5
+
+# Block numbers are 16 bits, so they wrap around to 0 in files of more than 65535 blocks
+BLOCK_NUMBER_MODULUS = 65536
+
+# Smallest and largest block sizes a client may negotiate with the blksize option
+MIN_BLOCK_SIZE = 8
+MAX_BLOCK_SIZE = 65464
+
+# Most blocks sent before waiting for an acknowledgement, whatever windowsize a client asks for
+MAX_WINDOW_SIZE = 64
+
+# Seconds to wait for the first acknowledgement of a transfer, before any round trip has been measured
+INITIAL_TIMEOUT = 1.0
+
+# Bounds on the retransmission timeout worked out from the measured round trip times
+MIN_TIMEOUT = 0.01
+MAX_TIMEOUT = 10.0
+
+# Times a packet is sent again without being acknowledged before the transfer is abandoned
+MAX_RETRIES = 8
+
+# Seconds an upload waits after acknowledging its last block, in case the acknowledgement
+# is lost and the client sends the block again
+DALLY_TIME = 3.0
+
+# Bytes of uploaded data buffered before they are written to the file
+WRITE_BUFFER_SIZE = 256 * 1024
+
+# Mode of an uploaded file before the umask is applied, the same as for a file made with open()
+UPLOAD_FILE_MODE = 0o666
+
+# Most files the file map cache keeps mapped before dropping the least recently used
+MAP_CACHE_SIZE = 64
+
 
 def main():
+    """ Start the server """
+    parser = argparse.ArgumentParser(description='A Trivial File Transfer Protocol server')
+    parser.add_argument('--port', type=int, default=TFTP_PORT)
+    args = parser.parse_args()
+    tftp_server_setup(args.port)
+
+
+def tftp_server_setup(port=TFTP_PORT):
     """
-    Processes a single TFTP request
+    Start the TFTP server
+    - Open the socket requests arrive on
+    - Serve transfers until Ctrl-C
 
-    :author: Stuart Harley, Shanthosh Reddy
+    :param port: the port requests arrive on
+    """
+    server_socket = socket_setup(port)
+    print("Server is ready to receive requests")
+    try:
+        serve(server_socket)
+    except KeyboardInterrupt:
+        print('Server stopped')
+    finally:
+        server_socket.close()
+
+
+def serve(server_socket):
+    """
+    Start a transfer for each request arriving on the server socket, and carry all the
+    transfers forward on one selectors event loop as packets arrive on their sockets
+    and as their retransmission timers expire. An error in one transfer ends only that transfer.
+
+    :param server_socket: the socket requests arrive on
+    """
+    selector = selectors.DefaultSelector()
+    # The server socket is registered with no data, and each transfer socket with its transfer
+    selector.register(server_socket, selectors.EVENT_READ)
+    # A heap of (deadline, sequence number, transfer). An entry whose deadline is no longer the
+    # transfer's deadline is out of date and is skipped when it comes to the top.
+    timers = []
+    sequence = itertools.count()
+    try:
+        while True:
+            timeout = max(0.0, timers[0][0] - time.monotonic()) if timers else None
+            for key, events in selector.select(timeout):
+                if key.data is None:
+                    message, address = server_socket.recvfrom(MAX_UDP_PACKET_SIZE)
+                    try:
+                        transfer = start_transfer(message, address)
+                    except Exception as error:
+                        print('serve: request from {0} failed: {1!r}'.format(address, error))
+                        continue
+                    if transfer is not None:
+                        selector.register(transfer.data_socket, selectors.EVENT_READ, transfer)
+                        heapq.heappush(timers, (transfer.timer.deadline, next(sequence), transfer))
+                    continue
+                transfer = key.data
+                deadline = transfer.timer.deadline
+                try:
+                    message, address = transfer.data_socket.recvfrom(MAX_UDP_PACKET_SIZE)
+                    finished = not transfer.handle_packet(message, address)
+                except OSError:
+                    finished = True
+                except Exception as error:
+                    print('serve: transfer with {0} failed: {1!r}'.format(transfer.address, error))
+                    finished = True
+                if finished:
+                    finish_transfer(selector, transfer)
+                elif transfer.timer.deadline is not None and transfer.timer.deadline != deadline:
+                    heapq.heappush(timers, (transfer.timer.deadline, next(sequence), transfer))
+            now = time.monotonic()
+            while timers and timers[0][0] <= now:
+                deadline, number, transfer = heapq.heappop(timers)
+                if deadline != transfer.timer.deadline:
+                    continue
+                try:
+                    continuing = transfer.handle_timeout()
+                except Exception as error:
+                    print('serve: transfer with {0} failed: {1!r}'.format(transfer.address, error))
+                    continuing = False
+                if continuing:
+                    heapq.heappush(timers, (transfer.timer.deadline, next(sequence), transfer))
+                else:
+                    finish_transfer(selector, transfer)
+    finally:
+        for key in list(selector.get_map().values()):
+            if key.data is not None:
+                key.data.close()
+        selector.close()
+
+
+def finish_transfer(selector, transfer):
+    """
+    Stop watching the socket of a transfer that is over, and close it
+
+    :param selector: the selector of the event loop
+    :param transfer: the transfer
+    """
+    selector.unregister(transfer.data_socket)
+    transfer.close()
+
+
+def start_transfer(message, address):
+    """
+    Answer a request from a new socket bound to an ephemeral port, the transfer ID of the
+    server for this transfer
+
+    :param message: the request message
+    :param address: the address of the client
+    :return: the transfer, or None if the request was refused with an error packet
+    :rtype: ReadTransfer, WriteTransfer or None
+    """
+    data_socket = open_transfer_socket()
+    try:
+        op_code = get_op_code(message)
+        filename = get_filename(message).decode('ASCII')
+        get_mode(message)
+        options = get_options(message)
+    except (ValueError, UnicodeDecodeError):
+        send_error(data_socket, address, ERROR_ILLEGAL_OPERATION, 'Malformed request')
+        data_socket.close()
+        return None
+    if op_code == OP_RRQ:
+        return start_read_transfer(data_socket, address, filename, options)
+    if op_code == OP_WRQ:
+        return start_write_transfer(data_socket, address, filename, options)
+    send_error(data_socket, address, ERROR_ILLEGAL_OPERATION, 'Expected a read or write request')
+    data_socket.close()
+    return None
+
+
+def start_read_transfer(data_socket, address, filename, options):
+    """
+    Start sending a file in reply to a read request. As for a write request, a file outside
+    the current directory is refused.
+
+    :param data_socket: the socket of the transfer
+    :param address: the address of the client
+    :param str filename: the file requested
+    :param options: the options of the request, from get_options
+    :return: the transfer, or None if the request was refused with an error packet
+    :rtype: ReadTransfer or None
+    """
+    if not is_safe_filename(filename):
+        send_error(data_socket, address, ERROR_ACCESS_VIOLATION, 'Access violation')
+        data_socket.close()
+        return None
+    try:
+        file_data = FILE_MAPS.lookup(filename)
+    except OSError:
+        send_error(data_socket, address, ERROR_FILE_NOT_FOUND, 'File not found')
+        data_socket.close()
+        return None
+    accepted_options = negotiate_options(options, len(file_data))
+    transfer = ReadTransfer(data_socket, address, file_data, int(accepted_options.get('blksize', TFTP_BLOCK_SIZE)),
+                            int(accepted_options.get('windowsize', 1)))
+    transfer.start(accepted_options)
+    return transfer
+
+
+def start_write_transfer(data_socket, address, filename, options):
     """
+    Start receiving a file in reply to a write request. Only files below the directory the
+    server runs in may be written, and the directory the file goes in must already exist.
 
-    client_socket = socket_setup()
-    print("Server is ready to receive a request")
-
-    message = client_socket.recvfrom(MAX_UDP_PACKET_SIZE)
-    address = message[1]
-    message = message[0]
-    op_code = get_op_code(message)
-    filename = get_filename(message).decode('ASCII')
-    mode = get_mode(message)
-    if op_code != b'\x00\x01':
-        return
-    file_block_count = get_file_block_count(filename)
-    block_count = 1
-    while block_count <= file_block_count:
-        send_data_block(client_socket, filename, address, block_count)
-        new_message = client_socket.recvfrom(MAX_UDP_PACKET_SIZE)
-        new_message = new_message[0]
-        new_op_code = get_op_code(new_message)
-        if new_op_code == b'\x00\x04':
-            block_num = get_block_num(new_message)
-            if block_num != block_count.to_bytes(2, 'big'):
-                block_count -= 1
-            block_count += 1
-        elif new_op_code == b'\x00\x05':
-            print(get_error_message(new_message))
-            break
-
-    client_socket.close()
-
-
-def get_file_block_count(filename):
-    """
-    Determines the number of TFTP blocks for the given file
-    :param filename: THe name of the file
-    :return: The number of TFTP blocks for the file or -1 if the file does not exist
+    :param data_socket: the socket of the transfer
+    :param address: the address of the client
+    :param str filename: the file to write
+    :param options: the options of the request, from get_options
+    :return: the transfer, or None if the request was refused with an error packet
+    :rtype: WriteTransfer or None
     """
+    if not is_safe_filename(filename):
+        send_error(data_socket, address, ERROR_ACCESS_VIOLATION, 'Access violation')
+        data_socket.close()
+        return None
+    # The client of a write request sends the size of the file it is about to send
+    file_size = get_option_int(options, 'tsize')
+    accepted_options = negotiate_options(options, file_size)
     try:
-        # Use the OS call to get the file size
-        #   This function throws an exception if the file doesn't exist
-        file_size = os.stat(filename).st_size
-        return math.ceil(file_size / TFTP_BLOCK_SIZE)
-    except:
-        return -1
+        output_file, temporary_filename = open_upload_file(filename, file_size)
+    except OSError as error:
+        if error.errno in (errno.ENOSPC, errno.EFBIG):
+            send_error(data_socket, address, ERROR_DISK_FULL, 'Disk full or allocation exceeded')
+        else:
+            send_error(data_socket, address, ERROR_ACCESS_VIOLATION, 'Access violation')
+        data_socket.close()
+        return None
+    transfer = WriteTransfer(data_socket, address, filename, output_file, temporary_filename,
+                             int(accepted_options.get('blksize', TFTP_BLOCK_SIZE)),
+                             int(accepted_options.get('windowsize', 1)))
+    transfer.start(accepted_options)
+    return transfer
+
+
+def is_safe_filename(filename):
+    """
+    :param str filename: a file name from a request
+    :return: True if the name is a relative path that stays below the current directory
+    :rtype: bool
+    """
+    parts = filename.replace('\\', '/').split('/')
+    return filename != '' and not os.path.isabs(filename) and '..' not in parts and parts[-1] not in ('', '.')
+
+
+def open_upload_file(filename, file_size=None):
+    """
+    Create a temporary file to upload a file into, next to where the file goes so that it can
+    be renamed into place. Space for the file is reserved up front when its size is known,
+    so a disk that is too full is found before any data is sent.
+
+    :param str filename: the file being uploaded
+    :param file_size: the size the client says the file has, or None if it did not say
+    :return: the temporary file opened for buffered writing, and its name
+    :rtype: tuple
+    :raises OSError: if the temporary file cannot be created, or the disk is too full
+    """
+    directory, name = os.path.split(filename)
+    if file_size and file_size > shutil.disk_usage(directory or '.').free:
+        raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC), filename)
+    file_descriptor, temporary_filename = tempfile.mkstemp(prefix='.' + name + '.', suffix='.part',
+                                                           dir=directory or '.')
+    try:
+        if file_size and hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(file_descriptor, 0, file_size)
+            except OSError as error:
+                # Some file systems cannot reserve space; only a file too big for the disk stops the upload
+                if error.errno in (errno.ENOSPC, errno.EFBIG):
+                    raise
+        return os.fdopen(file_descriptor, 'wb', buffering=WRITE_BUFFER_SIZE), temporary_filename
+    except OSError:
+        os.close(file_descriptor)
+        os.remove(temporary_filename)
+        raise
+
+
+def get_umask():
+    """
+    :return: the file mode creation mask of the process
+    :rtype: int
+    """
+    # The mask can only be read by setting it, so it is put straight back
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+def negotiate_options(options, file_size):
+    """
+    Choose the values of the options the server accepts. A block size or window size bigger
+    than the server allows is lowered to its largest, and any other option, or an option with
+    a value the server cannot use, is left out of the reply so the client uses the default.
+
+    :param options: the options of a request, from get_options
+    :param file_size: the size of the file requested, or of the file being uploaded, or None if
+                      it is not known, which leaves the tsize option out
+    :return: the accepted options and their values as str objects, to send in an OACK
+    :rtype: dictionary
+    """
+    accepted = {}
+    block_size = get_option_int(options, 'blksize')
+    if block_size is not None and block_size >= MIN_BLOCK_SIZE:
+        accepted['blksize'] = str(min(block_size, MAX_BLOCK_SIZE))
+    window_size = get_option_int(options, 'windowsize')
+    if window_size is not None and window_size >= 1:
+        accepted['windowsize'] = str(min(window_size, MAX_WINDOW_SIZE))
+    if 'tsize' in options and file_size is not None:
+        # The client of a read request sends 0, and the server replies with the size.
+        # The client of a write request sends the size, which the server replies with.
+        accepted['tsize'] = str(file_size)
+    return accepted
 
 
-def get_file_block(filename, block_number):
+def get_option_int(options, name):
     """
-    Get the file block data for the given file and block number
-    :param filename: The name of the file to read
+    :param options: the options of a request, from get_options
+    :param str name: the option name, in lower case
+    :return: the value of the option, or None if it was not given or is not a number
+    :rtype: int or None
+    """
+    value = options.get(name)
+    if value is None or not value.isdigit():
+        return None
+    return int(value)
+
+
+class ReadTransfer:
+    """
+    A file being sent to one client in reply to a read request, a window of blocks at a time.
+    Each acknowledgement moves the window to the block after the one acknowledged, and the
+    blocks in the new window are sent. With the default window size of 1, each block is sent
+    once the previous one has been acknowledged.
+
+    Blocks are counted from 1 through the whole file, and only the block numbers in packets
+    wrap around at 65536.
+    """
+
+    def __init__(self, data_socket, address, file_data, block_size=TFTP_BLOCK_SIZE, window_size=1):
+        """
+        :param data_socket: the socket of this transfer
+        :param address: the address of the client
+        :param memoryview file_data: the contents of the file to send
+        :param int block_size: the bytes of data in each full block
+        :param int window_size: the most blocks sent before waiting for an acknowledgement
+        """
+        self.data_socket = data_socket
+        self.address = address
+        self.file_data = file_data
+        self.block_size = block_size
+        self.window_size = window_size
+        self.file_block_count = get_file_block_count(len(file_data), block_size)
+        # The last block acknowledged, and the last block sent
+        self.acked_block_count = 0
+        self.sent_block_count = 0
+        self.accepted_options = {}
+        self.timer = RetransmitTimer()
+
+    def start(self, accepted_options):
+        """
+        Send the OACK if the client asked for options the server accepted, or else the first window
+
+        :param accepted_options: the options from negotiate_options
+        """
+        self.accepted_options = accepted_options
+        self.send_unacknowledged()
+        self.timer.sent()
+
+    def send_unacknowledged(self):
+        """
+        Send the OACK if it has not been acknowledged yet, or else the current window
+        """
+        if self.accepted_options and self.acked_block_count == 0 and self.sent_block_count == 0:
+            # The client acknowledges the OACK as block 0
+            send_options_ack(self.data_socket, self.address, self.accepted_options)
+        else:
+            self.send_window()
+
+    def send_window(self):
+        """
+        Send the blocks after the last one acknowledged, up to the window size
+        """
+        last_block_count = min(self.acked_block_count + self.window_size, self.file_block_count)
+        for block_count in range(self.acked_block_count + 1, last_block_count + 1):
+            send_data_block(self.data_socket, self.file_data, self.address, block_count, self.block_size)
+        self.sent_block_count = last_block_count
+
+    def find_acked_block(self, block_num):
+        """
+        :param block_num: the block number from an ack, as a bytes object
+        :return: the block count of the block acknowledged, or None if it is not one sent
+                 since the last acknowledgement
+        :rtype: int or None
+        """
+        number = int.from_bytes(block_num, 'big')
+        block_count = self.sent_block_count - (self.sent_block_count - number) % BLOCK_NUMBER_MODULUS
+        return block_count if block_count >= self.acked_block_count else None
+
+    def handle_packet(self, message, address):
+        """
+        Send the next window when a block in the current one is acknowledged. Any other
+        acknowledgement is a duplicate, which is ignored rather than answered by sending the
+        window again; lost packets are sent again only when the timer expires.
+
+        :param message: a packet received on the socket of this transfer
+        :param address: the address the packet came from
+        :return: False once the transfer is over, otherwise True
+        :rtype: bool
+        """
+        if address != self.address:
+            # Another client has the wrong transfer ID; this transfer carries on
+            send_error(self.data_socket, address, ERROR_UNKNOWN_TRANSFER_ID, 'Unknown transfer ID')
+            return True
+        op_code = get_op_code(message)
+        if op_code == OP_ACK:
+            block_count = self.find_acked_block(get_block_num(message))
+            # The OACK is acknowledged as block 0, which is the only time an ack of the last block
+            # acknowledged moves the transfer forward
+            if block_count is None or (block_count == self.acked_block_count and self.sent_block_count > 0):
+                return True
+            self.acked_block_count = block_count
+            self.timer.acknowledged()
+            if self.acked_block_count == self.file_block_count:
+                return False
+            self.send_window()
+            self.timer.sent()
+            return True
+        if op_code == OP_ERROR:
+            print('transfer with {0} ended by the client: {1}'.format(address, get_error_message(message)))
+        else:
+            send_error(self.data_socket, address, ERROR_ILLEGAL_OPERATION, 'Expected an acknowledgement')
+        return False
+
+    def handle_timeout(self):
+        """
+        Send the unacknowledged packets again, unless they have been sent too many times already
+
+        :return: False once the transfer is abandoned, otherwise True
+        :rtype: bool
+        """
+        if not self.timer.expired():
+            send_error(self.data_socket, self.address, ERROR_NOT_DEFINED, 'Transfer timed out')
+            return False
+        self.send_unacknowledged()
+        self.timer.sent(retransmission=True)
+        return True
+
+    def close(self):
+        """
+        Close the socket of this transfer
+        """
+        self.data_socket.close()
+        self.file_data = None
+        self.timer.stop()
+
+
+class WriteTransfer:
+    """
+    A file being received from one client in reply to a write request, a window of blocks at a
+    time. Each block that arrives in order is written to the end of the file. The last block of
+    each window, or of the file, is acknowledged, and a block out of order is answered by
+    acknowledging the last block received in order, so the client sends again from there.
+
+    When the last block arrives, the file is flushed, synced to disk and renamed into place
+    before it is acknowledged. The transfer then waits for DALLY_TIME, in case that
+    acknowledgement is lost and the client sends the last block again.
+    """
+
+    def __init__(self, data_socket, address, filename, output_file, temporary_filename,
+                 block_size=TFTP_BLOCK_SIZE, window_size=1):
+        """
+        :param data_socket: the socket of this transfer
+        :param address: the address of the client
+        :param str filename: the file being uploaded
+        :param output_file: the temporary file the upload is written to, opened for writing
+        :param str temporary_filename: the name of the temporary file
+        :param int block_size: the bytes of data in each full block
+        :param int window_size: the most blocks the client sends before waiting for an acknowledgement
+        """
+        self.data_socket = data_socket
+        self.address = address
+        self.filename = filename
+        self.output_file = output_file
+        self.temporary_filename = temporary_filename
+        self.block_size = block_size
+        self.window_size = window_size
+        # The last block received in order, and the blocks received since the last acknowledgement
+        self.received_block_count = 0
+        self.window_block_count = 0
+        # The block number that last set off an acknowledgement out of order, if any since the
+        # last block received in order
+        self.missed_block_num = None
+        self.accepted_options = {}
+        self.complete = False
+        self.timer = RetransmitTimer()
+
+    def start(self, accepted_options):
+        """
+        Send the OACK if the client asked for options the server accepted, or else acknowledge block 0
+
+        :param accepted_options: the options from negotiate_options
+        """
+        self.accepted_options = accepted_options
+        self.send_acknowledgement()
+        self.timer.sent()
+
+    def send_acknowledgement(self):
+        """
+        Acknowledge the last block received in order, or send the OACK again if no block has arrived
+        """
+        if self.accepted_options and self.received_block_count == 0:
+            send_options_ack(self.data_socket, self.address, self.accepted_options)
+        else:
+            send_ack(self.data_socket, self.address, self.received_block_count)
+        self.window_block_count = 0
+
+    def handle_packet(self, message, address):
+        """
+        Write the next block when it arrives, and acknowledge it if it ends a window or the file
+
+        :param message: a packet received on the socket of this transfer
+        :param address: the address the packet came from
+        :return: False once the transfer is over, otherwise True
+        :rtype: bool
+        """
+        if address != self.address:
+            # Another client has the wrong transfer ID; this transfer carries on
+            send_error(self.data_socket, address, ERROR_UNKNOWN_TRANSFER_ID, 'Unknown transfer ID')
+            return True
+        op_code = get_op_code(message)
+        if op_code == OP_ERROR:
+            print('transfer with {0} ended by the client: {1}'.format(address, get_error_message(message)))
+            return False
+        if op_code != OP_DATA:
+            send_error(self.data_socket, address, ERROR_ILLEGAL_OPERATION, 'Expected a data block')
+            return False
+        if len(message) - 4 > self.block_size:
+            send_error(self.data_socket, address, ERROR_ILLEGAL_OPERATION, 'Data block larger than the block size')
+            return False
+        block_num = get_block_num(message)[:2]
+        if self.complete or block_num != ((self.received_block_count + 1) % BLOCK_NUMBER_MODULUS).to_bytes(2, 'big'):
+            # Acknowledge once each time the client starts sending from the same block, so a
+            # window arriving out of order is not answered once for every block in it
+            if self.missed_block_num is None or self.missed_block_num == block_num:
+                self.missed_block_num = block_num
+                self.send_acknowledgement()
+            return True
+        self.missed_block_num = None
+        block_data = message[4:]
+        try:
+            put_file_block(self.output_file, block_data, self.received_block_count + 1, self.block_size)
+            last = len(block_data) < self.block_size
+            if last:
+                self.finish_file()
+        except OSError as error:
+            if error.errno in (errno.ENOSPC, errno.EFBIG):
+                send_error(self.data_socket, address, ERROR_DISK_FULL, 'Disk full or allocation exceeded')
+            else:
+                send_error(self.data_socket, address, ERROR_NOT_DEFINED, 'Cannot write the file')
+            return False
+        self.received_block_count += 1
+        self.window_block_count += 1
+        self.timer.acknowledged()
+        if last:
+            self.send_acknowledgement()
+            self.timer.wait(DALLY_TIME)
+            self.complete = True
+        elif self.window_block_count == self.window_size:
+            self.send_acknowledgement()
+            self.timer.sent()
+        else:
+            # Wait for the rest of the window
+            self.timer.sent(retransmission=True)
+        return True
+
+    def finish_file(self):
+        """
+        Write out what is buffered, sync it to disk, give it the mode of a newly created file
+        (the temporary file is readable only by its owner) and rename it into place
+
+        :raises OSError: if the file cannot be written or renamed
+        """
+        self.output_file.flush()
+        # Space reserved for a bigger file than was sent is given back
+        self.output_file.truncate()
+        os.fsync(self.output_file.fileno())
+        self.output_file.close()
+        os.chmod(self.temporary_filename, UPLOAD_FILE_MODE & ~get_umask())
+        os.replace(self.temporary_filename, self.filename)
+        self.temporary_filename = None
+
+    def handle_timeout(self):
+        """
+        Acknowledge the last block received in order again, unless that has been done too many
+        times already. Once the file is complete, the transfer is over.
+
+        :return: False once the transfer is over, otherwise True
+        :rtype: bool
+        """
+        if self.complete:
+            return False
+        if not self.timer.expired():
+            send_error(self.data_socket, self.address, ERROR_NOT_DEFINED, 'Transfer timed out')
+            return False
+        self.send_acknowledgement()
+        self.timer.sent(retransmission=True)
+        return True
+
+    def close(self):
+        """
+        Close the socket and file of this transfer, removing the file if the upload did not finish
+        """
+        self.data_socket.close()
+        self.timer.stop()
+        if self.temporary_filename is not None:
+            try:
+                self.output_file.close()
+            except OSError:
+                # Data still buffered could not be written; the file is removed anyway
+                pass
+            os.remove(self.temporary_filename)
+            self.temporary_filename = None
+
+
+class RetransmitTimer:
+    """
+    The retransmission timer of one transfer. The timeout adapts to the round trip times
+    measured on the transfer the way TCP's does (RFC 6298): the smoothed round trip time plus
+    four times its variation, doubled after each expiry. No round trip is measured for packets
+    that were sent again, since the acknowledgement could be for either copy (Karn's algorithm).
+    """
+
+    def __init__(self):
+        self.timeout = INITIAL_TIMEOUT
+        self.smoothed_rtt = None
+        self.rtt_variation = None
+        self.retries = 0
+        # When the packets waiting for an acknowledgement were first sent, or None if they
+        # have been sent again since
+        self.sent_at = None
+        # When the timer expires, or None when nothing is waiting for an acknowledgement
+        self.deadline = None
+
+    def sent(self, retransmission=False):
+        """
+        Start the timer for packets just sent
+
+        :param bool retransmission: whether the packets had been sent before
+        """
+        now = time.monotonic()
+        self.sent_at = None if retransmission else now
+        self.deadline = now + self.timeout
+
+    def acknowledged(self):
+        """
+        Stop the timer when the packets are acknowledged, measuring the round trip if it can be
+        """
+        if self.sent_at is not None:
+            rtt = time.monotonic() - self.sent_at
+            if self.smoothed_rtt is None:
+                self.smoothed_rtt = rtt
+                self.rtt_variation = rtt / 2
+            else:
+                self.rtt_variation = 0.75 * self.rtt_variation + 0.25 * abs(self.smoothed_rtt - rtt)
+                self.smoothed_rtt = 0.875 * self.smoothed_rtt + 0.125 * rtt
+            self.timeout = min(max(self.smoothed_rtt + 4 * self.rtt_variation, MIN_TIMEOUT), MAX_TIMEOUT)
+        self.retries = 0
+        self.stop()
+
+    def expired(self):
+        """
+        Back off after the timer expires
+
+        :return: False if the packets have already been sent again MAX_RETRIES times, otherwise True
+        :rtype: bool
+        """
+        self.retries += 1
+        if self.retries > MAX_RETRIES:
+            return False
+        self.timeout = min(self.timeout * 2, MAX_TIMEOUT)
+        return True
+
+    def wait(self, seconds):
+        """
+        Start the timer for a wait that is not for an acknowledgement, so no round trip is measured
+
+        :param float seconds: how long to wait
+        """
+        self.sent_at = None
+        self.deadline = time.monotonic() + seconds
+
+    def stop(self):
+        """
+        Stop the timer
+        """
+        self.sent_at = None
+        self.deadline = None
+
+
+# A mapped file, with the modification time and size it had when it was mapped
+FileMap = collections.namedtuple('FileMap', ['mtime_ns', 'size', 'data'])
+
+
+class FileMapCache:
+    """
+    Read-only memory maps of the files being sent, shared by every transfer of the same file,
+    such as a boot image many clients download at once. Every lookup checks the file's
+    modification time and size with one os.stat call, so a map is replaced as soon as its file
+    changes on disk. A map dropped from the cache stays valid for the transfers still sending
+    it, and is unmapped when the last of them lets go of it.
+
+    A file replaced by renaming a new file over it is safe to serve. A file truncated in place
+    while it is mapped can crash the server with SIGBUS, so served files should be updated by
+    replacing them.
+    """
+
+    def __init__(self, max_entries=MAP_CACHE_SIZE):
+        """
+        :param int max_entries: most files to keep mapped
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+
+    def lookup(self, filename):
+        """
+        Get the contents of a file, mapping it on a miss or when it has changed
+
+        :param str filename: the file name
+        :return: the contents of the file
+        :rtype: memoryview
+        :raises OSError: if filename does not name a readable regular file
+        """
+        file_stat = os.stat(filename)
+        if not stat.S_ISREG(file_stat.st_mode):
+            raise FileNotFoundError(filename)
+        entry = self._entries.get(filename)
+        if entry is not None and entry.mtime_ns == file_stat.st_mtime_ns and entry.size == file_stat.st_size:
+            self._entries.move_to_end(filename)
+            self.hits += 1
+            return entry.data
+        self.misses += 1
+        data = map_file(filename)
+        # The file may have changed since it was stat'ed, so describe what was actually mapped
+        self._entries[filename] = FileMap(file_stat.st_mtime_ns, len(data), data)
+        self._entries.move_to_end(filename)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return data
+
+
+def map_file(filename):
+    """
+    Map a file read-only into memory
+
+    :param str filename: the file name
+    :return: the contents of the file
+    :rtype: memoryview
+    """
+    with open(filename, 'rb') as file:
+        # An empty file cannot be mapped
+        if os.fstat(file.fileno()).st_size == 0:
+            return memoryview(b'')
+        file_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    if hasattr(file_map, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+        # Transfers read the file front to back, so have the kernel read ahead of them
+        file_map.madvise(mmap.MADV_SEQUENTIAL)
+    return memoryview(file_map)
+
+
+# The file map cache shared by every transfer
+FILE_MAPS = FileMapCache()
+
+
+def get_file_block_count(file_size, block_size=TFTP_BLOCK_SIZE):
+    """
+    Determines the number of TFTP blocks for a file of the given size
+    :param file_size: The size of the file in bytes
+    :param block_size: The bytes of data in each full block
+    :return: The number of TFTP blocks for the file
+    """
+    # The last block is always shorter than a full block, so a file whose size is a
+    # multiple of the block size ends with an empty block
+    return file_size // block_size + 1
+
+
+def get_file_block(file_data, block_number, block_size=TFTP_BLOCK_SIZE):
+    """
+    Get the file block data for the given file contents and block number
+    :param file_data: The contents of the file, as a memoryview
     :param block_number: The block number (1 based)
-    :return: The data contents (as a bytes object) of the file block
+    :param block_size: The bytes of data in each full block
+    :return: The data contents of the file block, as a memoryview sharing the file's memory
     """
-    file = open(filename, 'rb')
-    block_byte_offset = (block_number - 1) * TFTP_BLOCK_SIZE
-    file.seek(block_byte_offset)
-    block_data = file.read(TFTP_BLOCK_SIZE)
-    file.close()
-    return block_data
+    block_byte_offset = (block_number - 1) * block_size
+    return file_data[block_byte_offset:block_byte_offset + block_size]
 
 
-def put_file_block(filename, block_data, block_number):
+def put_file_block(file, block_data, block_number, block_size=TFTP_BLOCK_SIZE):
     """
-    Writes a block of data to the given file
-    :param filename: The name of the file to save the block to
+    Writes a block of data to the given file at the block's offset. Blocks written in order
+    are appended to the file's write buffer without seeking, so they reach the disk in a few
+    large writes.
+    :param file: The file to save the block to, opened for writing
     :param block_data: The bytes object containing the block data
     :param block_number: The block number (1 based)
+    :param block_size: The bytes of data in each full block
     :return: Nothing
     """
-    file = open(filename, 'wb')
-    block_byte_offset = (block_number - 1) * TFTP_BLOCK_SIZE
-    file.seek(block_byte_offset)
+    block_byte_offset = (block_number - 1) * block_size
+    if file.tell() != block_byte_offset:
+        file.seek(block_byte_offset)
     file.write(block_data)
-    file.close()
 
 
-def socket_setup():
+def socket_setup(port=TFTP_PORT):
     """
     Sets up a UDP socket to listen on the TFTP port
+    :param port: The port to listen on
     :return: The created socket
     """
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    s.bind(('', TFTP_PORT))
+    s.bind(('', port))
+    return s
+
+
+def open_transfer_socket():
+    """
+    Sets up a UDP socket on an ephemeral port for one transfer
+    :return: The created socket
+    """
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.bind(('', 0))
     return s
 
 
@@ -159,6 +944,23 @@ def get_mode(message):
     return message[:index]
 
 
+def get_options(message):
+    """
+    Gets the options that follow the mode in a request
+
+    :param message: the request message
+    :return: the option values by option name, in lower case, as str objects
+    :rtype: dictionary
+    """
+    # The fields are the filename, the mode, then option names and values, each ending with a
+    # zero byte, so splitting leaves an empty field at the end
+    fields = message[2:].split(b'\x00')[2:-1]
+    options = {}
+    for index in range(0, len(fields) - 1, 2):
+        options[fields[index].decode('ASCII').lower()] = fields[index + 1].decode('ASCII')
+    return options
+
+
 def get_block_num(message):
     """
     Gets the block number from an ack
@@ -170,19 +972,26 @@ def get_block_num(message):
     return message[2:]
 
 
-def send_data_block(data_socket, filename, address, block_count):
+def send_data_block(data_socket, file_data, address, block_count, block_size=TFTP_BLOCK_SIZE):
     """
-    Gets the next block of data and then sends that block of data with op code 3
+    Gets the next block of data and then sends that block of data with op code 3.
+    The header and the block are sent with one sendmsg call where the platform has one,
+    so the block is not copied to put the header in front of it.
 
     :param data_socket: the socket to send to
-    :param filename: the filename
+    :param file_data: the contents of the file
     :param address: the address
     :param block_count: the current block number
+    :param block_size: the bytes of data in each full block
     :return: void
     :author: Stuart Harley
     """
-    block_data = get_file_block(filename, block_count)
-    data_socket.sendto(b'\x00\x03' + block_count.to_bytes(2, "big") + block_data, address)
+    block_data = get_file_block(file_data, block_count, block_size)
+    header = OP_DATA + (block_count % BLOCK_NUMBER_MODULUS).to_bytes(2, "big")
+    if hasattr(data_socket, 'sendmsg'):
+        data_socket.sendmsg([header, block_data], [], 0, address)
+    else:
+        data_socket.sendto(header + block_data, address)
 
 
 def get_error_message(message):
@@ -194,7 +1003,48 @@ def get_error_message(message):
     :rtype: str
     :author: Stuart Harley, Shanthosh Reddy
     """
-    return message[4:-1].decode('ASCII')
+    return message[4:-1].decode('ASCII', errors='replace')
+
+
+def send_ack(data_socket, address, block_count):
+    """
+    Sends an acknowledgement with op code 4
+
+    :param data_socket: the socket to send from
+    :param address: the address to send to
+    :param int block_count: the block count of the block acknowledged
+    :return: void
+    """
+    data_socket.sendto(OP_ACK + (block_count % BLOCK_NUMBER_MODULUS).to_bytes(2, 'big'), address)
+
+
+def send_options_ack(data_socket, address, options):
+    """
+    Sends an option acknowledgement with op code 6, listing the options accepted
+
+    :param data_socket: the socket to send from
+    :param address: the address to send to
+    :param options: the accepted option values by option name, as str objects
+    :return: void
+    """
+    fields = [OP_OACK]
+    for name, value in options.items():
+        fields.append(name.encode('ASCII') + b'\x00' + value.encode('ASCII') + b'\x00')
+    data_socket.sendto(b''.join(fields), address)
+
+
+def send_error(data_socket, address, error_code, error_message):
+    """
+    Sends an error packet with op code 5
+
+    :param data_socket: the socket to send from
+    :param address: the address to send to
+    :param int error_code: the TFTP error code
+    :param str error_message: the error message
+    :return: void
+    """
+    data_socket.sendto(OP_ERROR + error_code.to_bytes(2, 'big') + error_message.encode('ASCII') + b'\x00', address)
 
 
-main()
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+"""
+- CS2911 - 021
+- Fall 2019
+- Names:
+  - Stuart Harley
+  - Shanthosh Reddy
+
+An incremental parser for the request line and headers of HTTP/1.x requests, used by lab6.
+
+Bytes are fed to the parser in chunks of any size as they arrive, and each byte is searched
+only once. Limits on the size and number of lines reject a huge or endless request head as
+soon as it goes over them, and a malformed request is reported with the status code to
+answer it with instead of crashing the handler. A request target that could name a file
+outside the directory being served, such as //etc/hostname or /../secret, is rejected.
+"""
+
+import collections
+import re
+
+# Longest request line accepted; a longer one is answered with 414 URI Too Long
+MAX_REQUEST_LINE_SIZE = 8 * 1024
+
+# Longest header line accepted; a longer one is answered with 431 Request Header Fields Too Large
+MAX_HEADER_LINE_SIZE = 8 * 1024
+
+# Most header lines accepted in one request
+MAX_HEADERS = 100
+
+# Most bytes of header lines accepted in one request
+MAX_HEADERS_SIZE = 64 * 1024
+
+# A method or header name is a token
+TOKEN = re.compile(rb"[!#$%&'*+\-.^_`|~0-9A-Za-z]+")
+
+# A request target is visible ASCII, with no spaces or control characters
+REQUEST_TARGET = re.compile(rb'[\x21-\x7e]+')
+
+# The only version family this parser understands
+HTTP_VERSION = re.compile(rb'HTTP/1\.[0-9]')
+
+# Most distinct header names whose checked, decoded forms are remembered
+HEADER_NAME_CACHE_SIZE = 256
+
+# Header names already checked: the name as bytes, to the name and its lower case form as str objects.
+# Only names that pass the check are added, and nothing is added once it is full.
+_header_names = {}
+
+# What the parser expects the next line to be
+STATE_REQUEST_LINE = 'request line'
+STATE_HEADERS = 'headers'
+
+# A parsed request head: the method and version as bytes objects, the request target in origin form
+# (starting with /) as a str, and the headers as a dictionary of str objects keyed by the names as sent
+Request = collections.namedtuple('Request', ['method', 'target', 'version', 'headers'])
+
+
+class RequestParseError(ValueError):
+    """
+    A request head that cannot be served, with the status code to answer it with
+    """
+
+    def __init__(self, status_code, message):
+        """
+        :param bytes status_code: the status code, such as b'400', b'414' or b'431'
+        :param str message: what is wrong with the request
+        """
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class RequestParser:
+    """
+    Parses request heads from bytes fed in chunks of any size. Bytes after the end of one head,
+    such as the next pipelined request, stay buffered and are parsed by the next call to feed.
+    """
+
+    def __init__(self, max_request_line_size=MAX_REQUEST_LINE_SIZE, max_header_line_size=MAX_HEADER_LINE_SIZE,
+                 max_headers=MAX_HEADERS, max_headers_size=MAX_HEADERS_SIZE):
+        """
+        :param int max_request_line_size: longest request line accepted, in bytes
+        :param int max_header_line_size: longest header line accepted, in bytes
+        :param int max_headers: most header lines accepted in one request
+        :param int max_headers_size: most bytes of header lines accepted in one request
+        """
+        self.max_request_line_size = max_request_line_size
+        self.max_header_line_size = max_header_line_size
+        self.max_headers = max_headers
+        self.max_headers_size = max_headers_size
+        self._buffer = bytearray()
+        # The bytes of the buffer already searched for the end of the current line
+        self._scanned = 0
+        self._start_request()
+
+    def buffered(self):
+        """
+        :return: the number of bytes fed but not yet parsed
+        :rtype: int
+        """
+        return len(self._buffer)
+
+    def discard(self, size):
+        """
+        Throw away bytes fed after the end of the last request head, such as the start of its body
+
+        :param int size: the most bytes to throw away
+        :return: the number of bytes thrown away, at most size
+        :rtype: int
+        """
+        size = min(size, len(self._buffer))
+        del self._buffer[:size]
+        return size
+
+    def feed(self, data=b''):
+        """
+        Add bytes to the request being parsed and parse as far as they allow
+
+        :param data: the next bytes received, possibly empty to parse what is already buffered
+        :return: the request once its head is complete, otherwise None
+        :rtype: Request or None
+        :raises RequestParseError: if the request is malformed or goes over a limit
+        """
+        buffer = self._buffer
+        buffer += data
+        headers = self._headers
+        # Lines are consumed by moving start, and the buffer is trimmed once at the end
+        start = 0
+        try:
+            while True:
+                end = buffer.find(b'\n', start + self._scanned)
+                if end < 0:
+                    self._scanned = len(buffer) - start
+                    self._check_partial_line(self._scanned)
+                    return None
+                line = bytes(buffer[start:end - 1] if end > start and buffer[end - 1] == 13 else buffer[start:end])
+                start = end + 1
+                self._scanned = 0
+                if self._state == STATE_REQUEST_LINE:
+                    if len(line) > self.max_request_line_size:
+                        raise RequestParseError(b'414', 'request line too long')
+                    # Empty lines before a request line are ignored
+                    if line:
+                        self._parse_request_line(line)
+                        self._state = STATE_HEADERS
+                    continue
+                if not line:
+                    request = Request(self._method, self._target, self._version, headers)
+                    self._start_request()
+                    return request
+                # Header lines are handled here rather than in a method, since there are many per request
+                if len(line) > self.max_header_line_size:
+                    raise RequestParseError(b'431', 'header too long')
+                self._header_count += 1
+                self._headers_size += len(line) + 2
+                if self._header_count > self.max_headers or self._headers_size > self.max_headers_size:
+                    raise RequestParseError(b'431', 'too many headers')
+                if line[0] in b' \t':
+                    raise RequestParseError(b'400', 'obsolete header line folding')
+                # The name ends at the first colon, so the value may contain colons.
+                # A name with whitespace before the colon is not a token, and is rejected.
+                name, colon, value = line.partition(b':')
+                if not colon:
+                    raise RequestParseError(b'400', 'malformed header')
+                known_name = _header_names.get(name)
+                if known_name is None:
+                    if not TOKEN.fullmatch(name):
+                        raise RequestParseError(b'400', 'malformed header')
+                    known_name = name.decode('ASCII'), name.decode('ASCII').lower()
+                    if len(_header_names) < HEADER_NAME_CACHE_SIZE:
+                        _header_names[name] = known_name
+                name, lower_name = known_name
+                value = value.strip(b' \t').decode('latin-1')
+                # A repeated header has its values joined with commas, under the name it was first sent with
+                first_name = self._names.setdefault(lower_name, name)
+                if first_name in headers:
+                    headers[first_name] += ', ' + value
+                else:
+                    headers[first_name] = value
+        finally:
+            del buffer[:start]
+
+    def _start_request(self):
+        """
+        Forget the request just parsed and wait for the next request line
+        """
+        self._state = STATE_REQUEST_LINE
+        self._method = None
+        self._target = None
+        self._version = None
+        self._headers = {}
+        # The name each header was first sent with, by its lower case name
+        self._names = {}
+        self._header_count = 0
+        self._headers_size = 0
+
+    def _check_partial_line(self, size):
+        """
+        Reject a line that is already too long before its end arrives
+
+        :param int size: the bytes of the line received so far
+        """
+        if self._state == STATE_REQUEST_LINE:
+            # Allow for the CR before the LF
+            if size > self.max_request_line_size + 1:
+                raise RequestParseError(b'414', 'request line too long')
+        elif size > self.max_header_line_size + 1 or self._headers_size + size > self.max_headers_size:
+            raise RequestParseError(b'431', 'header too long')
+
+    def _parse_request_line(self, line):
+        """
+        Parse the method, request target and version. A request line without a version is
+        HTTP/0.9 style, which is treated like HTTP/1.0.
+        """
+        parts = line.split()
+        if len(parts) == 2:
+            parts.append(b'HTTP/1.0')
+        if len(parts) != 3:
+            raise RequestParseError(b'400', 'malformed request line')
+        method, target, version = parts
+        if not TOKEN.fullmatch(method) or not REQUEST_TARGET.fullmatch(target) or not HTTP_VERSION.fullmatch(version):
+            raise RequestParseError(b'400', 'malformed request line')
+        if target.startswith((b'http://', b'https://')):
+            # Absolute form: keep only the path after the host
+            path_start = target.find(b'/', target.index(b'//') + 2)
+            target = target[path_start:] if path_start >= 0 else b'/'
+        elif not target.startswith(b'/') and target != b'*':
+            raise RequestParseError(b'400', 'malformed request target')
+        if not is_safe_target(target):
+            raise RequestParseError(b'400', 'unsafe request target')
+        self._method = method
+        self._target = target.decode('ASCII')
+        self._version = version
+
+
+def is_safe_target(target):
+    """
+    Checks that a request target names a path inside the directory being served: it does not
+    start with // (which would leave an absolute path once the leading / is removed), and it
+    has no .. segments or backslashes, which Windows treats as a separator
+
+    :param bytes target: the request target in origin form, or b'*'
+    :return: True if the target is safe to map to a file
+    :rtype: bool
+    """
+    return not target.startswith(b'//') and b'\\' not in target and b'..' not in target.split(b'/')
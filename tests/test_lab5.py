@@ -0,0 +1,130 @@
+"""
+Regression tests for the lab5 HTTP client.
+
+Usage: python -m pytest tests
+"""
+
+import os
+import socket
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+import lab5  # noqa: E402
+from buffered_reader import BufferedReader  # noqa: E402
+from local_server import lab6_server  # noqa: E402
+
+
+def idle_reader():
+    """
+    :return: a buffered reader for one end of a connected socket pair, and the other end
+    :rtype: tuple
+    """
+    client_socket, server_socket = socket.socketpair()
+    return BufferedReader(client_socket), server_socket
+
+
+def test_is_stale_handles_file_descriptors_over_1023():
+    low_socket, server_socket = socket.socketpair()
+    try:
+        high_fd = os.dup2(low_socket.fileno(), 1100)
+    except OSError:
+        pytest.skip('cannot open file descriptor 1100')
+    high_socket = socket.socket(fileno=high_fd)
+    try:
+        reader = BufferedReader(high_socket)
+        assert lab5.is_stale(reader) is False
+        server_socket.close()
+        assert lab5.is_stale(reader) is True
+    finally:
+        high_socket.close()
+        low_socket.close()
+
+
+def test_pool_keeps_at_most_max_idle_total_connections():
+    pool = lab5.ConnectionPool(max_idle=2, max_idle_total=3)
+    pairs = [idle_reader() for x in range(5)]
+    for port, (reader, server_socket) in enumerate(pairs):
+        pool.release(b'host', port, reader)
+    # The two oldest connections were closed to make room
+    assert [reader.data_socket.fileno() for reader, server_socket in pairs[:2]] == [-1, -1]
+    assert all(reader.data_socket.fileno() != -1 for reader, server_socket in pairs[2:])
+    pool.close()
+    for reader, server_socket in pairs:
+        server_socket.close()
+
+
+def test_pool_closes_expired_connections_for_every_host():
+    pool = lab5.ConnectionPool(idle_timeout=-1)
+    expired, server_socket = idle_reader()
+    pool.release(b'one', 80, expired)
+    fresh, other_server_socket = idle_reader()
+    pool.release(b'two', 80, fresh)
+    assert expired.data_socket.fileno() == -1
+    pool.close()
+    server_socket.close()
+    other_server_socket.close()
+
+
+@pytest.fixture
+def served(tmp_path):
+    """
+    :return: the directory lab6 serves, the port it listens on, and a directory for downloads
+    """
+    directory = tmp_path / 'served'
+    directory.mkdir()
+    downloads = tmp_path / 'downloads'
+    downloads.mkdir()
+    with lab6_server(str(directory)) as port:
+        yield directory, port, downloads
+
+
+def test_resume_appends_the_rest_of_the_same_version(served):
+    directory, port, downloads = served
+    contents = os.urandom(10000)
+    (directory / 'file.bin').write_bytes(contents)
+    file_name = str(downloads / 'file.bin')
+    assert lab5.make_http_request(b'127.0.0.1', port, b'/file.bin', file_name, resume=True) == '200'
+    with open(file_name, 'r+b') as partial_file:
+        partial_file.truncate(4000)
+    assert lab5.make_http_request(b'127.0.0.1', port, b'/file.bin', file_name, resume=True) == '206'
+    assert open(file_name, 'rb').read() == contents
+
+
+def test_resume_gets_a_changed_resource_again_whole(served):
+    directory, port, downloads = served
+    (directory / 'file.bin').write_bytes(os.urandom(10000))
+    file_name = str(downloads / 'file.bin')
+    lab5.make_http_request(b'127.0.0.1', port, b'/file.bin', file_name, resume=True)
+    with open(file_name, 'r+b') as partial_file:
+        partial_file.truncate(4000)
+    changed = os.urandom(12000)
+    (directory / 'file.bin').write_bytes(changed)
+    os.utime(directory / 'file.bin', (1, 1))
+    assert lab5.make_http_request(b'127.0.0.1', port, b'/file.bin', file_name, resume=True) == '200'
+    assert open(file_name, 'rb').read() == changed
+
+
+def test_resume_gets_the_resource_again_when_the_file_is_too_long(served):
+    directory, port, downloads = served
+    contents = os.urandom(10000)
+    (directory / 'file.bin').write_bytes(contents)
+    file_name = str(downloads / 'file.bin')
+    lab5.make_http_request(b'127.0.0.1', port, b'/file.bin', file_name, resume=True)
+    with open(file_name, 'ab') as long_file:
+        long_file.write(b'left over from a longer version')
+    assert lab5.make_http_request(b'127.0.0.1', port, b'/file.bin', file_name, resume=True) == '200'
+    assert open(file_name, 'rb').read() == contents
+
+
+def test_resume_keeps_a_complete_file(served):
+    directory, port, downloads = served
+    contents = os.urandom(10000)
+    (directory / 'file.bin').write_bytes(contents)
+    file_name = str(downloads / 'file.bin')
+    lab5.make_http_request(b'127.0.0.1', port, b'/file.bin', file_name, resume=True)
+    assert lab5.make_http_request(b'127.0.0.1', port, b'/file.bin', file_name, resume=True) == '416'
+    assert open(file_name, 'rb').read() == contents
@@ -0,0 +1,178 @@
+"""
+Regression tests for the lab6 HTTP server.
+
+Usage: python -m pytest tests
+"""
+
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lab6  # noqa: E402
+
+
+def test_is_not_modified_ignores_out_of_range_year(tmp_path):
+    path = tmp_path / 'page.html'
+    path.write_bytes(b'<html></html>')
+    entry = lab6.FILE_CACHE.lookup(str(path))
+    headers = {'If-Modified-Since': 'Mon, 01 Jan 99999999999999999999 00:00:00 GMT'}
+    assert lab6.is_not_modified(entry, headers) is False
+
+
+def test_is_not_modified_compares_valid_dates(tmp_path):
+    path = tmp_path / 'page.html'
+    path.write_bytes(b'<html></html>')
+    entry = lab6.FILE_CACHE.lookup(str(path))
+    assert lab6.is_not_modified(entry, {'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'}) is True
+    assert lab6.is_not_modified(entry, {'If-Modified-Since': 'Thu, 01 Jan 1970 00:00:00 GMT'}) is False
+
+
+def test_build_response_answers_unexpected_error_with_500(monkeypatch):
+    def fail(*args):
+        raise RuntimeError('bug')
+    monkeypatch.setattr(lab6.FILE_CACHE, 'lookup', fail)
+    status_line, response_headers, response_body = lab6.build_response('page.html')
+    assert status_line == b'HTTP/1.1 500 Internal Server Error\r\n'
+    assert response_headers[b'Content-Length: '] == b'0\r\n'
+    assert response_body == b''
+
+
+def test_serve_connections_survives_a_failing_handler(monkeypatch):
+    handled = []
+
+    class FakeSocket:
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+    def handle_request(request_socket, **options):
+        handled.append(request_socket)
+        if len(handled) == 1:
+            raise RuntimeError('bug')
+    monkeypatch.setattr(lab6, 'handle_request', handle_request)
+    sockets = [FakeSocket(), FakeSocket()]
+    connection_queue = lab6.queue.Queue()
+    for request_socket in sockets + [None]:
+        connection_queue.put(request_socket)
+    lab6.serve_connections(connection_queue, {})
+    assert handled == sockets
+    assert sockets[0].closed
+
+
+def exchange(request, directory, engine, monkeypatch):
+    """
+    Send the request bytes to a handler on one connection and close the sending side
+
+    :return: everything the server sent back before closing the connection
+    :rtype: bytes object
+    """
+    monkeypatch.chdir(directory)
+    server_socket, client_socket = socket.socketpair()
+    if engine == lab6.ENGINE_EVENT:
+        async def handle():
+            stream_reader, stream_writer = await asyncio.open_connection(sock=server_socket)
+            await lab6.handle_request_async(stream_reader, stream_writer, keep_alive_timeout=2)
+        handler = threading.Thread(target=asyncio.run, args=(handle(),))
+    else:
+        handler = threading.Thread(target=lab6.handle_request, args=(server_socket,), kwargs={'keep_alive_timeout': 2})
+    handler.start()
+    client_socket.sendall(request)
+    client_socket.shutdown(socket.SHUT_WR)
+    received = []
+    while True:
+        data = client_socket.recv(65536)
+        if not data:
+            break
+        received.append(data)
+    handler.join()
+    client_socket.close()
+    return b''.join(received)
+
+
+@pytest.mark.parametrize('engine', [lab6.ENGINE_THREAD, lab6.ENGINE_EVENT])
+def test_request_body_is_not_taken_for_the_next_request(tmp_path, monkeypatch, engine):
+    (tmp_path / 'page.html').write_bytes(b'<html></html>')
+    smuggled = b'GET /page.html HTTP/1.1\r\nHost: x\r\n\r\n'
+    request = (b'POST /page.html HTTP/1.1\r\nHost: x\r\nContent-Length: ' + str(len(smuggled)).encode() +
+               b'\r\n\r\n' + smuggled + b'GET /page.html HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n')
+    response = exchange(request, tmp_path, engine, monkeypatch)
+    assert response.count(b'HTTP/1.1 200 OK') == 2
+
+
+@pytest.mark.parametrize('engine', [lab6.ENGINE_THREAD, lab6.ENGINE_EVENT])
+def test_transfer_coded_request_body_is_refused(tmp_path, monkeypatch, engine):
+    request = b'POST /page.html HTTP/1.1\r\nHost: x\r\nTransfer-Encoding: chunked\r\n\r\n0\r\n\r\n'
+    response = exchange(request, tmp_path, engine, monkeypatch)
+    assert response.startswith(b'HTTP/1.1 501 Not Implemented\r\n')
+    assert response.count(b'HTTP/1.1') == 1
+
+
+@pytest.mark.parametrize('engine', [lab6.ENGINE_THREAD, lab6.ENGINE_EVENT])
+def test_head_response_has_no_body(tmp_path, monkeypatch, engine):
+    (tmp_path / 'page.html').write_bytes(b'<html></html>')
+    request = (b'HEAD /page.html HTTP/1.1\r\nHost: x\r\n\r\n'
+               b'GET /page.html HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n')
+    response = exchange(request, tmp_path, engine, monkeypatch)
+    head_response, separator, rest = response.partition(b'\r\n\r\n')
+    assert b'Content-Length: 13\r\n' in head_response
+    assert rest.startswith(b'HTTP/1.1 200 OK\r\n')
+    assert rest.endswith(b'\r\n\r\n<html></html>')
+
+
+def test_parse_request_limits_time_for_a_trickled_body():
+    server_socket, client_socket = socket.socketpair()
+    client_socket.sendall(b'POST /page.html HTTP/1.1\r\nHost: x\r\nContent-Length: 8\r\n\r\n')
+    stop = threading.Event()
+
+    def trickle():
+        while not stop.wait(0.1):
+            client_socket.sendall(b'x')
+    sender = threading.Thread(target=trickle)
+    sender.start()
+    start = time.monotonic()
+    try:
+        with pytest.raises(socket.timeout):
+            lab6.parse_request(lab6.BufferedReader(server_socket), lab6.RequestParser(), 0.5)
+    finally:
+        stop.set()
+        sender.join()
+        server_socket.close()
+        client_socket.close()
+    assert time.monotonic() - start < 0.75
+
+
+def test_idle_connection_is_closed_when_others_are_waiting():
+    server_socket, client_socket = socket.socketpair()
+    waiting = []
+    handler = threading.Thread(target=lab6.handle_request, args=(server_socket,),
+                               kwargs={'keep_alive_timeout': 5, 'others_waiting': lambda: bool(waiting)})
+    handler.start()
+    time.sleep(0.2)
+    assert handler.is_alive()
+    start = time.monotonic()
+    waiting.append(True)
+    handler.join(1)
+    assert not handler.is_alive()
+    assert time.monotonic() - start < 0.5
+    assert client_socket.recv(1) == b''
+    client_socket.close()
+
+
+def test_raise_open_file_limit_caps_an_unlimited_hard_limit(monkeypatch):
+    calls = []
+
+    def setrlimit(kind, limits):
+        calls.append(limits)
+        raise ValueError('not allowed')
+    monkeypatch.setattr(lab6.resource, 'getrlimit', lambda kind: (256, lab6.resource.RLIM_INFINITY))
+    monkeypatch.setattr(lab6.resource, 'setrlimit', setrlimit)
+    lab6.raise_open_file_limit()
+    assert calls == [(lab6.MAX_OPEN_FILES, lab6.resource.RLIM_INFINITY)]
@@ -0,0 +1,65 @@
+"""
+Regression tests for the lab7 TFTP server.
+
+Usage: python -m pytest tests
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lab7  # noqa: E402
+
+
+def test_get_error_message_replaces_bytes_that_are_not_ascii():
+    assert lab7.get_error_message(b'\x00\x05\x00\x00\xff\xfe\x00') == '��'
+    assert lab7.get_error_message(b'\x00\x05\x00\x00Disk full\x00') == 'Disk full'
+
+
+class RecordingSocket:
+    """
+    Stands in for the socket of a transfer, keeping the packets sent
+    """
+
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, packet, address):
+        self.sent.append(packet)
+
+    def close(self):
+        pass
+
+
+def test_write_transfer_rejects_block_larger_than_block_size(tmp_path):
+    output_file, temporary_filename = lab7.open_upload_file(str(tmp_path / 'upload'))
+    data_socket = RecordingSocket()
+    address = ('127.0.0.1', 6969)
+    transfer = lab7.WriteTransfer(data_socket, address, str(tmp_path / 'upload'), output_file, temporary_filename)
+    assert transfer.handle_packet(b'\x00\x03\x00\x01' + b'x' * 513, address) is False
+    assert data_socket.sent == [b'\x00\x05\x00\x04Data block larger than the block size\x00']
+    transfer.close()
+    assert os.listdir(tmp_path) == []
+
+
+def test_write_transfer_gives_upload_the_usual_file_mode(tmp_path):
+    filename = str(tmp_path / 'upload')
+    output_file, temporary_filename = lab7.open_upload_file(filename)
+    data_socket = RecordingSocket()
+    address = ('127.0.0.1', 6969)
+    transfer = lab7.WriteTransfer(data_socket, address, filename, output_file, temporary_filename)
+    assert transfer.handle_packet(b'\x00\x03\x00\x01' + b'done', address) is True
+    transfer.close()
+    with open(filename, 'rb') as upload_file:
+        assert upload_file.read() == b'done'
+    assert os.stat(filename).st_mode & 0o777 == lab7.UPLOAD_FILE_MODE & ~lab7.get_umask()
+
+
+@pytest.mark.parametrize('filename', ['/etc/hostname', '../../etc/hostname', 'files/../../secret'])
+def test_read_request_outside_the_directory_is_refused(filename):
+    data_socket = RecordingSocket()
+    assert lab7.start_read_transfer(data_socket, ('127.0.0.1', 6969), filename, {}) is None
+    assert data_socket.sent == [b'\x00\x05\x00\x02Access violation\x00']
@@ -0,0 +1,76 @@
+"""
+Tests for the incremental HTTP request parser used by lab6.
+
+Usage: python -m pytest tests
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+import fuzz_request_parser  # noqa: E402
+from request_parser import Request, RequestParser, RequestParseError  # noqa: E402
+
+
+def test_fuzz_with_fixed_seed():
+    # Raises AssertionError if any invariant of the fuzz harness fails
+    fuzz_request_parser.run(2000, 2911)
+
+
+def test_header_value_may_contain_colons():
+    request = RequestParser().feed(b'GET / HTTP/1.1\r\nX-Note: a: b: c\r\nHost: example.com:8080\r\n\r\n')
+    assert request.headers == {'X-Note': 'a: b: c', 'Host': 'example.com:8080'}
+
+
+def test_request_line_too_long_is_rejected_before_it_ends():
+    parser = RequestParser(max_request_line_size=100)
+    with pytest.raises(RequestParseError) as error:
+        parser.feed(b'GET /' + b'a' * 200)
+    assert error.value.status_code == b'414'
+
+
+def test_header_line_too_long_is_rejected_before_it_ends():
+    parser = RequestParser(max_header_line_size=100)
+    assert parser.feed(b'GET / HTTP/1.1\r\nX-Long: ') is None
+    with pytest.raises(RequestParseError) as error:
+        parser.feed(b'x' * 200)
+    assert error.value.status_code == b'431'
+
+
+def test_pipelined_requests_are_parsed_one_at_a_time():
+    parser = RequestParser()
+    first = parser.feed(b'GET /one HTTP/1.1\r\n\r\nGET /two HTTP/1.1\r\n\r\nGET /th')
+    assert first == Request(b'GET', '/one', b'HTTP/1.1', {})
+    assert parser.feed().target == '/two'
+    assert parser.feed() is None
+    assert parser.feed(b'ree HTTP/1.1\r\n\r\n').target == '/three'
+    assert parser.buffered() == 0
+
+
+def test_discard_skips_a_body_before_the_next_request():
+    parser = RequestParser()
+    request = parser.feed(b'POST /form HTTP/1.1\r\nContent-Length: 5\r\n\r\nhelloGET /next HTTP/1.1\r\n\r\n')
+    assert request.method == b'POST'
+    assert parser.discard(5) == 5
+    assert parser.feed().target == '/next'
+    # Only what is buffered can be discarded; the rest of a body is still to arrive
+    parser.feed(b'POST /form HTTP/1.1\r\nContent-Length: 10\r\n\r\nabc')
+    assert parser.discard(10) == 3
+    assert parser.buffered() == 0
+
+
+@pytest.mark.parametrize('target', [b'//etc/hostname', b'/../etc/hostname', b'/files/../../etc/hostname',
+                                    b'/files/..', b'/files\\..\\secret', b'http://example.com//etc/hostname'])
+def test_unsafe_targets_are_rejected(target):
+    with pytest.raises(RequestParseError) as error:
+        RequestParser().feed(b'GET ' + target + b' HTTP/1.1\r\n\r\n')
+    assert error.value.status_code == b'400'
+
+
+@pytest.mark.parametrize('target', [b'/', b'/index.html', b'/a/b..c/...', b'/a//b', b'*'])
+def test_safe_targets_are_accepted(target):
+    assert RequestParser().feed(b'GET ' + target + b' HTTP/1.1\r\n\r\n') is not None